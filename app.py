@@ -1,15 +1,35 @@
 from aiohttp import web
+import asyncio
 import logging
+import multiprocessing
 import os
+import signal
+import threading
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.config import settings
-from models.base import get_session_maker
+from bot.models.base import get_session_maker
 from handlers import setup_routers
+from handlers.webhook import setup_webhook_routes
 from services.scheduler import SchedulerService
+from services.payment_inbox import PaymentInboxConsumer
+from bot.services.distribution_queue import distribution_workers
+from bot.services.runtime_config import runtime_config
+from bot.services.view_buffer import view_buffer
+from services.broadcast import BroadcastService
+from services.fsm_storage import CachedRedisStorage
+from services.leader import LeaderElection
+from services.update_router import ShardedUpdateRouter
+from middlewares.update_scheduler import ChatUpdateScheduler
+from middlewares.database import DatabaseMiddleware
+from middlewares.query_stats import QueryStatsMiddleware
+from middlewares.user_context import UserContextMiddleware
+from bot.services.query_stats import query_stats
+from bot.services.metrics import MetricsPublisher, registry, render
+from services.health import HealthService, FAIL
+from middlewares.metrics import HandlerMetricsMiddleware
 
 # Настройка логирования
 logging.basicConfig(
@@ -18,44 +38,117 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Обработчик для проверки работоспособности
+# Обработчики проверки работоспособности
+async def liveness_handler(request):
+    """Процесс жив и event loop отвечает."""
+    return web.json_response(request.app['health'].liveness())
+
 async def health_handler(request):
-    """Обработчик для проверки работоспособности."""
-    return web.Response(text="OK")
+    """Готовность: БД, Redis, обработка обновлений, планировщик, очередь."""
+    report = await request.app['health'].readiness()
+    status = 503 if report["status"] == FAIL else 200
+    return web.json_response(report, status=status)
 
-async def start_bot():
-    """Запуск бота."""
-    # Инициализация бота и диспетчера
+async def metrics_handler(request):
+    """Метрики в формате Prometheus (со всех воркеров)."""
+    publisher = request.app.get('metrics_publisher')
+    snapshot = await publisher.collect() if publisher else registry.snapshot()
+    return web.Response(text=render(snapshot), content_type="text/plain", charset="utf-8")
+
+async def query_stats_handler(request):
+    """Счетчики SQL-запросов по обработчикам и задачам."""
+    return web.json_response(query_stats.snapshot())
+
+def create_bot():
+    """Создание бота и диспетчера."""
     bot = Bot(token=settings.BOT_TOKEN)
-    storage = MemoryStorage()
+    storage = CachedRedisStorage()
     dp = Dispatcher(storage=storage)
     
+    # Параллельная обработка чатов с сохранением порядка внутри чата
+    update_scheduler = ChatUpdateScheduler()
+    update_scheduler.setup(dp)
+    dp['update_scheduler'] = update_scheduler
+    registry.callback(
+        "bot_update_queue_depth",
+        "Updates waiting for or in handling",
+        lambda: update_scheduler.stats()["pending"]
+    )
+    
+    # Сессия БД, учет запросов по обработчикам и текущий пользователь
+    for observer in (dp.message, dp.callback_query):
+        observer.middleware(DatabaseMiddleware())
+        observer.middleware(QueryStatsMiddleware())
+        observer.middleware(UserContextMiddleware())
+        observer.middleware(HandlerMetricsMiddleware())
+    
     # Настройка роутеров
     router = setup_routers()
     dp.include_router(router)
     
-    # Настройка вебхуков (если нужно)
-    if settings.WEBHOOK_URL:
+    return bot, dp
+
+async def start_bot(app):
+    """Запуск бота."""
+    bot = app['bot']
+    
+    # Вебхук устанавливает только первый воркер
+    if settings.WEBHOOK_URL and app['worker_index'] == 0:
+        # Перезапущенный воркер застает вебхук на месте: накопившиеся
+        # обновления не сбрасываем
+        webhook = await bot.get_webhook_info()
+        if webhook.url == settings.WEBHOOK_URL:
+            logger.info(f"Webhook is already set to {settings.WEBHOOK_URL}")
+            return
+        
         logger.info(f"Setting webhook to {settings.WEBHOOK_URL}")
         await bot.set_webhook(
             url=settings.WEBHOOK_URL,
             drop_pending_updates=True
         )
-    
-    # Возвращаем бота и диспетчера
-    return bot, dp
 
-def create_app():
+def create_app(worker_index: int = 0, workers: int = 1):
     """Создание приложения."""
     # Создание приложения
     app = web.Application()
+    app['worker_index'] = worker_index
+    app['workers'] = workers
+    
+    # Создание бота до заморозки маршрутов, чтобы зарегистрировать вебхук
+    bot, dp = create_bot()
+    app['bot'] = bot
+    app['dp'] = dp
     
     # Добавление маршрутов
     app.router.add_get('/health', health_handler)
+    app.router.add_get('/health/live', liveness_handler)
+    app.router.add_get('/', liveness_handler)
+    app.router.add_get('/health/ready', health_handler)
+    app.router.add_get('/metrics', metrics_handler)
+    app.router.add_get('/metrics/queries', query_stats_handler)
+    setup_webhook_routes(app)
+    
+    if settings.WEBHOOK_URL:
+        if workers > 1:
+            # Обновления распределяются по воркерам по chat_id
+            update_router = ShardedUpdateRouter(dp, bot, worker_index, workers)
+            app.router.add_post(settings.WEBHOOK_PATH, update_router.handle)
+            app['update_router'] = update_router
+        else:
+            webhook_requests_handler = SimpleRequestHandler(
+                dispatcher=dp,
+                bot=bot,
+            )
+            setup_application(app, webhook_requests_handler, path=settings.WEBHOOK_PATH)
     
     # Настройка сессии базы данных
     session_maker = get_session_maker()
     app['session_maker'] = session_maker
+    app['health'] = HealthService(
+        session_maker,
+        update_stats=dp['update_scheduler'].stats,
+        queue_stats=distribution_workers.stats
+    )
     
     # Middleware для сессии базы данных
     @web.middleware
@@ -73,39 +166,75 @@ def create_app():
     
     return app
 
+async def start_singletons(app):
+    """Запуск задач, которые должны работать только в одном процессе."""
+    # Запуск планировщика задач
+    scheduler = SchedulerService(app['session_maker'], app['bot'])
+    scheduler.start()
+    app['scheduler'] = scheduler
+    
+    # Продолжение рассылок, чей отправитель перестал продлевать аренду
+    broadcast_service = BroadcastService(app['session_maker'], app['bot'])
+    app['broadcast_resume'] = asyncio.create_task(broadcast_service.watch_unfinished())
+
+async def stop_singletons(app):
+    """Остановка задач лидера."""
+    if 'scheduler' in app:
+        app['scheduler'].stop()
+        del app['scheduler']
+    
+    if 'broadcast_resume' in app:
+        # Рассылка продолжится с контрольной точки у нового лидера
+        app['broadcast_resume'].cancel()
+        del app['broadcast_resume']
+
 async def on_startup(app):
     """Действия при запуске приложения."""
     try:
+        # Настройки администратора загружаем до приема обновлений
+        await runtime_config.start(app['session_maker'])
+        
         # Запуск бота
-        bot, dp = await start_bot()
-        app['bot'] = bot
-        app['dp'] = dp
+        await start_bot(app)
+        bot, dp = app['bot'], app['dp']
         
-        # Настройка вебхуков (если нужно)
-        if settings.WEBHOOK_URL:
-            # Настройка обработчика вебхуков
-            webhook_requests_handler = SimpleRequestHandler(
-                dispatcher=dp,
-                bot=bot,
-            )
-            setup_application(app, webhook_requests_handler, path=settings.WEBHOOK_PATH)
-        else:
+        if 'update_router' in app:
+            app['update_router'].start()
+        elif not settings.WEBHOOK_URL:
             # Запуск поллинга в фоновом режиме
-            from aiogram import Bot
-            import asyncio
-            
             async def start_polling():
-                await dp.start_polling(bot)
+                await dp.start_polling(bot, handle_as_tasks=False, handle_signals=False)
             
             loop = asyncio.get_event_loop()
             loop.create_task(start_polling())
         
-        # Запуск планировщика задач
-        scheduler = SchedulerService(app['session_maker'], bot)
-        scheduler.start()
-        app['scheduler'] = scheduler
+        if app['workers'] > 1:
+            # Планировщик и рассылки запускает только воркер-лидер
+            election = LeaderElection(
+                "scheduler",
+                on_elected=lambda: start_singletons(app),
+                on_lost=lambda: stop_singletons(app)
+            )
+            election.start()
+            app['leader_election'] = election
+            
+            # Снимки метрик в Redis, чтобы /metrics любого воркера видел все
+            publisher = MetricsPublisher(str(app['worker_index']))
+            publisher.start()
+            app['metrics_publisher'] = publisher
+        else:
+            await start_singletons(app)
+        
+        # Запуск обработчика входящих событий ЮKassa
+        payment_inbox = PaymentInboxConsumer(app['session_maker'])
+        payment_inbox.start()
+        app['payment_inbox'] = payment_inbox
         
-        logger.info("Bot started successfully")
+        # Воркеры распределения заявок работают в каждом процессе
+        distribution_workers.start(app['session_maker'])
+        view_buffer.start(app['session_maker'])
+        
+        logger.info(f"Bot started successfully (worker {app['worker_index']})")
     except Exception as e:
         logger.error(f"Error starting bot: {e}", exc_info=True)
         raise
@@ -114,22 +243,80 @@ async def on_shutdown(app):
     """Действия при остановке приложения."""
     try:
         # Остановка планировщика
-        if 'scheduler' in app:
-            app['scheduler'].stop()
+        if 'leader_election' in app:
+            await app['leader_election'].stop()
+        if 'metrics_publisher' in app:
+            await app['metrics_publisher'].stop()
+        await stop_singletons(app)
+        
+        # Остановка обработчика платежных событий
+        if 'payment_inbox' in app:
+            await app['payment_inbox'].stop()
+        
+        await distribution_workers.stop()
+        await runtime_config.stop()
+        
+        if 'update_router' in app:
+            await app['update_router'].stop()
+        
+        # Записываем накопленные отметки о просмотре
+        await view_buffer.stop()
         
         # Закрытие соединений бота
-        if 'bot' in app:
-            bot = app['bot']
-            if settings.WEBHOOK_URL:
-                await bot.delete_webhook()
-            await bot.session.close()
+        bot = app['bot']
+        if settings.WEBHOOK_URL and app['workers'] == 1:
+            await bot.delete_webhook()
+        await bot.session.close()
         
         logger.info("Bot stopped successfully")
     except Exception as e:
         logger.error(f"Error stopping bot: {e}", exc_info=True)
 
+def run_worker(worker_index: int, workers: int, port: int):
+    """Запуск одного воркера на общем порту."""
+    app = create_app(worker_index, workers)
+    web.run_app(app, host='0.0.0.0', port=port, reuse_port=True)
+
+def run_workers(workers: int, port: int):
+    """Запуск нескольких воркеров и перезапуск упавших."""
+    context = multiprocessing.get_context("spawn")
+    processes = {}
+    stopping = threading.Event()
+    
+    def spawn(worker_index):
+        process = context.Process(
+            target=run_worker,
+            args=(worker_index, workers, port),
+            name=f"bot-worker-{worker_index}"
+        )
+        process.start()
+        processes[worker_index] = process
+        logger.info(f"Worker {worker_index} started with PID {process.pid}")
+    
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda s, f: stopping.set())
+    
+    for worker_index in range(workers):
+        spawn(worker_index)
+    
+    while not stopping.wait(1):
+        for worker_index, process in list(processes.items()):
+            if not process.is_alive():
+                logger.warning(f"Worker {worker_index} exited with code {process.exitcode}, restarting")
+                spawn(worker_index)
+    
+    for process in processes.values():
+        process.terminate()
+    for process in processes.values():
+        process.join(timeout=10)
+
 if __name__ == '__main__':
     # Запуск приложения
-    app = create_app()
     port = int(os.environ.get('PORT', 8000))
-    web.run_app(app, host='0.0.0.0', port=port)
\ No newline at end of file
+    if settings.WEB_WORKERS > 1 and settings.WEBHOOK_URL:
+        run_workers(settings.WEB_WORKERS, port)
+    else:
+        if settings.WEB_WORKERS > 1:
+            logger.warning("Multiple workers require webhook mode, starting a single process")
+        app = create_app()
+        web.run_app(app, host='0.0.0.0', port=port)
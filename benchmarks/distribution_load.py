@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный прогон распределения заявок.
+
+Создает синтетическую базу подписчиков, прогоняет поток демо-заявок тем же
+путем, что и handle_group_message (enqueue_lead + воркер распределения), и
+печатает задержку на заявку (p50/p99), число SQL-запросов и команд Redis на
+заявку и распределение слотов по тарифам.
+
+Работает без внешних сервисов: по умолчанию SQLite в памяти и Redis в
+памяти процесса. Можно указать локальный Postgres через --database-url.
+
+Запуск из каталога, где лежит пакет bot:
+    python -m bot.benchmarks.distribution_load --users 10000 --leads 1000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+# Настройки бота требуют токен, для прогона подойдет любой
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from bot.core.config import settings
+from bot.models import base as models_base
+from bot.models.base import Base
+from bot.models.user import User
+from bot.models.subscription import Subscription
+# Все модели должны быть загружены до настройки связей и create_all
+from bot.models import distribution_job, payment  # noqa: F401
+from bot.services import cache as cache_module
+from bot.services.demo_data import generate_demo_lead
+from bot.services.distribution_queue import DistributionWorkerPool, enqueue_lead
+from bot.services.query_stats import install, query_stats
+from bot.benchmarks.fake_redis import FakeRedis
+
+# Доли тарифов среди подписчиков
+TIER_MIX = {"basic": 0.6, "pro": 0.3, "premium": 0.1}
+
+# Демо-заявки есть только для категорий из DEMO_DESCRIPTIONS
+CATEGORIES = list(settings.DEMO_DESCRIPTIONS)
+
+def percentile(values, q):
+    ordered = sorted(values)
+    index = min(int(round(q / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+def setup_engine(database_url: str):
+    """Create engine and make the bot use it."""
+    in_memory = ":memory:" in database_url or database_url.endswith("://")
+    if database_url.startswith("sqlite") and in_memory:
+        # Одно соединение на все сессии, иначе у каждой будет своя пустая база
+        engine = create_async_engine(
+            database_url,
+            poolclass=StaticPool,
+            connect_args={"check_same_thread": False}
+        )
+    else:
+        engine = create_async_engine(database_url)
+
+    install(engine)
+    models_base._engine = engine
+    models_base._session_maker = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    return engine, models_base._session_maker
+
+async def build_population(session_maker, users: int, rng: random.Random):
+    """Insert users with active subscriptions. Returns plan of every user id."""
+    tiers = list(TIER_MIX)
+    expires_at = datetime.utcnow() + timedelta(days=30)
+    user_rows, subscription_rows, tier_of = [], [], {}
+
+    for user_id in range(1, users + 1):
+        tier = rng.choices(tiers, weights=[TIER_MIX[t] for t in tiers])[0]
+        tier_of[user_id] = tier
+        # Одна категория и один город: в SQLite JSON contains сравнивает строку целиком
+        user_rows.append({
+            "id": user_id,
+            "telegram_id": 10_000_000 + user_id,
+            "full_name": f"User {user_id}",
+            "is_active": True,
+            "is_paid": True,
+            "categories": [rng.choice(CATEGORIES)],
+            "cities": [rng.choice(settings.CITIES)]
+        })
+        subscription_rows.append({
+            "user_id": user_id,
+            "plan_name": tier,
+            "price": settings.SUBSCRIPTION_PLANS[tier]["price"],
+            "expires_at": expires_at,
+            "is_active": True
+        })
+
+    async with session_maker() as session:
+        for start in range(0, users, 1000):
+            await session.execute(insert(User), user_rows[start:start + 1000])
+            await session.execute(insert(Subscription), subscription_rows[start:start + 1000])
+        await session.commit()
+
+    return tier_of
+
+async def run(users: int, leads: int, seed: int, database_url: str) -> None:
+    rng = random.Random(seed)
+    random.seed(seed)  # generate_demo_lead использует модуль random
+
+    engine, session_maker = setup_engine(database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    redis = FakeRedis()
+    cache_module._redis = redis
+
+    queries = 0
+
+    def count_query(*args):
+        nonlocal queries
+        queries += 1
+
+    tier_of = await build_population(session_maker, users, rng)
+    event.listen(engine.sync_engine, "before_cursor_execute", count_query)
+
+    pool = DistributionWorkerPool(workers=1)
+    pool.session_maker = session_maker
+
+    latencies, queries_per_lead, redis_per_lead = [], [], []
+    slots = Counter()
+    received = Counter()
+    empty = 0
+
+    started = time.perf_counter()
+    for _ in range(leads):
+        lead_data = generate_demo_lead(rng.choice(CATEGORIES), rng.choice(settings.CITIES))
+        queries_before, redis_before = queries, redis.total_ops
+        distributed_before = pool.distributed
+
+        lead_started = time.perf_counter()
+        async with session_maker() as session:
+            await enqueue_lead(session, lead_data)
+        await pool.process_next()
+        latencies.append((time.perf_counter() - lead_started) * 1000)
+
+        queries_per_lead.append(queries - queries_before)
+        redis_per_lead.append(redis.total_ops - redis_before)
+        if pool.distributed == distributed_before:
+            empty += 1
+    elapsed = time.perf_counter() - started
+
+    # Кто сколько получил - по записям распределения
+    async with session_maker() as session:
+        result = await session.execute(
+            Base.metadata.tables["lead_distributions"].select()
+        )
+        for row in result.mappings():
+            received[row["user_id"]] += 1
+            slots[tier_of[row["user_id"]]] += 1
+
+    await engine.dispose()
+
+    print(f"Users: {users}, leads: {leads}, seed: {seed}, database: {database_url}")
+    print(f"Throughput: {leads / elapsed:,.1f} leads/s, failed jobs: {pool.failed}, leads without recipients: {empty}")
+    print(f"Latency per lead: p50 {percentile(latencies, 50):.1f} ms, "
+          f"p99 {percentile(latencies, 99):.1f} ms, max {max(latencies):.1f} ms")
+    print(f"SQL queries per lead: mean {statistics.mean(queries_per_lead):.1f}, "
+          f"p99 {percentile(queries_per_lead, 99)}")
+    print(f"Redis commands per lead: mean {statistics.mean(redis_per_lead):.1f}, "
+          f"p99 {percentile(redis_per_lead, 99)}")
+    print(f"Redis commands by type: {dict(redis.ops)}")
+    for name, stats in query_stats.snapshot()["handlers"].items():
+        print(f"  {name}: {stats['queries_per_call']} queries per call, max {stats['max_ms']} ms")
+    print()
+
+    # Доли слотов по тарифам и равномерность внутри тарифа
+    total_slots = sum(slots.values()) or 1
+    weights = {
+        plan_name: plan_data.get("distribution_weight", 1)
+        for plan_name, plan_data in settings.SUBSCRIPTION_PLANS.items()
+    }
+    total_weight = sum(weights.values())
+    users_by_tier = defaultdict(list)
+    for user_id, tier in tier_of.items():
+        users_by_tier[tier].append(received[user_id])
+
+    print(f"{'tier':<10}{'users':>8}{'weight share':>14}{'slot share':>12}{'per user':>10}{'cv':>8}")
+    for tier, weight in weights.items():
+        counts = users_by_tier[tier] or [0]
+        mean = statistics.mean(counts)
+        cv = statistics.pstdev(counts) / mean if mean else 0.0
+        print(f"{tier:<10}{len(users_by_tier[tier]):>8}{weight / total_weight:>14.3f}"
+              f"{slots[tier] / total_slots:>12.3f}{mean:>10.2f}{cv:>8.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Lead distribution load test")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--leads", type=int, default=1_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", default="sqlite+aiosqlite://")
+    args = parser.parse_args()
+    # Логи распределения по каждой заявке только мешают отчету
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(run(args.users, args.leads, args.seed, args.database_url))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Детерминированная симуляция планировщика распределения заявок.
+
+Строит синтетическую базу подписчиков, прогоняет через
+DistributionScheduler поток заявок и печатает пропускную способность,
+доли тарифов относительно их весов и равномерность внутри тарифа.
+
+Запуск из каталога, где лежит пакет bot:
+    python -m bot.benchmarks.distribution_scheduler --leads 1000000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+from collections import Counter, defaultdict
+
+# Настройки бота требуют токен, для прогона подойдет любой
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+
+from bot.core.config import settings
+from bot.services.distribution_scheduler import DistributionScheduler, MemoryCursorStore
+
+# Доли тарифов среди подписчиков
+TIER_MIX = {"basic": 0.6, "pro": 0.3, "premium": 0.1}
+
+def build_population(users: int, rng: random.Random):
+    """Return tier of every user and per-(category, city) tier buckets."""
+    tiers = list(TIER_MIX)
+    tier_of = {}
+    buckets = defaultdict(lambda: {tier: [] for tier in tiers})
+
+    for user_id in range(1, users + 1):
+        tier = rng.choices(tiers, weights=[TIER_MIX[t] for t in tiers])[0]
+        tier_of[user_id] = tier
+        categories = rng.sample(settings.CATEGORIES, rng.randint(1, 2))
+        cities = rng.sample(settings.CITIES, rng.randint(1, 2))
+        for category in categories:
+            for city in cities:
+                buckets[(category, city)][tier].append(user_id)
+
+    return tier_of, dict(buckets)
+
+def run(leads: int, users: int, seed: int) -> None:
+    rng = random.Random(seed)
+    tier_of, buckets = build_population(users, rng)
+    keys = sorted(buckets)
+    stream = [keys[rng.randrange(len(keys))] for _ in range(leads)]
+
+    scheduler = DistributionScheduler(store=MemoryCursorStore())
+    cursors = {key: {} for key in keys}
+    received = Counter()
+    received_in_segment = defaultdict(Counter)
+
+    started = time.perf_counter()
+    for key in stream:
+        for user_id in scheduler.plan(cursors[key], buckets[key]):
+            received[user_id] += 1
+            received_in_segment[key][user_id] += 1
+    elapsed = time.perf_counter() - started
+
+    slots = sum(received.values())
+    print(f"Users: {users}, leads: {leads}, seed: {seed}, max recipients: {scheduler.max_recipients}")
+    print(f"Throughput: {leads / elapsed:,.0f} leads/s ({elapsed * 1e6 / leads:.2f} us per lead)")
+    print()
+
+    # Доли слотов по тарифам против весов
+    by_tier = Counter()
+    for user_id, count in received.items():
+        by_tier[tier_of[user_id]] += count
+    total_weight = sum(scheduler.weights.values())
+    print(f"{'tier':<10}{'weight share':>14}{'slot share':>12}")
+    for tier, weight in scheduler.weights.items():
+        print(f"{tier:<10}{weight / total_weight:>14.3f}{by_tier[tier] / slots:>12.3f}")
+    print()
+
+    # Равномерность внутри тарифа в одном сегменте (категория, город)
+    print("Per-user spread inside a tier (min / mean / max, coefficient of variation):")
+    leads_per_key = Counter(stream)
+    for key in keys:
+        spread = []
+        for tier, user_ids in buckets[key].items():
+            counts = [received_in_segment[key][user_id] for user_id in user_ids]
+            if len(counts) < 2:
+                continue
+            mean = statistics.mean(counts)
+            cv = statistics.pstdev(counts) / mean if mean else 0.0
+            spread.append(f"{tier} {min(counts)}/{mean:.1f}/{max(counts)} cv={cv:.3f}")
+        print(f"  {key[0]} / {key[1]} ({leads_per_key[key]} leads): " + "; ".join(spread))
+
+def main():
+    parser = argparse.ArgumentParser(description="Distribution scheduler simulation")
+    parser.add_argument("--leads", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    run(args.leads, args.users, args.seed)
+
+if __name__ == "__main__":
+    main()
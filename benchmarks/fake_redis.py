@@ -0,0 +1,132 @@
+"""
+Redis в памяти процесса для бенчмарков.
+
+Поддерживает команды, которые использует бот на пути распределения
+заявок, и считает выполненные команды в ``ops``.
+"""
+
+import fnmatch
+import time
+from collections import Counter
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode()
+
+
+def _name(key):
+    return key.decode() if isinstance(key, bytes) else str(key)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return command
+
+    async def execute(self):
+        results = []
+        for name, args, kwargs in self.commands:
+            results.append(await getattr(self.redis, name)(*args, **kwargs))
+        self.commands = []
+        return results
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.ops = Counter()
+
+    def _alive(self, key):
+        key = _name(key)
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    async def get(self, key):
+        key = _name(key)
+        self.ops["get"] += 1
+        return self.data.get(key) if self._alive(key) else None
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        key = _name(key)
+        self.ops["set"] += 1
+        if nx and self._alive(key):
+            return None
+        self.data[key] = _encode(value)
+        self.expires.pop(key, None)
+        if ex:
+            self.expires[key] = time.monotonic() + ex
+        elif px:
+            self.expires[key] = time.monotonic() + px / 1000
+        return True
+
+    async def delete(self, *keys):
+        self.ops["delete"] += 1
+        deleted = 0
+        for key in map(_name, keys):
+            if self._alive(key):
+                del self.data[key]
+                self.expires.pop(key, None)
+                deleted += 1
+        return deleted
+
+    async def incr(self, key, amount=1):
+        key = _name(key)
+        self.ops["incr"] += 1
+        value = int(self.data.get(key, b"0")) + amount if self._alive(key) else amount
+        self.data[key] = _encode(value)
+        return value
+
+    async def expire(self, key, seconds):
+        key = _name(key)
+        self.ops["expire"] += 1
+        if not self._alive(key):
+            return False
+        self.expires[key] = time.monotonic() + seconds
+        return True
+
+    async def scan_iter(self, match=None, count=None):
+        self.ops["scan"] += 1
+        for key in list(self.data):
+            if self._alive(key) and (match is None or fnmatch.fnmatchcase(key, match)):
+                yield _encode(key)
+
+    async def eval(self, script, numkeys, key, token, *args):
+        # Только скрипты блокировок: снять или продлить ключ, если он наш
+        key = _name(key)
+        self.ops["eval"] += 1
+        if not self._alive(key) or self.data[key] != _encode(token):
+            return 0
+        if "'del'" in script:
+            return await self.delete(key)
+        if "'pexpire'" in script:
+            self.expires[key] = time.monotonic() + int(args[0]) / 1000
+            return 1
+        raise NotImplementedError(script)
+
+    async def flushdb(self):
+        self.ops["flushdb"] += 1
+        self.data.clear()
+        self.expires.clear()
+        return True
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def close(self):
+        pass
+
+    @property
+    def total_ops(self):
+        return sum(self.ops.values())
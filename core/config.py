@@ -10,11 +10,18 @@ class Settings(BaseSettings):
     
     # Database settings
     DATABASE_URL: str = f"sqlite+aiosqlite:///{'/app/data' if os.getenv('RENDER') else '.'}/bot.db"
+    SLOW_QUERY_MS: int = 200  # statements slower than this are logged with parameters
+    HANDLER_QUERY_WARN: int = 50  # warn when one handler call issues this many statements
     
     # Distribution settings
     DISTRIBUTION_INTERVAL: int = 3  # hours
     MAX_RECIPIENTS: int = 5  # maximum number of users to receive one lead
     DEMO_LEADS_PER_DAY: int = 5  # number of demo leads per user per day
+    LEAD_RETENTION_MONTHS: int = 6  # distributions older than this many months are archived
+    ARCHIVE_BATCH_SIZE: int = 5000  # distributions moved to the archive per transaction
+    CONFIG_POLL_SECONDS: int = 30  # runtime settings version check when no change notification arrives
+    VIEW_FLUSH_SECONDS: int = 5  # pending viewed_at marks are written at least this often
+    VIEW_FLUSH_SIZE: int = 1000  # pending viewed_at marks that trigger an immediate write
     
     # Payment settings
     YOOKASSA_SHOP_ID: Optional[str] = ""
@@ -24,10 +31,29 @@ class Settings(BaseSettings):
     # Web server settings
     WEB_SERVER_HOST: str = "0.0.0.0"
     WEB_SERVER_PORT: int = 8000
+    WEB_WORKERS: int = 1  # webhook worker processes sharing the port (SO_REUSEPORT)
     
     # Redis settings
     REDIS_URL: str = "redis://localhost"
     
+    # Update processing settings
+    UPDATE_CONCURRENCY: int = 32  # handlers running at once across chats
+    UPDATE_QUEUE_LIMIT: int = 1000  # pending updates before polling is slowed down
+    DISTRIBUTION_WORKERS: int = 4  # lead distribution workers per process
+    MARKUP_EDIT_WINDOW_MS: int = 300  # keyboard edits of one message within this window are merged
+    
+    # Health check settings
+    HEALTH_CACHE_SECONDS: int = 5  # readiness result is reused for this long
+    HEALTH_SLOW_MS: int = 500  # DB/Redis round trip above this is degraded
+    HEALTH_UPDATE_LAG: int = 300  # seconds without handled updates while some are pending
+    HEALTH_SCHEDULER_LAG: int = 180  # seconds since the last scheduler heartbeat
+    HEALTH_QUEUE_LAG: int = 600  # age of the oldest pending distribution job
+    
+    # FSM storage settings
+    FSM_STATE_TTL: int = 86400  # seconds, abandoned states are dropped by Redis
+    FSM_LOCAL_CACHE_SIZE: int = 10000  # states kept in process memory
+    USER_CACHE_TTL: int = 30  # seconds a User row is reused across updates in one process
+    
     # Webhook settings
     WEBHOOK_HOST: Optional[str] = ""
     WEBHOOK_PATH: str = "/webhook/bot"
@@ -41,6 +67,7 @@ class Settings(BaseSettings):
             "duration_days": 30,
             "leads_limit": 30,
             "delay_hours": 1,
+            "distribution_weight": 1,  # share of recipient slots
             "description": "Базовый тариф:\n• Доступ к заявкам на 30 дней\n• Просмотр контактов клиентов\n• До 30 заявок в месяц"
         },
         "pro": {
@@ -49,6 +76,7 @@ class Settings(BaseSettings):
             "duration_days": 30,
             "leads_limit": 100,
             "delay_hours": 0.5,
+            "distribution_weight": 2,
             "description": "Продвинутый тариф:\n• Доступ к заявкам на 30 дней\n• Просмотр контактов клиентов\n• До 100 заявок в месяц\n• Приоритетное получение заявок"
         },
         "premium": {
@@ -57,6 +85,7 @@ class Settings(BaseSettings):
             "duration_days": 30,
             "leads_limit": float('inf'),
             "delay_hours": 0,
+            "distribution_weight": 4,
             "description": "Премиум тариф:\n• Доступ к заявкам на 30 дней\n• Просмотр контактов клиентов\n• Неограниченное количество заявок\n• Мгновенное получение заявок\n• Персональный менеджер"
         }
     }
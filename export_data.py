@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Выгрузка заявок и распределений за период в CSV или Parquet.
+
+Строки читаются из базы порциями, поэтому память не зависит от объема
+выгрузки. Parquet требует установленного pyarrow.
+
+Запуск из каталога, где лежит пакет bot:
+    python -m bot.export_data leads --from 2024-01-01 --to 2024-02-01 -o leads.csv
+    python -m bot.export_data distributions --days 30 --format parquet -o distributions.parquet
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from bot.models.base import get_session_maker
+from bot.services.export import EXPORTS, ExportService, FORMAT_CSV, FORMAT_PARQUET
+# Все модели должны быть загружены до настройки связей
+from bot.models import distribution_job, payment, subscription  # noqa: F401
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export leads or distributions")
+    parser.add_argument("kind", choices=EXPORTS)
+    parser.add_argument("--from", dest="start", type=datetime.fromisoformat, help="start date (inclusive)")
+    parser.add_argument("--to", dest="end", type=datetime.fromisoformat, help="end date (exclusive), default now")
+    parser.add_argument("--days", type=int, default=30, help="period length when --from is not given")
+    parser.add_argument("--format", dest="file_format", choices=[FORMAT_CSV, FORMAT_PARQUET], default=FORMAT_CSV)
+    parser.add_argument("-o", "--output", help="output file, default is a temp file")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    return parser.parse_args()
+
+async def run(args) -> None:
+    end = args.end or datetime.utcnow()
+    start = args.start or end - timedelta(days=args.days)
+    service = ExportService(get_session_maker(), chunk_size=args.chunk_size)
+    path, rows = await service.export(args.kind, start, end, args.file_format, path=args.output)
+    print(f"{rows} rows written to {path}")
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(run(parse_args()))
+
+if __name__ == "__main__":
+    main()
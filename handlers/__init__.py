@@ -1,11 +1,14 @@
 from aiogram import Router
-from . import base, admin, settings, subscription
+from . import base, admin, settings, subscription, leads, search
 
 def setup_routers():
     """Setup all routers for the bot."""
     router = Router()
     
     # Include all routers
+    # leads и search - до base: base забирает все остальные личные сообщения
+    router.include_router(leads.router)
+    router.include_router(search.router)
     router.include_router(base.router)
     router.include_router(admin.router)
     router.include_router(settings.router)
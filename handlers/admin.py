@@ -1,4 +1,5 @@
 from aiogram import Router, types, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
@@ -8,15 +9,35 @@ from bot.core.config import settings
 from bot.models.user import User
 from bot.models.lead import Lead, LeadDistribution
 from bot.models.settings import BotSettings
+from bot.models.base import get_session_maker
+from bot.services.broadcast import BroadcastService
+from bot.services.export import ExportService, FORMAT_CSV, FORMAT_PARQUET, parquet_available
+from bot.services.runtime_config import runtime_config
+from bot.services.retention import get_archived_totals
+from bot.services.admin_users import AdminUsersService, FILTER_ALL, FILTER_PAID, FILTER_ACTIVE, NEXT, PREV
 from datetime import datetime, timedelta
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+import asyncio
 import json
+import logging
+import os
 
 router = Router()
+logger = logging.getLogger(__name__)
+
+# Ссылки на фоновые рассылки и выгрузки, чтобы задачи не собрал сборщик мусора
+_broadcast_tasks = set()
+_export_tasks = set()
+
+# Ограничение Telegram на размер документа, отправляемого ботом
+MAX_DOCUMENT_SIZE = 50 * 1024 * 1024
 
 class AdminSettingsStates(StatesGroup):
     editing_setting = State()
 
+class AdminBroadcastStates(StatesGroup):
+    waiting_text = State()
+
 def is_admin(user_id: int) -> bool:
     """Check if user is admin."""
     return user_id in settings.ADMIN_IDS
@@ -27,9 +48,26 @@ def get_admin_keyboard() -> types.InlineKeyboardMarkup:
     builder.button(text="📊 Статистика", callback_data="admin:stats")
     builder.button(text="👥 Пользователи", callback_data="admin:users")
     builder.button(text="⚙️ Настройки", callback_data="admin:settings")
+    builder.button(text="📢 Рассылка", callback_data="admin:broadcast")
+    builder.button(text="📤 Экспорт", callback_data="admin:export")
     builder.adjust(1)
     return builder.as_markup()
 
+def get_export_keyboard() -> types.InlineKeyboardMarkup:
+    """Create export options keyboard markup."""
+    builder = InlineKeyboardBuilder()
+    formats = [FORMAT_CSV] + ([FORMAT_PARQUET] if parquet_available() else [])
+    for kind, title in (("leads", "Заявки"), ("distributions", "Распределения")):
+        for days in (7, 30):
+            for file_format in formats:
+                builder.button(
+                    text=f"{title} за {days} дн. ({file_format.upper()})",
+                    callback_data=f"export:{kind}:{days}:{file_format}"
+                )
+    builder.button(text="🔙 Назад", callback_data="admin:back")
+    builder.adjust(len(formats))
+    return builder.as_markup()
+
 def get_settings_keyboard() -> types.InlineKeyboardMarkup:
     """Create settings keyboard markup."""
     builder = InlineKeyboardBuilder()
@@ -78,7 +116,9 @@ async def handle_admin_stats(callback: types.CallbackQuery, session: AsyncSessio
     )
     
     # Статистика по распределениям
-    total_distributions = await session.scalar(select(func.count(LeadDistribution.id)))
+    # Живая таблица хранит только период хранения, остальное - в сводке архива
+    archived = await get_archived_totals(session)
+    total_distributions = await session.scalar(select(func.count(LeadDistribution.id))) + archived["distributions"]
     today_distributions = await session.scalar(
         select(func.count(LeadDistribution.id))
         .where(LeadDistribution.sent_at >= day_ago)
@@ -108,7 +148,7 @@ async def handle_admin_stats(callback: types.CallbackQuery, session: AsyncSessio
         f"📝 Заявки:\n"
         f"- Всего: {total_leads}\n"
         f"- За 24 часа: {today_leads}\n"
-        f"- Распределений: {total_distributions}\n"
+        f"- Распределений: {total_distributions} (в архиве {archived['distributions']})\n"
         f"- Распределений за 24ч: {today_distributions}\n\n"
         f"📋 По категориям:\n"
     )
@@ -125,58 +165,113 @@ async def handle_admin_stats(callback: types.CallbackQuery, session: AsyncSessio
         reply_markup=get_admin_keyboard()
     )
 
-@router.callback_query(lambda c: c.data == "admin:users")
-async def handle_admin_users(callback: types.CallbackQuery, session: AsyncSession):
-    """Handle admin users button."""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("❌ У вас нет доступа к этой функции.", show_alert=True)
-        return
+def get_users_keyboard(page: dict, user_filter: str) -> types.InlineKeyboardMarkup:
+    """Create users page keyboard: filters, Prev/Next and back."""
+    def button(value: str, title: str) -> types.InlineKeyboardButton:
+        mark = "• " if value == user_filter else ""
+        return types.InlineKeyboardButton(text=f"{mark}{title}", callback_data=f"admin_users:{value}:{NEXT}:0")
     
-    # Get all users with their leads count
-    users = await session.execute(
-        select(User, func.count(LeadDistribution.id))
-        .outerjoin(LeadDistribution)
-        .group_by(User.id)
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        button(FILTER_ALL, "Все"),
+        button(FILTER_PAID, "💳 С оплатой"),
+        button(FILTER_ACTIVE, "✅ Активные")
     )
-    users = users.all()
+    categories = [button(f"c{i}", category) for i, category in enumerate(runtime_config.snapshot.categories)]
+    for i in range(0, len(categories), 2):
+        builder.row(*categories[i:i + 2])
     
-    if not users:
-        await callback.message.edit_text(
-            "👥 Пользователей пока нет.",
-            reply_markup=get_admin_keyboard()
-        )
-        return
+    navigation = []
+    if page["has_prev"]:
+        navigation.append(types.InlineKeyboardButton(
+            text="◀️ Назад", callback_data=f"admin_users:{user_filter}:{PREV}:{page['first_id']}"
+        ))
+    if page["has_next"]:
+        navigation.append(types.InlineKeyboardButton(
+            text="Вперед ▶️", callback_data=f"admin_users:{user_filter}:{NEXT}:{page['last_id']}"
+        ))
+    if navigation:
+        builder.row(*navigation)
     
-    users_text = "👥 Список пользователей:\n\n"
-    for user, leads_count in users:
-        status = "✅ активен" if user.is_active else "❌ не активен"
+    builder.row(types.InlineKeyboardButton(text="🔙 В меню", callback_data="admin:back"))
+    return builder.as_markup()
+
+def format_users_page(page: dict, title: str) -> str:
+    """Render one users page."""
+    if not page["users"]:
+        return f"👥 Пользователи ({title}): никого не найдено."
+    
+    users_text = f"👥 Пользователи ({title}):\n\n"
+    for user in page["users"]:
+        status = "✅ активен" if user["is_active"] else "❌ не активен"
         users_text += (
-            f"ID: {user.telegram_id}\n"
-            f"Имя: {user.full_name or 'не указано'}\n"
-            f"Username: {user.username or 'не указан'}\n"
-            f"Статус: {status}\n"
-            f"Категории: {', '.join(user.categories) if user.categories else 'не выбраны'}\n"
-            f"Города: {', '.join(user.cities) if user.cities else 'не выбраны'}\n"
-            f"Получено заявок: {leads_count}\n"
+            f"ID: {user['telegram_id']}\n"
+            f"Имя: {user['full_name'] or 'не указано'}\n"
+            f"Username: {user['username'] or 'не указан'}\n"
+            f"Статус: {status}{', оплачен' if user['is_paid'] else ''}\n"
+            f"Категории: {', '.join(user['categories']) if user['categories'] else 'не выбраны'}\n"
+            f"Города: {', '.join(user['cities']) if user['cities'] else 'не выбраны'}\n"
+            f"Получено заявок: {user['leads_count']}\n"
             "-------------------\n"
         )
+    return users_text
+
+async def show_users_page(
+    callback: types.CallbackQuery,
+    session: AsyncSession,
+    user_filter: str = FILTER_ALL,
+    direction: str = NEXT,
+    cursor: int = 0
+):
+    """Show a page of the admin users list."""
+    category = None
+    title = {FILTER_ALL: "все", FILTER_PAID: "с оплатой", FILTER_ACTIVE: "активные"}.get(user_filter)
+    if title is None:
+        # Фильтр по категории: c<номер в списке категорий>
+        categories = runtime_config.snapshot.categories
+        index = int(user_filter[1:]) if user_filter[1:].isdigit() else -1
+        if not 0 <= index < len(categories):
+            await callback.answer("Категория больше недоступна")
+            return
+        category = title = categories[index]
     
-    # Split message if it's too long
-    if len(users_text) > 4096:
-        parts = [users_text[i:i+4096] for i in range(0, len(users_text), 4096)]
-        for i, part in enumerate(parts):
-            if i == 0:
-                await callback.message.edit_text(
-                    part,
-                    reply_markup=get_admin_keyboard()
-                )
-            else:
-                await callback.message.answer(part)
-    else:
+    service = AdminUsersService(session)
+    page = await service.get_page(
+        FILTER_ALL if category else user_filter,
+        category=category,
+        cursor=cursor or None,
+        direction=direction
+    )
+    
+    try:
         await callback.message.edit_text(
-            users_text,
-            reply_markup=get_admin_keyboard()
+            format_users_page(page, title),
+            reply_markup=get_users_keyboard(page, user_filter)
         )
+    except TelegramBadRequest as e:
+        # Повторное нажатие на тот же фильтр дает ту же страницу
+        if "not modified" not in str(e):
+            raise
+    await callback.answer()
+
+@router.callback_query(lambda c: c.data == "admin:users")
+async def handle_admin_users(callback: types.CallbackQuery, session: AsyncSession):
+    """Handle admin users button."""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ У вас нет доступа к этой функции.", show_alert=True)
+        return
+    
+    await show_users_page(callback, session)
+
+@router.callback_query(lambda c: c.data.startswith("admin_users:"))
+async def handle_admin_users_page(callback: types.CallbackQuery, session: AsyncSession):
+    """Handle users list filters and Prev/Next buttons."""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ У вас нет доступа к этой функции.", show_alert=True)
+        return
+    
+    _, user_filter, direction, cursor = callback.data.split(":")
+    await show_users_page(callback, session, user_filter, direction, int(cursor))
 
 @router.callback_query(lambda c: c.data == "admin:settings")
 async def handle_admin_settings(callback: types.CallbackQuery, session: AsyncSession):
@@ -185,13 +280,14 @@ async def handle_admin_settings(callback: types.CallbackQuery, session: AsyncSes
         await callback.answer("❌ У вас нет доступа к этой функции.", show_alert=True)
         return
     
-    # Получаем текущие настройки из базы
+    # Текущие настройки из снимка runtime-конфигурации
+    config = runtime_config.snapshot
     settings_text = (
         "⚙️ Настройки бота:\n\n"
-        f"📊 Интервал распределения: {settings.DISTRIBUTION_INTERVAL} часа\n"
-        f"👥 Максимум получателей: {settings.MAX_RECIPIENTS}\n\n"
-        "📋 Доступные категории:\n" + "\n".join(f"- {cat}" for cat in settings.CATEGORIES) + "\n\n"
-        "🏢 Доступные города:\n" + "\n".join(f"- {city}" for city in settings.CITIES) + "\n\n"
+        f"📊 Интервал распределения: {config.distribution_interval} часа\n"
+        f"👥 Максимум получателей: {config.max_recipients}\n\n"
+        "📋 Доступные категории:\n" + "\n".join(f"- {cat}" for cat in config.categories) + "\n\n"
+        "🏢 Доступные города:\n" + "\n".join(f"- {city}" for city in config.cities) + "\n\n"
         "Выберите настройку для редактирования:"
     )
     
@@ -231,7 +327,7 @@ async def handle_setting_selection(callback: types.CallbackQuery, state: FSMCont
         # Показываем текущие категории с возможностью редактирования
         categories_text = (
             "📋 Текущие категории:\n\n" +
-            "\n".join(f"- {cat}" for cat in settings.CATEGORIES) +
+            "\n".join(f"- {cat}" for cat in runtime_config.snapshot.categories) +
             "\n\nДля добавления категории отправьте её название."
         )
         await state.set_state(AdminSettingsStates.editing_setting)
@@ -246,7 +342,7 @@ async def handle_setting_selection(callback: types.CallbackQuery, state: FSMCont
         # Показываем текущие города с возможностью редактирования
         cities_text = (
             "🏢 Текущие города:\n\n" +
-            "\n".join(f"- {city}" for city in settings.CITIES) +
+            "\n".join(f"- {city}" for city in runtime_config.snapshot.cities) +
             "\n\nДля добавления города отправьте его название."
         )
         await state.set_state(AdminSettingsStates.editing_setting)
@@ -284,10 +380,11 @@ async def process_setting_edit(message: types.Message, state: FSMContext, sessio
             result = await session.execute(query)
             setting = result.scalar_one_or_none()
             
+            # Копия списка: изменение JSON на месте SQLAlchemy не отследит
             if setting:
-                current_list = setting.value
+                current_list = list(setting.value)
             else:
-                current_list = getattr(settings, setting_key, [])
+                current_list = list(getattr(runtime_config.snapshot, setting_key.lower()))
             
             # Добавляем новое значение
             if message.text not in current_list:
@@ -311,8 +408,8 @@ async def process_setting_edit(message: types.Message, state: FSMContext, sessio
         
         await session.commit()
         
-        # Обновляем значение в settings
-        setattr(settings, setting_key, value)
+        # Обновляем снимок настроек во всех процессах
+        await runtime_config.publish()
         
         await message.answer(
             f"✅ Настройка {setting_key} успешно обновлена!",
@@ -328,13 +425,105 @@ async def process_setting_edit(message: types.Message, state: FSMContext, sessio
             ]])
         )
 
+@router.callback_query(lambda c: c.data == "admin:broadcast")
+async def handle_admin_broadcast(callback: types.CallbackQuery, state: FSMContext):
+    """Handle broadcast button."""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ У вас нет доступа к этой функции.", show_alert=True)
+        return
+    
+    await state.set_state(AdminBroadcastStates.waiting_text)
+    await callback.message.edit_text(
+        "📢 Отправьте текст рассылки для всех активных пользователей:",
+        reply_markup=types.InlineKeyboardMarkup(inline_keyboard=[[
+            types.InlineKeyboardButton(text="🔙 Отмена", callback_data="admin:back")
+        ]])
+    )
+
+@router.message(AdminBroadcastStates.waiting_text)
+async def process_broadcast_text(message: types.Message, state: FSMContext):
+    """Start broadcast with the given text."""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ У вас нет доступа к этой функции.")
+        return
+    
+    await state.clear()
+    if not message.text:
+        await message.answer("❌ Рассылка поддерживает только текст.", reply_markup=get_admin_keyboard())
+        return
+    
+    # Рассылка идет в фоне, прогресс приходит отдельным сообщением
+    broadcast_service = BroadcastService(get_session_maker(), message.bot)
+    task = asyncio.create_task(
+        broadcast_service.start(message.text, started_by=message.from_user.id)
+    )
+    _broadcast_tasks.add(task)
+    task.add_done_callback(_broadcast_tasks.discard)
+    logger.info(f"Broadcast started by admin {message.from_user.id}")
+
+@router.callback_query(lambda c: c.data == "admin:export")
+async def handle_admin_export(callback: types.CallbackQuery):
+    """Handle admin export button."""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ У вас нет доступа к этой функции.", show_alert=True)
+        return
+    
+    await callback.message.edit_text(
+        "📤 Экспорт данных\n\nВыберите, что выгрузить:",
+        reply_markup=get_export_keyboard()
+    )
+
+async def send_export(bot, chat_id: int, kind: str, days: int, file_format: str):
+    """Build an export file and send it as a document."""
+    end = datetime.utcnow()
+    start = end - timedelta(days=days)
+    path = None
+    try:
+        path, rows = await ExportService(get_session_maker()).export(kind, start, end, file_format)
+        if os.path.getsize(path) > MAX_DOCUMENT_SIZE:
+            await bot.send_message(
+                chat_id,
+                f"❌ Файл выгрузки ({rows} строк) больше 50 МБ. "
+                "Используйте выгрузку из командной строки: python -m bot.export_data"
+            )
+            return
+        await bot.send_document(
+            chat_id,
+            types.FSInputFile(path, filename=f"{kind}_{start:%Y%m%d}_{end:%Y%m%d}.{file_format}"),
+            caption=f"📤 {rows} строк за {days} дн."
+        )
+    except Exception as e:
+        logger.error(f"Error exporting {kind}: {str(e)}", exc_info=True)
+        await bot.send_message(chat_id, f"❌ Ошибка при выгрузке: {str(e)}")
+    finally:
+        if path and os.path.exists(path):
+            os.unlink(path)
+
+@router.callback_query(lambda c: c.data.startswith("export:"))
+async def handle_export_selection(callback: types.CallbackQuery):
+    """Start an export in the background."""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ У вас нет доступа к этой функции.", show_alert=True)
+        return
+    
+    _, kind, days, file_format = callback.data.split(":")
+    await callback.answer("⏳ Готовлю выгрузку, файл придет отдельным сообщением")
+    
+    task = asyncio.create_task(
+        send_export(callback.bot, callback.from_user.id, kind, int(days), file_format)
+    )
+    _export_tasks.add(task)
+    task.add_done_callback(_export_tasks.discard)
+    logger.info(f"Export of {kind} for {days} days started by admin {callback.from_user.id}")
+
 @router.callback_query(lambda c: c.data == "admin:back")
-async def handle_admin_back(callback: types.CallbackQuery):
+async def handle_admin_back(callback: types.CallbackQuery, state: FSMContext):
     """Handle back button in admin panel."""
     if not is_admin(callback.from_user.id):
         await callback.answer("❌ У вас нет доступа к этой функции.", show_alert=True)
         return
     
+    await state.clear()
     await callback.message.edit_text(
         "🔧 Админ-панель\n\nВыберите действие:",
         reply_markup=get_admin_keyboard()
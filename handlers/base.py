@@ -1,3 +1,4 @@
+from typing import Optional
 from aiogram import Router, F, types
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
@@ -5,11 +6,11 @@ from sqlalchemy import select, and_, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from bot.models.user import User
 from bot.models.subscription import Subscription
-from bot.models.lead_distribution import LeadDistribution
+from bot.models.lead import LeadDistribution
 from bot.core.config import settings
-from bot.services.distribution import DistributionService
+from bot.services.distribution_queue import enqueue_lead
+from bot.services.metrics import LEADS
 from bot.services.parser import LeadParser
-from bot.models.lead import Lead
 from datetime import datetime
 import logging
 
@@ -29,7 +30,11 @@ def get_main_keyboard(is_admin: bool = False) -> types.ReplyKeyboardMarkup:
             types.KeyboardButton(text="💳 Подписка")
         ],
         [
-            types.KeyboardButton(text="🎮 Демо режим"),
+            types.KeyboardButton(text="📂 Мои заявки"),
+            types.KeyboardButton(text="🎮 Демо режим")
+        ],
+        [
+            types.KeyboardButton(text="🔍 Поиск"),
             types.KeyboardButton(text="ℹ️ Помощь")
         ]
     ]
@@ -43,16 +48,11 @@ def get_main_keyboard(is_admin: bool = False) -> types.ReplyKeyboardMarkup:
     )
 
 @router.message(Command("start"))
-async def cmd_start(message: types.Message, session: AsyncSession):
+async def cmd_start(message: types.Message, session: AsyncSession, user: Optional[User] = None):
     """Handle /start command."""
     logger.info(f"Processing /start command for user {message.from_user.id}")
     
     try:
-        # Check if user exists
-        query = select(User).where(User.telegram_id == message.from_user.id)
-        result = await session.execute(query)
-        user = result.scalar_one_or_none()
-        
         logger.info(f"User query result: {user}")
         is_admin = message.from_user.id in settings.ADMIN_IDS
         
@@ -82,6 +82,9 @@ async def cmd_start(message: types.Message, session: AsyncSession):
             )
         else:
             logger.info(f"User already exists: {user.telegram_id}")
+            if user.blocked_at:
+                # Пользователь снова написал боту - возвращаем его в рассылки
+                user.blocked_at = None
             welcome_text = (
                 "👋 С возвращением!\n\n"
                 "Ваши текущие настройки:\n"
@@ -125,6 +128,8 @@ async def handle_help(message: types.Message):
         "🏢 Города - выбор городов\n"
         "📊 Мои настройки - текущие настройки\n"
         "💳 Подписка - управление подпиской\n"
+        "📂 Мои заявки - полученные заявки и их статусы\n"
+        "🔍 Поиск - поиск по полученным заявкам (/search текст)\n"
         "🎮 Демо режим - включить/выключить тестовые заявки\n"
         "ℹ️ Помощь - справка\n\n"
         "💡 Как это работает:\n"
@@ -141,12 +146,8 @@ async def handle_help(message: types.Message):
     await message.answer(help_text)
 
 @router.message(F.text == "📊 Мои настройки")
-async def handle_status(message: types.Message, session: AsyncSession):
+async def handle_status(message: types.Message, session: AsyncSession, user: Optional[User] = None):
     """Handle status button."""
-    query = select(User).where(User.telegram_id == message.from_user.id)
-    result = await session.execute(query)
-    user = result.scalar_one_or_none()
-    
     if not user:
         await message.answer("❌ Вы не зарегистрированы. Используйте /start для регистрации.")
         return
@@ -205,22 +206,14 @@ async def handle_group_message(message: types.Message, session: AsyncSession):
         lead_data = await lead_parser.parse_message(message)
         if not lead_data:
             logger.info(f"Message {message.message_id} in chat {message.chat.id} was not recognized as a lead")
+            LEADS.inc(result="rejected")
             return
 
-        # Create lead and distribute it
-        lead = Lead(**lead_data)
-        session.add(lead)
-        await session.commit()
-        
-        # Distribute lead
-        distribution_service = DistributionService(session)
-        distributions = await distribution_service.distribute_lead(lead)
-        
-        if not distributions:
-            logger.warning(f"No eligible users found for lead {lead.id}")
-        else:
-            logger.info(f"Lead {lead.id} distributed to {len(distributions)} users")
-            
+        # Сохраняем заявку и задание на распределение, рассылают воркеры
+        lead = await enqueue_lead(session, lead_data)
+        LEADS.inc(result="parsed")
+        logger.info(f"Lead {lead.id} queued for distribution")
+
     except Exception as e:
         logger.error(f"Error processing message {message.message_id} in chat {message.chat.id}: {str(e)}")
         # Можно также отправить уведомление администраторам
@@ -0,0 +1,200 @@
+from typing import Dict, Optional
+from aiogram import Router, types, F
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from sqlalchemy.ext.asyncio import AsyncSession
+from bot.models.user import User
+from bot.core.config import settings
+from bot.services.distribution import DistributionService
+from bot.services.lead_status import LeadStatusService, STATUSES, FILTER_ALL, NEXT, PREV
+import logging
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+NOT_REGISTERED = "❌ Вы не зарегистрированы. Используйте /start для регистрации."
+
+def status_filter(value: str) -> Optional[str]:
+    """Status by its position in callback data ("a" - all statuses)."""
+    if value == "a":
+        return FILTER_ALL
+    if value.isdigit() and int(value) < len(STATUSES):
+        return STATUSES[int(value)]
+    return None
+
+def get_summary_keyboard(counts: Dict[str, int]) -> types.InlineKeyboardMarkup:
+    """Create status filter keyboard with counts."""
+    builder = InlineKeyboardBuilder()
+    builder.row(types.InlineKeyboardButton(
+        text=f"Все ({sum(counts.values())})", callback_data=f"my_leads:a:{NEXT}:0"
+    ))
+    buttons = [
+        types.InlineKeyboardButton(
+            text=f"{settings.LEAD_STATUSES[status]} ({counts[status]})",
+            callback_data=f"my_leads:{index}:{NEXT}:0"
+        )
+        for index, status in enumerate(STATUSES)
+    ]
+    for i in range(0, len(buttons), 2):
+        builder.row(*buttons[i:i + 2])
+    return builder.as_markup()
+
+def format_summary(counts: Dict[str, int]) -> str:
+    if not sum(counts.values()):
+        return "📂 У вас пока нет полученных заявок."
+    lines = [f"{settings.LEAD_STATUSES[status]}: {counts[status]}" for status in STATUSES if counts[status]]
+    return "📂 Мои заявки\n\n" + "\n".join(lines) + "\n\nВыберите статус:"
+
+def get_page_keyboard(page: dict, value: str) -> types.InlineKeyboardMarkup:
+    """Create leads page keyboard: one button per lead, Prev/Next and back."""
+    builder = InlineKeyboardBuilder()
+    for distribution, lead in page["items"]:
+        builder.row(types.InlineKeyboardButton(
+            text=f"{distribution.sent_at:%d.%m} {lead.category}, {lead.city}",
+            callback_data=f"lead:{distribution.id}:{value}"
+        ))
+
+    navigation = []
+    if page["has_prev"]:
+        navigation.append(types.InlineKeyboardButton(
+            text="◀️ Назад", callback_data=f"my_leads:{value}:{PREV}:{page['first']}"
+        ))
+    if page["has_next"]:
+        navigation.append(types.InlineKeyboardButton(
+            text="Вперед ▶️", callback_data=f"my_leads:{value}:{NEXT}:{page['last']}"
+        ))
+    if navigation:
+        builder.row(*navigation)
+
+    builder.row(types.InlineKeyboardButton(text="🔙 К статусам", callback_data="my_leads:summary"))
+    return builder.as_markup()
+
+def format_page(page: dict, status: str) -> str:
+    title = "все" if status == FILTER_ALL else settings.LEAD_STATUSES[status]
+    if not page["items"]:
+        return f"📂 Мои заявки ({title}): заявок нет."
+
+    lines = []
+    for distribution, lead in page["items"]:
+        line = f"{distribution.sent_at:%d.%m.%Y} • {lead.category}, {lead.city}"
+        if status == FILTER_ALL:
+            line += f" • {settings.LEAD_STATUSES[distribution.status]}"
+        lines.append(line)
+    return f"📂 Мои заявки ({title}):\n\n" + "\n".join(lines)
+
+def get_lead_keyboard(distribution_id: int, status: str, value: str) -> types.InlineKeyboardMarkup:
+    """Create status change keyboard for one lead."""
+    current = STATUSES.index(status)
+    buttons = [
+        types.InlineKeyboardButton(
+            text=settings.LEAD_STATUSES[new_status],
+            callback_data=f"lead_status:{distribution_id}:{current}:{index}:{value}"
+        )
+        for index, new_status in enumerate(STATUSES)
+        if new_status != status
+    ]
+    builder = InlineKeyboardBuilder()
+    for i in range(0, len(buttons), 2):
+        builder.row(*buttons[i:i + 2])
+    builder.row(types.InlineKeyboardButton(text="🔙 К списку", callback_data=f"my_leads:{value}:{NEXT}:0"))
+    return builder.as_markup()
+
+async def show_lead(
+    callback: types.CallbackQuery,
+    session: AsyncSession,
+    user: User,
+    distribution_id: int,
+    value: str
+) -> bool:
+    """Show one lead with its status buttons. Answers the callback itself if not found."""
+    row = await LeadStatusService(session).get_distribution(user.id, distribution_id)
+    if not row:
+        await callback.answer("Заявка не найдена")
+        return False
+    distribution, lead = row
+
+    distribution_service = DistributionService(session)
+    await distribution_service.mark_distribution_viewed(distribution.id)
+
+    await callback.message.edit_text(
+        distribution_service.format_lead_for_user(lead, user)
+        + f"\n\n📌 Статус: {settings.LEAD_STATUSES[distribution.status]}",
+        reply_markup=get_lead_keyboard(distribution.id, distribution.status, value)
+    )
+    return True
+
+@router.message(F.text == "📂 Мои заявки")
+async def handle_my_leads(message: types.Message, session: AsyncSession, user: Optional[User] = None):
+    """Handle my leads button: counts by status."""
+    if not user:
+        await message.answer(NOT_REGISTERED)
+        return
+
+    counts = await LeadStatusService(session).get_counts(user.id)
+    await message.answer(format_summary(counts), reply_markup=get_summary_keyboard(counts))
+
+@router.callback_query(lambda c: c.data == "my_leads:summary")
+async def handle_my_leads_summary(callback: types.CallbackQuery, session: AsyncSession, user: Optional[User] = None):
+    """Handle back to statuses button."""
+    if not user:
+        await callback.answer(NOT_REGISTERED, show_alert=True)
+        return
+
+    counts = await LeadStatusService(session).get_counts(user.id)
+    await callback.message.edit_text(format_summary(counts), reply_markup=get_summary_keyboard(counts))
+    await callback.answer()
+
+@router.callback_query(lambda c: c.data.startswith("my_leads:"))
+async def handle_my_leads_page(callback: types.CallbackQuery, session: AsyncSession, user: Optional[User] = None):
+    """Handle status filter and Prev/Next buttons."""
+    if not user:
+        await callback.answer(NOT_REGISTERED, show_alert=True)
+        return
+
+    _, value, direction, cursor = callback.data.split(":")
+    status = status_filter(value)
+    if status is None:
+        await callback.answer("Статус больше недоступен")
+        return
+
+    page = await LeadStatusService(session).get_page(
+        user.id,
+        status,
+        cursor=None if cursor == "0" else cursor,
+        direction=direction
+    )
+    await callback.message.edit_text(format_page(page, status), reply_markup=get_page_keyboard(page, value))
+    await callback.answer()
+
+@router.callback_query(lambda c: c.data.startswith("lead:"))
+async def handle_lead(callback: types.CallbackQuery, session: AsyncSession, user: Optional[User] = None):
+    """Handle lead button in the list."""
+    if not user:
+        await callback.answer(NOT_REGISTERED, show_alert=True)
+        return
+
+    _, distribution_id, value = callback.data.split(":")
+    if await show_lead(callback, session, user, int(distribution_id), value):
+        await callback.answer()
+
+@router.callback_query(lambda c: c.data.startswith("lead_status:"))
+async def handle_lead_status(callback: types.CallbackQuery, session: AsyncSession, user: Optional[User] = None):
+    """Handle status change button."""
+    if not user:
+        await callback.answer(NOT_REGISTERED, show_alert=True)
+        return
+
+    try:
+        _, distribution_id, old_index, new_index, value = callback.data.split(":")
+        old_status, new_status = STATUSES[int(old_index)], STATUSES[int(new_index)]
+
+        changed = await LeadStatusService(session).set_status(user.id, int(distribution_id), old_status, new_status)
+        if not await show_lead(callback, session, user, int(distribution_id), value):
+            return
+        if changed:
+            await callback.answer(f"Статус: {settings.LEAD_STATUSES[new_status]}")
+        else:
+            # Статус уже поменяли с другого сообщения - показываем актуальный
+            await callback.answer("Статус заявки уже изменен")
+    except Exception as e:
+        logger.error(f"Error changing lead status: {str(e)}")
+        await callback.answer("❌ Не удалось изменить статус", show_alert=True)
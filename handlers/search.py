@@ -0,0 +1,137 @@
+from typing import Optional
+from aiogram import Router, types, F
+from aiogram.dispatcher.event.bases import SkipHandler
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from sqlalchemy.ext.asyncio import AsyncSession
+from bot.models.user import User
+from bot.core.config import settings
+from bot.services.search import LeadSearchService
+from bot.handlers.base import get_main_keyboard
+import logging
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 5
+# Дальше по выдаче не листаем: лучше уточнить запрос
+MAX_PAGES = 20
+MAX_QUERY_LENGTH = 100
+
+# Кнопки меню и команды во время ввода запроса отменяют поиск
+# и обрабатываются как обычно
+MENU_BUTTONS = {button.text for row in get_main_keyboard(is_admin=True).keyboard for button in row}
+
+class SearchStates(StatesGroup):
+    waiting_query = State()
+
+def get_results_keyboard(page: dict, number: int) -> types.InlineKeyboardMarkup:
+    """Create results keyboard: open buttons for received leads and Prev/Next."""
+    builder = InlineKeyboardBuilder()
+    for position, item in enumerate(page["items"], start=number * PAGE_SIZE + 1):
+        if item["distribution_id"]:
+            # Карточка заявки из раздела "Мои заявки"
+            builder.row(types.InlineKeyboardButton(
+                text=f"{position}. {item['category']}, {item['city']}",
+                callback_data=f"lead:{item['distribution_id']}:a"
+            ))
+
+    navigation = []
+    if number > 0:
+        navigation.append(types.InlineKeyboardButton(text="◀️ Назад", callback_data=f"search:{number - 1}"))
+    if page["has_next"] and number + 1 < MAX_PAGES:
+        navigation.append(types.InlineKeyboardButton(text="Вперед ▶️", callback_data=f"search:{number + 1}"))
+    if navigation:
+        builder.row(*navigation)
+    return builder.as_markup()
+
+def format_results(page: dict, query: str, number: int, show_phone: bool) -> str:
+    if not page["items"]:
+        return f"🔍 По запросу «{query}» ничего не найдено."
+
+    results_text = f"🔍 Результаты по запросу «{query}» (стр. {number + 1}):\n\n"
+    for position, item in enumerate(page["items"], start=number * PAGE_SIZE + 1):
+        results_text += f"{position}. {item['created_at']:%d.%m.%Y} • {item['category']}, {item['city']}\n"
+        if show_phone and item["phone"]:
+            results_text += f"📱 {item['phone']}\n"
+        results_text += f"{item['snippet']}\n\n"
+    return results_text
+
+async def run_search(session: AsyncSession, user_id: int, telegram_id: int, query: str, number: int = 0):
+    """Search as the given user: admins see all leads, others only received ones."""
+    is_admin = telegram_id in settings.ADMIN_IDS
+    page = await LeadSearchService(session, PAGE_SIZE).search(query, user_id=None if is_admin else user_id, page=number)
+    return format_results(page, query, number, show_phone=is_admin), get_results_keyboard(page, number)
+
+@router.message(Command("search"))
+@router.message(F.text == "🔍 Поиск")
+async def handle_search(
+    message: types.Message,
+    session: AsyncSession,
+    state: FSMContext,
+    command: Optional[CommandObject] = None,
+    user: Optional[User] = None
+):
+    """Handle search button and /search command."""
+    if not user:
+        await message.answer("❌ Вы не зарегистрированы. Используйте /start для регистрации.")
+        return
+
+    if command and command.args:
+        query = command.args.strip()[:MAX_QUERY_LENGTH]
+        await state.update_data(search_query=query)
+        text, markup = await run_search(session, user.id, message.from_user.id, query)
+        await message.answer(text, reply_markup=markup)
+        return
+
+    await state.set_state(SearchStates.waiting_query)
+    scope = "всем заявкам" if message.from_user.id in settings.ADMIN_IDS else "полученным вами заявкам"
+    await message.answer(
+        "🔍 Введите слова из описания, имя или часть номера телефона.\n"
+        f"Поиск идет по {scope}."
+    )
+
+@router.message(SearchStates.waiting_query, F.text.startswith("/") | F.text.in_(MENU_BUTTONS))
+async def cancel_search_query(message: types.Message, state: FSMContext):
+    """Leave search input and pass the command or menu button on to its handler."""
+    await state.set_state(None)
+    raise SkipHandler()
+
+@router.message(SearchStates.waiting_query, ~F.text.startswith("/"), ~F.text.in_(MENU_BUTTONS))
+async def process_search_query(
+    message: types.Message,
+    session: AsyncSession,
+    state: FSMContext,
+    user: Optional[User] = None
+):
+    """Handle search query input."""
+    if not user or not message.text:
+        await state.set_state(None)
+        return
+
+    query = message.text.strip()[:MAX_QUERY_LENGTH]
+    # Запрос сохраняется для листания страниц
+    await state.set_state(None)
+    await state.update_data(search_query=query)
+    text, markup = await run_search(session, user.id, message.from_user.id, query)
+    await message.answer(text, reply_markup=markup)
+
+@router.callback_query(lambda c: c.data.startswith("search:"))
+async def handle_search_page(
+    callback: types.CallbackQuery,
+    session: AsyncSession,
+    state: FSMContext,
+    user: Optional[User] = None
+):
+    """Handle results Prev/Next buttons."""
+    query = (await state.get_data()).get("search_query")
+    if not user or not query:
+        await callback.answer("Поиск устарел, повторите запрос", show_alert=True)
+        return
+
+    number = min(int(callback.data.split(":")[1]), MAX_PAGES - 1)
+    text, markup = await run_search(session, user.id, callback.from_user.id, query, number)
+    await callback.message.edit_text(text, reply_markup=markup)
+    await callback.answer()
@@ -1,3 +1,4 @@
+from typing import Optional
 from aiogram import Router, types, F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
@@ -9,6 +10,8 @@ from bot.core.config import settings
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from bot.services.distribution import DistributionService
 from bot.services.demo_data import is_working_hours
+from bot.services.runtime_config import runtime_config
+from bot.services.markup_editor import markup_editor
 import logging
 
 router = Router()
@@ -18,131 +21,161 @@ class SettingsStates(StatesGroup):
     selecting_categories = State()
     selecting_cities = State()
 
-def get_categories_keyboard(selected_categories=None):
+def to_mask(names, index) -> int:
+    """Bitmask of ``names`` by their positions in the vocabulary."""
+    mask = 0
+    for name in names or []:
+        position = index.get(name)
+        if position is not None:
+            mask |= 1 << position
+    return mask
+
+def from_mask(items, mask: int) -> list:
+    """Vocabulary items selected in ``mask``."""
+    return [item for position, item in enumerate(items) if mask >> position & 1]
+
+class SelectionKeyboardCache:
+    """Prebuilt selection keyboards keyed by (settings version, bitmask).
+
+    Vocabularies change only on admin edits, so after the first render
+    of a combination every toggle is a dict lookup.
+    """
+
+    def __init__(self, vocabulary: str, prefix: str, done_data: str, max_size: int = 4096):
+        self.vocabulary = vocabulary
+        self.prefix = prefix
+        self.done_data = done_data
+        self.max_size = max_size
+        self._version = None
+        self._markups = {}
+
+    def get(self, mask: int) -> types.InlineKeyboardMarkup:
+        config = runtime_config.snapshot
+        if config.version != self._version:
+            # Новая версия настроек - старые клавиатуры больше не нужны
+            self._markups = {}
+            self._version = config.version
+
+        markup = self._markups.get(mask)
+        if markup is None:
+            if len(self._markups) >= self.max_size:
+                self._markups = {}
+            markup = self._markups[mask] = self._build(getattr(config, self.vocabulary), mask)
+        return markup
+
+    def _build(self, items, mask: int) -> types.InlineKeyboardMarkup:
+        builder = InlineKeyboardBuilder()
+        for position, item in enumerate(items):
+            status = "✅" if mask >> position & 1 else "⬜️"
+            # В callback_data номер, а не название: короче и сразу дает бит маски
+            builder.button(text=f"{status} {item}", callback_data=f"{self.prefix}:{position}")
+        builder.button(text="✅ Готово", callback_data=self.done_data)
+        builder.adjust(1)
+        return builder.as_markup()
+
+categories_keyboards = SelectionKeyboardCache("categories", "category", "categories:done")
+cities_keyboards = SelectionKeyboardCache("cities", "city", "cities:done")
+
+def get_categories_keyboard(selected_mask: int = 0):
     """Create inline keyboard with categories."""
-    selected_categories = selected_categories or []
-    builder = InlineKeyboardBuilder()
-    
-    for category in settings.CATEGORIES:
-        status = "✅" if category in selected_categories else "⬜️"
-        builder.button(
-            text=f"{status} {category}",
-            callback_data=f"category:{category}"
-        )
-    
-    builder.button(text="✅ Готово", callback_data="categories:done")
-    builder.adjust(1)
-    return builder.as_markup()
+    return categories_keyboards.get(selected_mask)
 
-def get_cities_keyboard(selected_cities=None):
+def get_cities_keyboard(selected_mask: int = 0):
     """Create inline keyboard with cities."""
-    selected_cities = selected_cities or []
-    builder = InlineKeyboardBuilder()
-    
-    for city in settings.CITIES:
-        status = "✅" if city in selected_cities else "⬜️"
-        builder.button(
-            text=f"{status} {city}",
-            callback_data=f"city:{city}"
-        )
-    
-    builder.button(text="✅ Готово", callback_data="cities:done")
-    builder.adjust(1)
-    return builder.as_markup()
+    return cities_keyboards.get(selected_mask)
+
+def parse_position(callback_data: str, index) -> int:
+    """Bit position from ``prefix:<position>`` (or an old ``prefix:<name>``) callback."""
+    value = callback_data.split(":", 1)[1]
+    try:
+        return int(value)
+    except ValueError:
+        # Клавиатуры, отправленные до перехода на номера
+        return index.get(value, -1)
 
 @router.message(F.text == "📋 Категории")
-async def handle_categories(message: types.Message, state: FSMContext, session: AsyncSession):
+async def handle_categories(message: types.Message, state: FSMContext, session: AsyncSession, user: Optional[User] = None):
     """Handle categories button."""
-    query = select(User).where(User.telegram_id == message.from_user.id)
-    result = await session.execute(query)
-    user = result.scalar_one_or_none()
-    
     if not user:
         await message.answer("❌ Вы не зарегистрированы. Используйте /start для регистрации.")
         return
     
+    categories_mask = to_mask(user.categories, runtime_config.snapshot.category_index)
     await state.set_state(SettingsStates.selecting_categories)
-    await state.update_data(selected_categories=user.categories or [])
+    await state.update_data(categories_mask=categories_mask)
     
     await message.answer(
         "📋 Выберите категории заявок:\n"
         "✅ - выбрано\n"
         "⬜️ - не выбрано\n\n"
         "После выбора всех нужных категорий нажмите кнопку ✅ Готово",
-        reply_markup=get_categories_keyboard(user.categories)
+        reply_markup=get_categories_keyboard(categories_mask)
     )
 
 @router.message(F.text == "🏢 Города")
-async def handle_cities(message: types.Message, state: FSMContext, session: AsyncSession):
+async def handle_cities(message: types.Message, state: FSMContext, session: AsyncSession, user: Optional[User] = None):
     """Handle cities button."""
-    query = select(User).where(User.telegram_id == message.from_user.id)
-    result = await session.execute(query)
-    user = result.scalar_one_or_none()
-    
     if not user:
         await message.answer("❌ Вы не зарегистрированы. Используйте /start для регистрации.")
         return
     
+    cities_mask = to_mask(user.cities, runtime_config.snapshot.city_index)
     await state.set_state(SettingsStates.selecting_cities)
-    await state.update_data(selected_cities=user.cities or [])
+    await state.update_data(cities_mask=cities_mask)
     
     await message.answer(
         "🏢 Выберите города:\n"
         "✅ - выбрано\n"
         "⬜️ - не выбрано\n\n"
         "После выбора всех нужных городов нажмите кнопку ✅ Готово",
-        reply_markup=get_cities_keyboard(user.cities)
+        reply_markup=get_cities_keyboard(cities_mask)
     )
 
 @router.callback_query(lambda c: c.data.startswith("category:"))
 async def process_category_selection(callback: types.CallbackQuery, state: FSMContext):
     """Handle category selection."""
-    category = callback.data.split(":")[1]
-    data = await state.get_data()
-    selected_categories = data.get("selected_categories", [])
+    config = runtime_config.snapshot
+    position = parse_position(callback.data, config.category_index)
+    if not 0 <= position < len(config.categories):
+        await callback.answer("Категория больше недоступна")
+        return
     
-    if category in selected_categories:
-        selected_categories.remove(category)
-    else:
-        selected_categories.append(category)
+    # Отвечаем сразу, клавиатура обновится после паузы между нажатиями
+    await callback.answer()
+    data = await state.get_data()
+    categories_mask = data.get("categories_mask", 0) ^ (1 << position)
     
-    await state.update_data(selected_categories=selected_categories)
-    await callback.message.edit_reply_markup(
-        reply_markup=get_categories_keyboard(selected_categories)
-    )
+    await state.update_data(categories_mask=categories_mask)
+    markup_editor.submit(callback.message, get_categories_keyboard(categories_mask))
 
 @router.callback_query(lambda c: c.data.startswith("city:"))
 async def process_city_selection(callback: types.CallbackQuery, state: FSMContext):
     """Handle city selection."""
-    city = callback.data.split(":")[1]
-    data = await state.get_data()
-    selected_cities = data.get("selected_cities", [])
+    config = runtime_config.snapshot
+    position = parse_position(callback.data, config.city_index)
+    if not 0 <= position < len(config.cities):
+        await callback.answer("Город больше недоступен")
+        return
     
-    if city in selected_cities:
-        selected_cities.remove(city)
-    else:
-        selected_cities.append(city)
+    # Отвечаем сразу, клавиатура обновится после паузы между нажатиями
+    await callback.answer()
+    data = await state.get_data()
+    cities_mask = data.get("cities_mask", 0) ^ (1 << position)
     
-    await state.update_data(selected_cities=selected_cities)
-    await callback.message.edit_reply_markup(
-        reply_markup=get_cities_keyboard(selected_cities)
-    )
+    await state.update_data(cities_mask=cities_mask)
+    markup_editor.submit(callback.message, get_cities_keyboard(cities_mask))
 
 @router.callback_query(lambda c: c.data == "categories:done")
-async def process_categories_done(callback: types.CallbackQuery, state: FSMContext, session: AsyncSession):
+async def process_categories_done(callback: types.CallbackQuery, state: FSMContext, session: AsyncSession, user: Optional[User] = None):
     """Handle categories selection completion."""
     try:
         data = await state.get_data()
-        selected_categories = data.get("selected_categories", [])
+        selected_categories = from_mask(runtime_config.snapshot.categories, data.get("categories_mask", 0))
         
         if not selected_categories:
             await callback.answer("❗️ Выберите хотя бы одну категорию", show_alert=True)
             return
         
-        query = select(User).where(User.telegram_id == callback.from_user.id)
-        result = await session.execute(query)
-        user = result.scalar_one_or_none()
-        
         if user:
             # Сохраняем предыдущие настройки для сравнения
             old_categories = user.categories
@@ -152,6 +185,9 @@ async def process_categories_done(callback: types.CallbackQuery, state: FSMConte
             await session.commit()
             await state.clear()
             
+            # Отложенная правка клавиатуры вернула бы ее в замененное сообщение
+            markup_editor.discard(callback.message)
+            
             # Формируем текст с изменениями
             changes_text = ""
             if old_categories:
@@ -194,20 +230,16 @@ async def process_categories_done(callback: types.CallbackQuery, state: FSMConte
         await callback.answer("❌ Ошибка при сохранении категорий", show_alert=True)
 
 @router.callback_query(lambda c: c.data == "cities:done")
-async def process_cities_done(callback: types.CallbackQuery, state: FSMContext, session: AsyncSession):
+async def process_cities_done(callback: types.CallbackQuery, state: FSMContext, session: AsyncSession, user: Optional[User] = None):
     """Handle cities selection completion."""
     try:
         data = await state.get_data()
-        selected_cities = data.get("selected_cities", [])
+        selected_cities = from_mask(runtime_config.snapshot.cities, data.get("cities_mask", 0))
         
         if not selected_cities:
             await callback.answer("❗️ Выберите хотя бы один город", show_alert=True)
             return
         
-        query = select(User).where(User.telegram_id == callback.from_user.id)
-        result = await session.execute(query)
-        user = result.scalar_one_or_none()
-        
         if user:
             # Сохраняем предыдущие настройки для сравнения
             old_cities = user.cities
@@ -217,6 +249,9 @@ async def process_cities_done(callback: types.CallbackQuery, state: FSMContext,
             await session.commit()
             await state.clear()
             
+            # Отложенная правка клавиатуры вернула бы ее в замененное сообщение
+            markup_editor.discard(callback.message)
+            
             # Формируем текст с изменениями
             changes_text = ""
             if old_cities:
@@ -259,14 +294,9 @@ async def process_cities_done(callback: types.CallbackQuery, state: FSMContext,
         await callback.answer("❌ Ошибка при сохранении городов", show_alert=True)
 
 @router.message(F.text == "🎮 Демо режим")
-async def handle_demo(message: types.Message, session: AsyncSession):
+async def handle_demo(message: types.Message, session: AsyncSession, user: Optional[User] = None):
     """Handle demo mode button."""
     try:
-        # Получаем пользователя
-        query = select(User).where(User.telegram_id == message.from_user.id)
-        result = await session.execute(query)
-        user = result.scalar_one_or_none()
-        
         if not user:
             await message.answer(
                 "❌ Вы не зарегистрированы.\n"
@@ -1,3 +1,4 @@
+from typing import Optional
 from aiogram import Router, types, F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
@@ -41,12 +42,8 @@ def get_plans_keyboard() -> types.InlineKeyboardMarkup:
     return builder.as_markup()
 
 @router.message(F.text == "💳 Подписка")
-async def handle_subscription(message: types.Message, session: AsyncSession):
+async def handle_subscription(message: types.Message, session: AsyncSession, user: Optional[User] = None):
     """Handle subscription button."""
-    query = select(User).where(User.telegram_id == message.from_user.id)
-    result = await session.execute(query)
-    user = result.scalar_one_or_none()
-    
     if not user:
         await message.answer("❌ Вы не зарегистрированы. Используйте /start для регистрации.")
         return
@@ -86,12 +83,8 @@ async def handle_plans(callback: types.CallbackQuery):
     )
 
 @router.callback_query(lambda c: c.data == "subscription:status")
-async def handle_status(callback: types.CallbackQuery, session: AsyncSession):
+async def handle_status(callback: types.CallbackQuery, session: AsyncSession, user: Optional[User] = None):
     """Handle subscription status button."""
-    query = select(User).where(User.telegram_id == callback.from_user.id)
-    result = await session.execute(query)
-    user = result.scalar_one_or_none()
-    
     subscription_service = SubscriptionService(session)
     subscription = await subscription_service.get_user_subscription(user.id)
     
@@ -117,16 +110,12 @@ async def handle_status(callback: types.CallbackQuery, session: AsyncSession):
     )
 
 @router.callback_query(lambda c: c.data.startswith("plan:"))
-async def handle_plan_selection(callback: types.CallbackQuery, session: AsyncSession, state: FSMContext):
+async def handle_plan_selection(callback: types.CallbackQuery, session: AsyncSession, state: FSMContext, user: Optional[User] = None):
     """Handle plan selection."""
     try:
         plan_id = callback.data.split(":")[1]
         plan = settings.SUBSCRIPTION_PLANS[plan_id]
         
-        query = select(User).where(User.telegram_id == callback.from_user.id)
-        result = await session.execute(query)
-        user = result.scalar_one_or_none()
-        
         # Создаем платеж
         payment_service = PaymentService(session)
         payment = await payment_service.create_payment(
@@ -7,7 +7,11 @@ import json
 logger = logging.getLogger(__name__)
 
 async def handle_yookassa_webhook(request: web.Request) -> web.Response:
-    """Handle YooKassa webhook."""
+    """Handle YooKassa webhook.
+
+    Only validates the notification and stores it in the inbox; the
+    payment itself is applied by ``PaymentInboxConsumer``.
+    """
     try:
         # Проверяем подпись запроса
         signature = request.headers.get("X-YooKassa-Signature")
@@ -16,18 +20,25 @@ async def handle_yookassa_webhook(request: web.Request) -> web.Response:
             return web.Response(status=400)
         
         # Получаем данные запроса
-        data = await request.json()
-        logger.info(f"Received YooKassa webhook: {json.dumps(data)}")
+        try:
+            data = await request.json()
+        except json.JSONDecodeError:
+            logger.warning("Invalid YooKassa webhook body")
+            return web.Response(status=400)
         
-        # Создаем сессию и сервис
+        # Сохраняем событие во входящие
         async with request.app["session_maker"]() as session:
             payment_service = PaymentService(session)
-            
-            # Обрабатываем уведомление
-            if await payment_service.process_webhook(data):
-                return web.Response(status=200)
-            else:
+            try:
+                stored = await payment_service.process_webhook(data)
+            except ValueError as e:
+                logger.warning(str(e))
                 return web.Response(status=400)
+        
+        if stored and "payment_inbox" in request.app:
+            request.app["payment_inbox"].notify()
+        
+        return web.Response(status=200)
                 
     except Exception as e:
         logger.error(f"Error processing YooKassa webhook: {str(e)}", exc_info=True)
@@ -35,4 +46,4 @@ async def handle_yookassa_webhook(request: web.Request) -> web.Response:
 
 def setup_webhook_routes(app: web.Application) -> None:
     """Setup webhook routes."""
-    app.router.add_post("/webhook/yookassa", handle_yookassa_webhook) 
\ No newline at end of file
+    app.router.add_post("/webhook/yookassa", handle_yookassa_webhook) 
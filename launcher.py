@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Единая точка запуска бота.
+
+В одном asyncio-процессе проверяет переменные окружения, применяет миграции
+(только если база отстает от последней ревизии), запускает бота и
+HTTP-сервер с /health и /metrics. В лог пишет время холодного старта и
+занимаемую процессом память.
+"""
+
+import time
+
+# Отсчет холодного старта - до тяжелых импортов
+STARTED_AT = time.perf_counter()
+
+import asyncio
+import logging
+import os
+import resource
+import signal
+import sys
+
+from check_env import check_env_vars
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+def rss_mb() -> float:
+    """Current resident memory of the process in MB."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Нет /proc (macOS) - берем пиковое значение
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+async def run_migrations_if_needed() -> bool:
+    """Upgrade the database to head unless it is already there."""
+    from alembic import command
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+    from bot.models.base import get_engine
+
+    config = Config(ALEMBIC_INI)
+    head = ScriptDirectory.from_config(config).get_current_head()
+
+    async with get_engine().connect() as connection:
+        current = await connection.run_sync(
+            lambda sync_connection: MigrationContext.configure(sync_connection).get_current_revision()
+        )
+
+    if current == head:
+        logger.info(f"Database is at revision {head}, no migrations needed")
+        return False
+
+    logger.info(f"Upgrading database from {current} to {head}")
+    # Alembic синхронный - выполняем в отдельном потоке, не блокируя цикл
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, command.upgrade, config, "head")
+    return True
+
+async def serve() -> None:
+    """Run the bot and its HTTP endpoints until SIGTERM/SIGINT."""
+    from aiohttp import web
+    from app import create_app
+
+    await run_migrations_if_needed()
+
+    app = create_app()
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = int(os.environ.get('PORT', 8000))
+    site = web.TCPSite(runner, host='0.0.0.0', port=port)
+    await site.start()
+
+    cold_start = time.perf_counter() - STARTED_AT
+    memory = rss_mb()
+    app['health'].startup = {"cold_start_seconds": round(cold_start, 2), "rss_mb": round(memory, 1)}
+    logger.info(f"Cold start took {cold_start:.2f}s, RSS {memory:.1f} MB, listening on port {port}")
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    try:
+        await stopping.wait()
+    finally:
+        logger.info("Shutting down")
+        await runner.cleanup()
+
+def main() -> int:
+    if not check_env_vars():
+        logger.error("Проверка переменных окружения не пройдена.")
+        return 1
+
+    from core.config import settings
+
+    if settings.WEB_WORKERS > 1 and settings.WEBHOOK_URL:
+        # Миграции один раз в родительском процессе, затем воркеры
+        from app import run_workers
+        asyncio.run(run_migrations_if_needed())
+        run_workers(settings.WEB_WORKERS, int(os.environ.get('PORT', 8000)))
+        return 0
+
+    asyncio.run(serve())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
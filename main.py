@@ -1,12 +1,18 @@
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.exceptions import TelegramAPIError
 from core.config import settings
-from handlers import base, settings as settings_handlers, admin
-from models.base import init_models
+from handlers import base, settings as settings_handlers, admin, leads, search
+from bot.models.base import init_models, get_session_maker
 from middlewares.database import DatabaseMiddleware
+from middlewares.update_scheduler import ChatUpdateScheduler
+from middlewares.query_stats import QueryStatsMiddleware
+from middlewares.user_context import UserContextMiddleware
+from services.fsm_storage import CachedRedisStorage
+from bot.services.distribution_queue import distribution_workers
+from bot.services.runtime_config import runtime_config
+from bot.services.view_buffer import view_buffer
 
 # Configure logging
 logging.basicConfig(
@@ -37,25 +43,44 @@ async def start_bot():
         try:
             # Initialize bot and dispatcher
             bot = Bot(token=settings.BOT_TOKEN)
-            dp = Dispatcher(storage=MemoryStorage())
+            dp = Dispatcher(storage=CachedRedisStorage())
             
             # Initialize database
             await init_models()
             
+            # Load admin-editable settings and follow their changes
+            await runtime_config.start(get_session_maker())
+            
+            # Lead distribution runs in background workers
+            distribution_workers.start(get_session_maker())
+            
+            # Viewed marks are written in batches
+            view_buffer.start(get_session_maker())
+            
             # Add middleware
+            ChatUpdateScheduler().setup(dp)
             dp.message.middleware(DatabaseMiddleware())
             dp.callback_query.middleware(DatabaseMiddleware())
+            dp.message.middleware(QueryStatsMiddleware())
+            dp.callback_query.middleware(QueryStatsMiddleware())
+            dp.message.middleware(UserContextMiddleware())
+            dp.callback_query.middleware(UserContextMiddleware())
             
             # Register handlers (create new router instances)
             dp.include_router(admin.router)
             dp.include_router(settings_handlers.router)
+            dp.include_router(leads.router)
+            dp.include_router(search.router)
             dp.include_router(base.router)
             
             logger.info("Starting bot...")
             
-            # Start polling with automatic restart on errors
+            # Start polling with automatic restart on errors.
+            # Updates are dispatched by ChatUpdateScheduler, so polling
+            # itself only waits when the update queues are full.
             await dp.start_polling(
                 bot,
+                handle_as_tasks=False,
                 allowed_updates=[
                     "message",
                     "callback_query",
@@ -65,9 +90,17 @@ async def start_bot():
                 error_handler=handle_polling_error
             )
             
+        except asyncio.CancelledError:
+            # Shutdown: write pending viewed marks before exiting
+            await distribution_workers.stop()
+            await view_buffer.stop()
+            raise
         except Exception as e:
             logger.error(f"Bot crashed with error: {e}", exc_info=True)
             try:
+                await distribution_workers.stop()
+                await runtime_config.stop()
+                await view_buffer.stop()
                 await bot.session.close()
             except Exception:
                 pass
@@ -0,0 +1,24 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from bot.services.query_stats import query_scope
+
+class QueryStatsMiddleware(BaseMiddleware):
+    """Attributes SQL statements of an update to the handler that runs it.
+
+    Registered as an inner middleware, so the handler is already chosen
+    and its name is available in ``data["handler"]``.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        callback = getattr(handler_object, "callback", None)
+        name = getattr(callback, "__name__", type(event).__name__)
+
+        with query_scope(f"handler:{name}"):
+            return await handler(event, data)
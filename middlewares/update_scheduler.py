@@ -0,0 +1,152 @@
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Tuple
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import TelegramObject, Update
+from bot.core.config import settings
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class ChatUpdateScheduler(BaseMiddleware):
+    """Outer update middleware that processes chats concurrently.
+
+    Every chat gets its own FIFO and a worker task that exists only while
+    the chat has pending updates, so updates inside a chat stay strictly
+    ordered while a slow handler in one chat does not hold up the others.
+    At most ``concurrency`` handlers run at once. When ``max_pending``
+    updates are waiting, the middleware stops returning and thereby slows
+    down polling until the queues drain.
+
+    It must run in front of aiogram's own outer middlewares (see
+    ``setup``): error handling, FSM state and event isolation then apply
+    when the update is actually handled, not when it is queued.
+
+    If the update was fed with an ``on_handled`` coroutine function, it is
+    awaited once the update has been handled (ShardedUpdateRouter
+    acknowledges routed updates this way).
+    """
+
+    def __init__(self, concurrency: int = None, max_pending: int = None):
+        self.concurrency = concurrency or settings.UPDATE_CONCURRENCY
+        self.max_pending = max_pending or settings.UPDATE_QUEUE_LIMIT
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._queues: Dict[int, Deque[Tuple]] = {}
+        self._workers = set()
+        self._pending = 0
+        self._has_capacity = asyncio.Event()
+        self._has_capacity.set()
+
+        # Метрики
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.last_processed_at = None
+
+    def setup(self, dp: Dispatcher) -> None:
+        """Register as the first outer update middleware of ``dp``."""
+        builtin = list(dp.update.outer_middleware)
+        for middleware in builtin:
+            dp.update.outer_middleware.unregister(middleware)
+        dp.update.outer_middleware(self)
+        for middleware in builtin:
+            dp.update.outer_middleware(middleware)
+
+    @staticmethod
+    def _chat_key(event: TelegramObject) -> int:
+        # Контекст еще не заполнен: middleware aiogram работают внутри воркера
+        if not isinstance(event, Update):
+            return 0
+        chat, user, _ = UserContextMiddleware.resolve_event_context(event)
+        if chat:
+            return chat.id
+        return user.id if user else 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        # Обратное давление: ждем, пока очереди не разгрузятся
+        if not self._has_capacity.is_set():
+            logger.warning(f"Update queues are full ({self._pending} pending), waiting")
+            await self._has_capacity.wait()
+
+        chat_key = self._chat_key(event)
+        item = (handler, event, data, time.monotonic())
+
+        self._pending += 1
+        self.max_depth = max(self.max_depth, self._pending)
+        if self._pending >= self.max_pending:
+            self._has_capacity.clear()
+
+        queue = self._queues.get(chat_key)
+        if queue is not None:
+            queue.append(item)
+        else:
+            self._queues[chat_key] = deque([item])
+            worker = asyncio.create_task(self._chat_worker(chat_key))
+            self._workers.add(worker)
+            worker.add_done_callback(self._workers.discard)
+
+    async def _chat_worker(self, chat_key: int) -> None:
+        queue = self._queues[chat_key]
+        while queue:
+            handler, event, data, enqueued_at = queue[0]
+            started_at = time.monotonic()
+            try:
+                async with self._semaphore:
+                    started_at = time.monotonic()
+                    await handler(event, data)
+            except Exception as e:
+                # Обработчики dp.errors уже вызваны; сюда доходят необработанные ошибки
+                self.failed += 1
+                logger.error(f"Error handling update for chat {chat_key}: {str(e)}", exc_info=True)
+            finally:
+                queue.popleft()
+                self._done(started_at, enqueued_at)
+
+            on_handled = data.get("on_handled")
+            if on_handled is not None:
+                try:
+                    await on_handled()
+                except Exception as e:
+                    logger.error(f"Error acknowledging update for chat {chat_key}: {str(e)}")
+
+        # Очередь пуста - воркер чата больше не нужен
+        del self._queues[chat_key]
+
+    def _done(self, started_at: float, enqueued_at: float) -> None:
+        now = time.monotonic()
+        latency = now - started_at
+        self.processed += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.last_processed_at = time.time()
+        if latency > 1:
+            logger.info(
+                f"Slow update handling: {latency:.2f}s "
+                f"(waited {started_at - enqueued_at:.2f}s in queue)"
+            )
+
+        self._pending -= 1
+        if self._pending < self.max_pending:
+            self._has_capacity.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Current queue depth and handler latency."""
+        return {
+            "pending": self._pending,
+            "active_chats": len(self._queues),
+            "max_depth": self.max_depth,
+            "processed": self.processed,
+            "failed": self.failed,
+            "latency_avg": self.latency_total / self.processed if self.processed else 0.0,
+            "latency_max": self.latency_max,
+            "last_processed_at": self.last_processed_at
+        }
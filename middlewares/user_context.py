@@ -0,0 +1,27 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from bot.services.user_context import user_cache
+
+class UserContextMiddleware(BaseMiddleware):
+    """Puts the current ``User`` (or None) into ``data["user"]``.
+
+    Registered as an inner middleware after ``DatabaseMiddleware``. The
+    user is only resolved for handlers that take a ``user`` argument.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        from_user = data.get("event_from_user")
+        session = data.get("session")
+        wants_user = handler_object is None or handler_object.varkw or "user" in handler_object.params
+
+        if wants_user and from_user is not None and session is not None:
+            data["user"] = await user_cache.get_user(session, from_user.id)
+
+        return await handler(event, data)
@@ -0,0 +1,40 @@
+"""add payment events inbox
+
+Revision ID: 5c0e7d1a9b26
+Revises: 49b2fbc00fe5
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c0e7d1a9b26'
+down_revision = '49b2fbc00fe5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'payment_events',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('event_key', sa.String(), nullable=False, unique=True),
+        sa.Column('event', sa.String(), nullable=False),
+        sa.Column('payment_id', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('received_at', sa.DateTime(), nullable=False),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.String(), nullable=True),
+    )
+    op.create_index('ix_payment_events_pending', 'payment_events', ['processed_at', 'id'])
+    op.create_index('ix_payment_events_payment_id', 'payment_events', ['payment_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_payment_events_payment_id')
+    op.drop_index('ix_payment_events_pending')
+    op.drop_table('payment_events')
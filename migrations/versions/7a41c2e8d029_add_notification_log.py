@@ -0,0 +1,32 @@
+"""add notification log
+
+Revision ID: 7a41c2e8d029
+Revises: 5c0e7d1a9b26
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a41c2e8d029'
+down_revision = '5c0e7d1a9b26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'notification_log',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('period_key', sa.String(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=False),
+        sa.UniqueConstraint('user_id', 'kind', 'period_key', name='uq_notification_log_user_kind_period'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('notification_log')
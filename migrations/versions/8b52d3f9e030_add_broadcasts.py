@@ -0,0 +1,43 @@
+"""add broadcasts and users.blocked_at
+
+Revision ID: 8b52d3f9e030
+Revises: 7a41c2e8d029
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b52d3f9e030'
+down_revision = '7a41c2e8d029'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('blocked_at', sa.DateTime(), nullable=True))
+    
+    op.create_table(
+        'broadcasts',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('started_by', sa.BigInteger(), nullable=True),
+        sa.Column('progress_message_id', sa.Integer(), nullable=True),
+        sa.Column('admin_only', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('status', sa.String(), nullable=False, server_default='running'),
+        sa.Column('last_user_id', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('sent', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('blocked', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('failed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_broadcasts_status', 'broadcasts', ['status'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_broadcasts_status')
+    op.drop_table('broadcasts')
+    op.drop_column('users', 'blocked_at')
@@ -0,0 +1,44 @@
+"""add distribution jobs outbox
+
+Revision ID: 9c63e4a0f034
+Revises: 8b52d3f9e030
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c63e4a0f034'
+down_revision = '8b52d3f9e030'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'distribution_jobs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('lead_id', sa.Integer(), sa.ForeignKey('leads.id', ondelete='CASCADE'), nullable=False, unique=True),
+        sa.Column('status', sa.String(), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('available_at', sa.DateTime(), nullable=False),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.String(), nullable=True),
+    )
+    op.create_index('ix_distribution_jobs_pending', 'distribution_jobs', ['status', 'available_at'])
+    
+    # Повторная обработка задания не должна дублировать распределения
+    with op.batch_alter_table('lead_distributions') as batch_op:
+        batch_op.create_unique_constraint('uq_lead_distributions_lead_user', ['lead_id', 'user_id'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('lead_distributions') as batch_op:
+        batch_op.drop_constraint('uq_lead_distributions_lead_user', type_='unique')
+    
+    op.drop_index('ix_distribution_jobs_pending')
+    op.drop_table('distribution_jobs')
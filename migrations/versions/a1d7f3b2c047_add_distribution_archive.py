@@ -0,0 +1,70 @@
+"""add distribution archive and monthly rollups
+
+Revision ID: a1d7f3b2c047
+Revises: 9c63e4a0f034
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1d7f3b2c047'
+down_revision = '9c63e4a0f034'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        # Архив секционирован по месяцам; секции создает задача архивации,
+        # строки вне созданных секций попадают в секцию по умолчанию
+        op.execute("""
+            CREATE TABLE lead_distributions_archive (
+                id INTEGER NOT NULL,
+                sent_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                lead_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                viewed_at TIMESTAMP WITHOUT TIME ZONE,
+                archived_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                PRIMARY KEY (id, sent_at)
+            ) PARTITION BY RANGE (sent_at)
+        """)
+        op.execute(
+            "CREATE TABLE lead_distributions_archive_default "
+            "PARTITION OF lead_distributions_archive DEFAULT"
+        )
+    else:
+        op.create_table(
+            'lead_distributions_archive',
+            sa.Column('id', sa.Integer(), nullable=False, autoincrement=False),
+            sa.Column('sent_at', sa.DateTime(), nullable=False),
+            sa.Column('lead_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('viewed_at', sa.DateTime(), nullable=True),
+            sa.Column('archived_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('id', 'sent_at'),
+        )
+    op.create_index(
+        'ix_lead_distributions_archive_user_sent',
+        'lead_distributions_archive',
+        ['user_id', 'sent_at']
+    )
+
+    op.create_table(
+        'distribution_rollups',
+        sa.Column('month', sa.String(7), nullable=False),
+        sa.Column('category', sa.String(), nullable=False),
+        sa.Column('city', sa.String(), nullable=False),
+        sa.Column('distributions', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('viewed', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('month', 'category', 'city'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('distribution_rollups')
+    op.drop_index('ix_lead_distributions_archive_user_sent')
+    # На Postgres секции удаляются вместе с родительской таблицей
+    op.drop_table('lead_distributions_archive')
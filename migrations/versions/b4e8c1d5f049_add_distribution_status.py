@@ -0,0 +1,48 @@
+"""add per-recipient status to lead distributions
+
+Revision ID: b4e8c1d5f049
+Revises: a1d7f3b2c047
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e8c1d5f049'
+down_revision = 'a1d7f3b2c047'
+branch_labels = None
+depends_on = None
+
+LEAD_STATUSES = (
+    'active', 'inactive_unavailable', 'inactive_refused',
+    'in_progress', 'measurement', 'thinking', 'contract'
+)
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        # Тип lead_status уже создан для leads.status
+        status_type = postgresql.ENUM(*LEAD_STATUSES, name='lead_status', create_type=False)
+    else:
+        status_type = sa.Enum(*LEAD_STATUSES, name='lead_status')
+
+    op.add_column(
+        'lead_distributions',
+        sa.Column('status', status_type, nullable=False, server_default='active')
+    )
+    op.create_index(
+        'ix_lead_distributions_user_status_sent',
+        'lead_distributions',
+        ['user_id', 'status', 'sent_at']
+    )
+    op.add_column('lead_distributions_archive', sa.Column('status', sa.String(32), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('lead_distributions_archive', 'status')
+    op.drop_index('ix_lead_distributions_user_status_sent')
+    with op.batch_alter_table('lead_distributions') as batch_op:
+        batch_op.drop_column('status')
@@ -0,0 +1,89 @@
+"""add full-text search over leads
+
+Revision ID: c7f2a9e4d050
+Revises: b4e8c1d5f049
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7f2a9e4d050'
+down_revision = 'b4e8c1d5f049'
+branch_labels = None
+depends_on = None
+
+# Копия DDL из bot.models.lead на момент этой ревизии: изменения модели
+# не должны менять то, что делает уже примененная миграция.
+# Телефон индексируется цифрами целиком и последними 4, 7 и 10 цифрами.
+_SQLITE_BODY = (
+    "replace(replace(coalesce({row}.name, '') || ' ' || {row}.category || ' ' || {row}.city"
+    " || ' ' || coalesce({row}.description, ''), 'ё', 'е'), 'Ё', 'Е')"
+)
+_SQLITE_DIGITS = (
+    "replace(replace(replace(replace(replace(replace(coalesce({row}.phone, ''),"
+    " '+', ''), ' ', ''), '-', ''), '(', ''), ')', ''), '.', '')"
+)
+_SQLITE_PHONE = " || ' ' || ".join(
+    [_SQLITE_DIGITS] + [f"substr({_SQLITE_DIGITS}, -{size})" for size in (4, 7, 10)]
+)
+
+
+def _sqlite_index(row: str) -> str:
+    return (
+        f"INSERT INTO leads_fts (rowid, body, phone) "
+        f"VALUES ({row}.id, {_SQLITE_BODY.format(row=row)}, {_SQLITE_PHONE.format(row=row)});"
+    )
+
+
+SQLITE_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS leads_fts USING fts5("
+    "body, phone, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    "CREATE TRIGGER IF NOT EXISTS leads_fts_insert AFTER INSERT ON leads BEGIN "
+    + _sqlite_index("new") + " END",
+    "CREATE TRIGGER IF NOT EXISTS leads_fts_update AFTER UPDATE ON leads BEGIN "
+    "DELETE FROM leads_fts WHERE rowid = old.id; " + _sqlite_index("new") + " END",
+    "CREATE TRIGGER IF NOT EXISTS leads_fts_delete AFTER DELETE ON leads BEGIN "
+    "DELETE FROM leads_fts WHERE rowid = old.id; END",
+)
+
+SQLITE_SEARCH_BACKFILL = (
+    f"INSERT INTO leads_fts (rowid, body, phone) SELECT leads.id, "
+    f"{_SQLITE_BODY.format(row='leads')}, {_SQLITE_PHONE.format(row='leads')} FROM leads"
+)
+
+_PG_DIGITS = "regexp_replace(coalesce(phone, ''), '\\D', '', 'g')"
+POSTGRES_SEARCH_DDL = (
+    "ALTER TABLE leads ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian'::regconfig, coalesce(description, '') || ' ' || coalesce(name, '')), 'A')"
+    " || setweight(to_tsvector('russian'::regconfig, category || ' ' || city), 'B')"
+    f" || to_tsvector('simple'::regconfig, {_PG_DIGITS} || ' ' || right({_PG_DIGITS}, 4)"
+    f" || ' ' || right({_PG_DIGITS}, 7) || ' ' || right({_PG_DIGITS}, 10))"
+    ") STORED",
+    "CREATE INDEX IF NOT EXISTS ix_leads_search_vector ON leads USING GIN (search_vector)",
+)
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # Сгенерированная колонка заполняется для существующих строк сама
+        for statement in POSTGRES_SEARCH_DDL:
+            op.execute(statement)
+    elif dialect == 'sqlite':
+        for statement in SQLITE_SEARCH_DDL:
+            op.execute(statement)
+        # Триггеры срабатывают только для новых заявок
+        op.execute(SQLITE_SEARCH_BACKFILL)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_leads_search_vector")
+        op.execute("ALTER TABLE leads DROP COLUMN IF EXISTS search_vector")
+    elif dialect == 'sqlite':
+        for trigger in ('leads_fts_insert', 'leads_fts_update', 'leads_fts_delete'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS leads_fts")
@@ -0,0 +1,27 @@
+"""add owner and lease to broadcasts
+
+Revision ID: d5c8e2b7a030
+Revises: c7f2a9e4d050
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5c8e2b7a030'
+down_revision = 'c7f2a9e4d050'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('broadcasts', sa.Column('owner', sa.String(), nullable=True))
+    op.add_column('broadcasts', sa.Column('locked_until', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('broadcasts') as batch_op:
+        batch_op.drop_column('locked_until')
+        batch_op.drop_column('owner')
@@ -35,6 +35,12 @@ def get_engine():
             future=True,
             pool_pre_ping=True
         )
+        
+        # Учет запросов по обработчикам и метрики пула соединений
+        from bot.services.query_stats import install
+        from bot.services.metrics import register_engine
+        install(_engine)
+        register_engine(_engine)
     return _engine
 
 def get_session_maker():
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, BigInteger, Boolean
+from datetime import datetime
+from .base import Base
+
+class Broadcast(Base):
+    """Mass mailing with a checkpoint, so it can be resumed after restart.
+
+    The sending process holds a lease (``owner``, ``locked_until``); only a
+    broadcast whose lease has expired is resumed by another process.
+    """
+    __tablename__ = "broadcasts"
+
+    id = Column(Integer, primary_key=True)
+    text = Column(Text, nullable=False)
+    started_by = Column(BigInteger, nullable=True)  # telegram_id администратора
+    progress_message_id = Column(Integer, nullable=True)  # сообщение с прогрессом у администратора
+    admin_only = Column(Boolean, nullable=False, default=False)
+    status = Column(String, nullable=False, default="running")  # running, finished
+    last_user_id = Column(Integer, nullable=False, default=0)  # последний обработанный users.id
+    owner = Column(String, nullable=True)  # процесс, который отправляет рассылку
+    locked_until = Column(DateTime, nullable=True)  # аренда рассылки владельцем, продлевается пульсом
+    sent = Column(Integer, nullable=False, default=0)
+    blocked = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<Broadcast {self.id} {self.status}>"
@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from datetime import datetime
+from .base import Base
+
+class LeadDistributionArchive(Base):
+    """Distributions older than the retention period, moved out of lead_distributions.
+
+    On Postgres the table is partitioned by month of ``sent_at`` (see the
+    migration), so the primary key includes ``sent_at``.
+    """
+    __tablename__ = "lead_distributions_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    sent_at = Column(DateTime, primary_key=True)
+    lead_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    viewed_at = Column(DateTime, nullable=True)
+    status = Column(String(32), nullable=True)
+    archived_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_lead_distributions_archive_user_sent", "user_id", "sent_at"),
+    )
+
+    def __repr__(self):
+        return f"<LeadDistributionArchive {self.lead_id} -> {self.user_id}>"
+
+class DistributionRollup(Base):
+    """Monthly distribution counts per category and city, kept after archival."""
+    __tablename__ = "distribution_rollups"
+
+    month = Column(String(7), primary_key=True)  # YYYY-MM
+    category = Column(String, primary_key=True)
+    city = Column(String, primary_key=True)
+    distributions = Column(Integer, nullable=False, default=0)
+    viewed = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DistributionRollup {self.month} {self.category}/{self.city}: {self.distributions}>"
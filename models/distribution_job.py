@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from datetime import datetime
+from .base import Base
+
+class DistributionJob(Base):
+    """Outbox entry: a stored lead waiting to be distributed."""
+    __tablename__ = "distribution_jobs"
+
+    id = Column(Integer, primary_key=True)
+    lead_id = Column(Integer, ForeignKey("leads.id", ondelete="CASCADE"), unique=True, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # не раньше этого времени
+    locked_until = Column(DateTime, nullable=True)  # аренда задания воркером
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_distribution_jobs_pending", "status", "available_at"),
+    )
+
+    def __repr__(self):
+        return f"<DistributionJob {self.lead_id} {self.status}>"
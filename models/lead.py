@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Enum as SQLEnum, UniqueConstraint, Index, DDL, event
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
@@ -33,10 +33,77 @@ class LeadDistribution(Base):
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     sent_at = Column(DateTime, default=datetime.utcnow)
     viewed_at = Column(DateTime, nullable=True)
+    # Статус заявки у конкретного получателя
+    status = Column(
+        SQLEnum(*settings.LEAD_STATUSES.keys(), name="lead_status"),
+        nullable=False,
+        default="active",
+        server_default="active"
+    )
+    
+    __table_args__ = (
+        UniqueConstraint("lead_id", "user_id", name="uq_lead_distributions_lead_user"),
+        # Список "Мои заявки" с фильтром по статусу
+        Index("ix_lead_distributions_user_status_sent", "user_id", "status", "sent_at"),
+    )
     
     # Relationships
     lead = relationship("Lead", back_populates="distributions")
     user = relationship("User", back_populates="leads")
 
     def __repr__(self):
-        return f"<LeadDistribution {self.lead_id} -> {self.user_id}>" 
\ No newline at end of file
+        return f"<LeadDistribution {self.lead_id} -> {self.user_id}>" 
+
+# Полнотекстовый индекс заявок (см. bot.services.search).
+# Телефон индексируется цифрами целиком и последними 4, 7 и 10 цифрами,
+# чтобы находить номер по фрагменту.
+_SQLITE_BODY = (
+    "replace(replace(coalesce({row}.name, '') || ' ' || {row}.category || ' ' || {row}.city"
+    " || ' ' || coalesce({row}.description, ''), 'ё', 'е'), 'Ё', 'Е')"
+)
+_SQLITE_DIGITS = (
+    "replace(replace(replace(replace(replace(replace(coalesce({row}.phone, ''),"
+    " '+', ''), ' ', ''), '-', ''), '(', ''), ')', ''), '.', '')"
+)
+_SQLITE_PHONE = " || ' ' || ".join(
+    [_SQLITE_DIGITS] + [f"substr({_SQLITE_DIGITS}, -{size})" for size in (4, 7, 10)]
+)
+
+def _sqlite_index(row: str) -> str:
+    return (
+        f"INSERT INTO leads_fts (rowid, body, phone) "
+        f"VALUES ({row}.id, {_SQLITE_BODY.format(row=row)}, {_SQLITE_PHONE.format(row=row)});"
+    )
+
+SQLITE_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS leads_fts USING fts5("
+    "body, phone, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    "CREATE TRIGGER IF NOT EXISTS leads_fts_insert AFTER INSERT ON leads BEGIN "
+    + _sqlite_index("new") + " END",
+    "CREATE TRIGGER IF NOT EXISTS leads_fts_update AFTER UPDATE ON leads BEGIN "
+    "DELETE FROM leads_fts WHERE rowid = old.id; " + _sqlite_index("new") + " END",
+    "CREATE TRIGGER IF NOT EXISTS leads_fts_delete AFTER DELETE ON leads BEGIN "
+    "DELETE FROM leads_fts WHERE rowid = old.id; END",
+)
+
+# Индексирование заявок, созданных до появления поиска
+SQLITE_SEARCH_BACKFILL = (
+    f"INSERT INTO leads_fts (rowid, body, phone) SELECT leads.id, "
+    f"{_SQLITE_BODY.format(row='leads')}, {_SQLITE_PHONE.format(row='leads')} FROM leads"
+)
+
+_PG_DIGITS = "regexp_replace(coalesce(phone, ''), '\\D', '', 'g')"
+POSTGRES_SEARCH_DDL = (
+    "ALTER TABLE leads ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian'::regconfig, coalesce(description, '') || ' ' || coalesce(name, '')), 'A')"
+    " || setweight(to_tsvector('russian'::regconfig, category || ' ' || city), 'B')"
+    f" || to_tsvector('simple'::regconfig, {_PG_DIGITS} || ' ' || right({_PG_DIGITS}, 4)"
+    f" || ' ' || right({_PG_DIGITS}, 7) || ' ' || right({_PG_DIGITS}, 10))"
+    ") STORED",
+    "CREATE INDEX IF NOT EXISTS ix_leads_search_vector ON leads USING GIN (search_vector)",
+)
+
+for _statement in SQLITE_SEARCH_DDL:
+    event.listen(Lead.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+for _statement in POSTGRES_SEARCH_DDL:
+    event.listen(Lead.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
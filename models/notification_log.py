@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from datetime import datetime
+from .base import Base
+
+class NotificationLog(Base):
+    """Marker of a sent scheduled notification, so reruns do not resend it."""
+    __tablename__ = "notification_log"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String, nullable=False)  # subscription_expiring, leads_limit
+    period_key = Column(String, nullable=False)  # ID подписки или месяц, к которому относится уведомление
+    sent_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "kind", "period_key", name="uq_notification_log_user_kind_period"),
+    )
+
+    def __repr__(self):
+        return f"<NotificationLog {self.user_id} {self.kind} {self.period_key}>"
@@ -17,7 +17,8 @@ class Payment(Base):
     paid_at = Column(DateTime, nullable=True)
     refunded_at = Column(DateTime, nullable=True)
     description = Column(String, nullable=True)
-    metadata = Column(String, nullable=True)  # JSON строка с дополнительными данными
+    # Атрибут "metadata" зарезервирован в SQLAlchemy, колонка сохраняет имя
+    payment_metadata = Column("metadata", String, nullable=True)  # JSON строка с дополнительными данными
     
     # Relationships
     user = relationship("User", back_populates="payments")
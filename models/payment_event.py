@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from datetime import datetime
+from .base import Base
+
+class PaymentEvent(Base):
+    """Raw YooKassa notification stored in the inbox before processing."""
+    __tablename__ = "payment_events"
+
+    id = Column(Integer, primary_key=True)
+    event_key = Column(String, unique=True, nullable=False)  # event:payment_id, одинаковый для повторов ЮKassa
+    event = Column(String, nullable=False)  # payment.succeeded, payment.canceled, ...
+    payment_id = Column(String, nullable=False)  # ID платежа в платежной системе
+    status = Column(String, nullable=True)
+    payload = Column(Text, nullable=False)  # JSON тело уведомления как есть
+    received_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_payment_events_pending", "processed_at", "id"),
+        Index("ix_payment_events_payment_id", "payment_id"),
+    )
+
+    def __repr__(self):
+        return f"<PaymentEvent {self.event_key}>"
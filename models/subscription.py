@@ -17,6 +17,7 @@ class Subscription(Base):
     
     # Relationships
     user = relationship("User", back_populates="subscriptions")
+    payment = relationship("Payment", back_populates="subscription", uselist=False)
 
     def __repr__(self):
         return f"<Subscription {self.user_id} {self.plan_name}>"
@@ -16,9 +16,12 @@ class User(Base):
     cities = Column(JSON, default=list)
     is_demo = Column(Boolean, default=False)
     last_lead_at = Column(DateTime, nullable=True)
+    blocked_at = Column(DateTime, nullable=True)  # Когда пользователь заблокировал бота
     
     # Relationships
     leads = relationship("LeadDistribution", back_populates="user")
+    subscriptions = relationship("Subscription", back_populates="user")
+    payments = relationship("Payment", back_populates="user")
 
     def __repr__(self):
         return f"<User {self.telegram_id}>" 
\ No newline at end of file
@@ -0,0 +1,125 @@
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select, func, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from bot.models.user import User
+from bot.models.lead import LeadDistribution
+from bot.models.distribution_archive import LeadDistributionArchive
+from bot.services.cache import CacheService
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Фильтры списка пользователей: all, paid, active или категория
+FILTER_ALL = "all"
+FILTER_PAID = "paid"
+FILTER_ACTIVE = "active"
+
+NEXT = "next"
+PREV = "prev"
+
+class AdminUsersService:
+    """Keyset-paginated user list for the admin panel.
+
+    Pages are taken by ``users.id`` after/before a cursor, so every page
+    costs one indexed range query plus one lead count over the page's
+    users, however many users there are. Pages are cached briefly.
+    """
+
+    def __init__(self, session: AsyncSession, page_size: int = 10, cache_ttl: int = 30):
+        self.session = session
+        self.page_size = page_size
+        self.cache = CacheService()
+        self.cache_ttl = cache_ttl
+
+    async def get_page(
+        self,
+        user_filter: str = FILTER_ALL,
+        category: Optional[str] = None,
+        cursor: Optional[int] = None,
+        direction: str = NEXT
+    ) -> Dict[str, Any]:
+        """Page of users after (``next``) or before (``prev``) ``cursor``."""
+        cache_key = f"admin:users:{user_filter}:{category or ''}:{direction}:{cursor or 0}:{self.page_size}"
+        page = await self.cache.get(cache_key)
+        if page is not None:
+            return page
+
+        page = await self._fetch_page(user_filter, category, cursor, direction)
+        await self.cache.set(cache_key, page, self.cache_ttl)
+        return page
+
+    async def _fetch_page(
+        self,
+        user_filter: str,
+        category: Optional[str],
+        cursor: Optional[int],
+        direction: str
+    ) -> Dict[str, Any]:
+        query = select(User)
+        if user_filter == FILTER_PAID:
+            query = query.where(User.is_paid == True)
+        elif user_filter == FILTER_ACTIVE:
+            query = query.where(User.is_active == True)
+        if category:
+            query = query.where(User.categories.contains([category]))
+
+        if direction == PREV:
+            if cursor is not None:
+                query = query.where(User.id < cursor)
+            query = query.order_by(User.id.desc())
+        else:
+            if cursor is not None:
+                query = query.where(User.id > cursor)
+            query = query.order_by(User.id)
+
+        # Лишняя строка показывает, есть ли страница дальше
+        result = await self.session.execute(query.limit(self.page_size + 1))
+        users = list(result.scalars().all())
+        has_more = len(users) > self.page_size
+        users = users[:self.page_size]
+        if direction == PREV:
+            users.reverse()
+
+        leads_count = await self._count_leads([user.id for user in users])
+        items: List[Dict[str, Any]] = [
+            {
+                "id": user.id,
+                "telegram_id": user.telegram_id,
+                "full_name": user.full_name,
+                "username": user.username,
+                "is_active": user.is_active,
+                "is_paid": user.is_paid,
+                "categories": user.categories or [],
+                "cities": user.cities or [],
+                "leads_count": leads_count.get(user.id, 0)
+            }
+            for user in users
+        ]
+
+        if direction == PREV:
+            has_prev, has_next = has_more, cursor is not None
+        else:
+            has_prev, has_next = cursor is not None, has_more
+
+        return {
+            "users": items,
+            "first_id": items[0]["id"] if items else None,
+            "last_id": items[-1]["id"] if items else None,
+            "has_prev": has_prev and bool(items),
+            "has_next": has_next and bool(items)
+        }
+
+    async def _count_leads(self, user_ids: List[int]) -> Dict[int, int]:
+        """Received leads for the users of one page, archived ones included."""
+        if not user_ids:
+            return {}
+        # В обеих таблицах есть индексы, начинающиеся с user_id
+        received = union_all(
+            select(LeadDistribution.user_id).where(LeadDistribution.user_id.in_(user_ids)),
+            select(LeadDistributionArchive.user_id).where(LeadDistributionArchive.user_id.in_(user_ids))
+        ).subquery("received")
+        result = await self.session.execute(
+            select(received.c.user_id, func.count())
+            .group_by(received.c.user_id)
+        )
+        return dict(result.all())
@@ -0,0 +1,297 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import select, and_, or_, update
+from bot.models.user import User
+from bot.models.broadcast import Broadcast
+from bot.core.config import settings
+from bot.services.sender import RateLimitedSender, SENT, BLOCKED, FAILED
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+class BroadcastService:
+    """Resumable mass mailing over active users.
+
+    Users are read page by page with keyset pagination on ``users.id``
+    (only ``id`` and ``telegram_id``), so memory does not depend on the
+    number of users. After every page the last processed id is saved, and
+    an interrupted broadcast continues from there.
+
+    The sending process owns the broadcast through a lease that a heartbeat
+    renews every third of ``lease``. Another process resumes a broadcast
+    only after its lease has expired, and a sender that lost the lease
+    stops, so one broadcast is never sent by two processes at once.
+    """
+
+    def __init__(self, session_maker, bot, page_size: int = 500, lease: timedelta = timedelta(minutes=2)):
+        self.session_maker = session_maker
+        self.bot = bot
+        self.page_size = page_size
+        self.lease = lease
+        self.identity = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.sender = RateLimitedSender(bot)
+        self.progress_interval = 5  # секунд между обновлениями прогресса
+
+    async def start(
+        self,
+        text: str,
+        started_by: Optional[int] = None,
+        admin_only: bool = False
+    ) -> Broadcast:
+        """Create broadcast and run it to completion."""
+        async with self.session_maker() as session:
+            broadcast = Broadcast(
+                text=text,
+                started_by=started_by,
+                admin_only=admin_only,
+                owner=self.identity,
+                locked_until=datetime.utcnow() + self.lease
+            )
+            session.add(broadcast)
+            await session.commit()
+
+        if started_by:
+            try:
+                progress = await self.bot.send_message(started_by, "📢 Рассылка запущена...")
+                async with self.session_maker() as session:
+                    await session.execute(
+                        update(Broadcast)
+                        .where(Broadcast.id == broadcast.id)
+                        .values(progress_message_id=progress.message_id)
+                    )
+                    await session.commit()
+                broadcast.progress_message_id = progress.message_id
+            except Exception as e:
+                logger.error(f"Error sending broadcast progress to {started_by}: {str(e)}")
+
+        return await self.run(broadcast)
+
+    async def resume_unfinished(self) -> None:
+        """Continue broadcasts whose sender stopped renewing the lease."""
+        now = datetime.utcnow()
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(Broadcast.id)
+                .where(
+                    and_(
+                        Broadcast.status == "running",
+                        or_(Broadcast.locked_until.is_(None), Broadcast.locked_until < now)
+                    )
+                )
+                .order_by(Broadcast.id)
+            )
+            broadcast_ids = result.scalars().all()
+
+        for broadcast_id in broadcast_ids:
+            broadcast = await self._claim(broadcast_id)
+            if broadcast is None:
+                # Рассылку успел забрать другой процесс
+                continue
+            logger.info(f"Resuming broadcast {broadcast.id} after user {broadcast.last_user_id}")
+            await self.run(broadcast)
+
+    async def watch_unfinished(self) -> None:
+        """Resume abandoned broadcasts, checking once per lease period."""
+        while True:
+            try:
+                await self.resume_unfinished()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error resuming broadcasts: {str(e)}")
+            await asyncio.sleep(self.lease.total_seconds())
+
+    async def _claim(self, broadcast_id: int) -> Optional[Broadcast]:
+        """Take the lease of a broadcast whose lease has expired."""
+        now = datetime.utcnow()
+        async with self.session_maker() as session:
+            # Условный UPDATE: рассылка достается только одному процессу
+            result = await session.execute(
+                update(Broadcast)
+                .where(
+                    and_(
+                        Broadcast.id == broadcast_id,
+                        Broadcast.status == "running",
+                        or_(Broadcast.locked_until.is_(None), Broadcast.locked_until < now)
+                    )
+                )
+                .values(owner=self.identity, locked_until=now + self.lease)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            if result.rowcount != 1:
+                return None
+            return await session.get(Broadcast, broadcast_id)
+
+    async def _renew(self, broadcast_id: int) -> bool:
+        """Extend the lease if this process still owns the broadcast."""
+        async with self.session_maker() as session:
+            result = await session.execute(
+                update(Broadcast)
+                .where(and_(Broadcast.id == broadcast_id, Broadcast.owner == self.identity))
+                .values(locked_until=datetime.utcnow() + self.lease)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            return result.rowcount == 1
+
+    async def _heartbeat(self, broadcast_id: int) -> None:
+        """Renew the lease until the broadcast is taken over."""
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            try:
+                if not await self._renew(broadcast_id):
+                    return
+            except Exception as e:
+                # Без продления аренда истечет, и рассылку продолжит другой процесс
+                logger.error(f"Error renewing broadcast {broadcast_id} lease: {str(e)}")
+
+    async def _release(self, broadcast_id: int) -> None:
+        """Let another process resume the broadcast right away."""
+        try:
+            async with self.session_maker() as session:
+                await session.execute(
+                    update(Broadcast)
+                    .where(and_(Broadcast.id == broadcast_id, Broadcast.owner == self.identity))
+                    .values(locked_until=None)
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Error releasing broadcast {broadcast_id}: {str(e)}")
+
+    async def _fetch_page(self, broadcast: Broadcast) -> List[tuple]:
+        async with self.session_maker() as session:
+            query = (
+                select(User.id, User.telegram_id)
+                .where(
+                    and_(
+                        User.is_active == True,
+                        User.blocked_at.is_(None),
+                        User.id > broadcast.last_user_id
+                    )
+                )
+                .order_by(User.id)
+                .limit(self.page_size)
+            )
+            if broadcast.admin_only:
+                query = query.where(User.telegram_id.in_(settings.ADMIN_IDS))
+            result = await session.execute(query)
+            return result.all()
+
+    async def run(self, broadcast: Broadcast) -> Broadcast:
+        """Send broadcast starting after its checkpoint, while holding its lease."""
+        last_progress = 0.0
+        heartbeat = asyncio.create_task(self._heartbeat(broadcast.id))
+
+        try:
+            while True:
+                if heartbeat.done():
+                    logger.warning(f"Broadcast {broadcast.id} was taken over by another process, stopping")
+                    return broadcast
+
+                page = await self._fetch_page(broadcast)
+                if not page:
+                    break
+
+                blocked_ids = []
+
+                async def on_result(user_id, status):
+                    if status == BLOCKED:
+                        blocked_ids.append(user_id)
+
+                stats = await self.sender.send_many(
+                    ((telegram_id, broadcast.text, user_id) for user_id, telegram_id in page),
+                    on_result
+                )
+
+                broadcast.last_user_id = page[-1][0]
+                broadcast.sent += stats[SENT]
+                broadcast.blocked += stats[BLOCKED]
+                broadcast.failed += stats[FAILED]
+                if not await self._save_checkpoint(broadcast, blocked_ids):
+                    logger.warning(f"Broadcast {broadcast.id} was taken over by another process, stopping")
+                    return broadcast
+
+                if time.monotonic() - last_progress >= self.progress_interval:
+                    last_progress = time.monotonic()
+                    await self._report_progress(broadcast)
+
+                if len(page) < self.page_size:
+                    break
+        except asyncio.CancelledError:
+            # Остановка процесса или потеря лидерства: продолжит следующий владелец
+            await self._release(broadcast.id)
+            raise
+        finally:
+            heartbeat.cancel()
+
+        broadcast.status = "finished"
+        broadcast.finished_at = datetime.utcnow()
+        if not await self._save_checkpoint(broadcast, []):
+            return broadcast
+        await self._report_progress(broadcast)
+        logger.info(
+            f"Broadcast {broadcast.id} finished: sent {broadcast.sent}, "
+            f"blocked {broadcast.blocked}, failed {broadcast.failed}"
+        )
+        return broadcast
+
+    async def _save_checkpoint(self, broadcast: Broadcast, blocked_ids: List[int]) -> bool:
+        """Persist progress and users who blocked the bot in one transaction.
+
+        Returns False if the broadcast is now owned by another process.
+        """
+        async with self.session_maker() as session:
+            if blocked_ids:
+                await session.execute(
+                    update(User)
+                    .where(User.id.in_(blocked_ids))
+                    .values(blocked_at=datetime.utcnow())
+                )
+            result = await session.execute(
+                update(Broadcast)
+                .where(and_(Broadcast.id == broadcast.id, Broadcast.owner == self.identity))
+                .values(
+                    last_user_id=broadcast.last_user_id,
+                    sent=broadcast.sent,
+                    blocked=broadcast.blocked,
+                    failed=broadcast.failed,
+                    status=broadcast.status,
+                    finished_at=broadcast.finished_at,
+                    # Контрольная точка тоже продлевает аренду
+                    locked_until=None if broadcast.status == "finished" else datetime.utcnow() + self.lease
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            return result.rowcount == 1
+
+    async def _report_progress(self, broadcast: Broadcast) -> None:
+        """Show progress to the admin who started the broadcast."""
+        if not broadcast.started_by:
+            return
+
+        title = "✅ Рассылка завершена" if broadcast.status == "finished" else "📢 Рассылка идет..."
+        text = (
+            f"{title}\n\n"
+            f"Отправлено: {broadcast.sent}\n"
+            f"Заблокировали бота: {broadcast.blocked}\n"
+            f"Ошибок: {broadcast.failed}"
+        )
+        try:
+            if broadcast.progress_message_id:
+                await self.bot.edit_message_text(
+                    text,
+                    chat_id=broadcast.started_by,
+                    message_id=broadcast.progress_message_id
+                )
+            else:
+                await self.bot.send_message(broadcast.started_by, text)
+        except Exception as e:
+            logger.error(f"Error reporting broadcast progress: {str(e)}")
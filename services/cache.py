@@ -1,15 +1,44 @@
-from typing import Optional, Any, Union
+from typing import Optional, Any, Union, Iterable, Dict
 import json
 import aioredis
 from datetime import datetime, timedelta
+from sqlalchemy import DateTime, inspect
 from bot.core.config import settings
+from bot.services.metrics import CACHE_REQUESTS
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Общий клиент Redis (один пул соединений на процесс)
+_redis = None
+
+def get_redis() -> aioredis.Redis:
+    """Return shared Redis client."""
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(settings.REDIS_URL)
+    return _redis
+
+def to_cache(obj) -> Dict[str, Any]:
+    """Column values of an ORM object in a JSON-friendly form."""
+    data = {}
+    for attr in inspect(type(obj)).column_attrs:
+        value = getattr(obj, attr.key)
+        data[attr.key] = value.isoformat() if isinstance(value, datetime) else value
+    return data
+
+def from_cache(model, data: Dict[str, Any]):
+    """Build a detached ORM object from ``to_cache`` output."""
+    values = dict(data)
+    for attr in inspect(model).column_attrs:
+        value = values.get(attr.key)
+        if value is not None and isinstance(attr.columns[0].type, DateTime):
+            values[attr.key] = datetime.fromisoformat(value)
+    return model(**values)
+
 class CacheService:
     def __init__(self):
-        self.redis = aioredis.from_url(settings.REDIS_URL)
+        self.redis = get_redis()
         self.default_ttl = 3600  # 1 hour default TTL
         
     async def get(self, key: str) -> Optional[Any]:
@@ -17,9 +46,12 @@ class CacheService:
         try:
             value = await self.redis.get(key)
             if value:
+                CACHE_REQUESTS.inc(result="hit")
                 return json.loads(value)
+            CACHE_REQUESTS.inc(result="miss")
             return None
         except Exception as e:
+            CACHE_REQUESTS.inc(result="error")
             logger.error(f"Error getting from cache: {str(e)}")
             return None
     
@@ -51,6 +83,24 @@ class CacheService:
             logger.error(f"Error deleting from cache: {str(e)}")
             return False
     
+    async def delete_many(self, keys: Iterable[str], batch_size: int = 500) -> bool:
+        """Delete many keys using pipelined batches."""
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pending = 0
+            for key in keys:
+                pipe.delete(key)
+                pending += 1
+                if pending >= batch_size:
+                    await pipe.execute()
+                    pending = 0
+            if pending:
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting many from cache: {str(e)}")
+            return False
+    
     async def clear_all(self) -> bool:
         """Clear all cache."""
         try:
@@ -82,9 +132,10 @@ class CacheService:
     async def invalidate_pattern(self, pattern: str) -> bool:
         """Delete all keys matching pattern."""
         try:
-            keys = await self.redis.keys(pattern)
+            # SCAN вместо KEYS, чтобы не блокировать Redis на больших базах
+            keys = [key async for key in self.redis.scan_iter(match=pattern, count=500)]
             if keys:
-                await self.redis.delete(*keys)
+                await self.delete_many(keys)
             return True
         except Exception as e:
             logger.error(f"Error invalidating pattern: {str(e)}")
@@ -1,14 +1,20 @@
 from datetime import datetime, timedelta
 from typing import List, Optional, Tuple, Dict
 from sqlalchemy import select, and_, or_, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from bot.models.lead import Lead, LeadDistribution
 from bot.models.user import User
 from bot.models.subscription import Subscription
 from bot.core.config import settings
 from bot.services.demo_data import generate_demo_lead, mask_phone, is_working_hours
-from bot.services.cache import CacheService
+from bot.services.cache import CacheService, to_cache, from_cache
+from bot.services.distribution_scheduler import distribution_scheduler
+from bot.services.runtime_config import runtime_config
+from bot.services.view_buffer import view_buffer
+from bot.services.lead_status import invalidate_counts
 import logging
+import random
 
 logger = logging.getLogger(__name__)
 
@@ -70,7 +76,7 @@ class DistributionService:
                 eligible_users = []
                 for user in users:
                     if await self.can_receive_lead(user.id):
-                        eligible_users.append(user.__dict__)
+                        eligible_users.append(to_cache(user))
                 
                 return eligible_users
                 
@@ -85,13 +91,7 @@ class DistributionService:
         )
         
         if users_data:
-            users = []
-            for user_data in users_data:
-                user = User()
-                for key, value in user_data.items():
-                    setattr(user, key, value)
-                users.append(user)
-            return users
+            return [from_cache(User, user_data) for user_data in users_data]
         return []
 
     async def can_receive_lead(self, user_id: int) -> bool:
@@ -141,18 +141,29 @@ class DistributionService:
         self,
         users: List[User]
     ) -> Dict[str, List[User]]:
-        """Group users by subscription type."""
-        groups = {
-            "premium": [],
-            "pro": [],
-            "basic": []
-        }
+        """Group users by plan of their active subscription."""
+        groups = {plan_name: [] for plan_name in settings.SUBSCRIPTION_PLANS}
+        if not users:
+            return groups
         
-        for user in users:
-            subscription = await self.get_user_subscription(user.id)
-            if subscription:
-                if subscription.plan_name in groups:
-                    groups[subscription.plan_name].append(user)
+        # Тарифы всех пользователей одним запросом
+        result = await self.session.execute(
+            select(Subscription.user_id, Subscription.plan_name)
+            .where(
+                and_(
+                    Subscription.user_id.in_([user.id for user in users]),
+                    Subscription.is_active == True,
+                    Subscription.expires_at > datetime.utcnow()
+                )
+            )
+        )
+        plans = dict(result.all())
+        
+        # Порядок внутри тарифа стабильный, на нем держится ротация
+        for user in sorted(users, key=lambda u: u.id):
+            plan_name = plans.get(user.id)
+            if plan_name in groups:
+                groups[plan_name].append(user)
         
         return groups
 
@@ -170,7 +181,7 @@ class DistributionService:
             )
             result = await self.session.execute(query)
             subscription = result.scalar_one_or_none()
-            return subscription.__dict__ if subscription else None
+            return to_cache(subscription) if subscription else None
         
         subscription_data = await self.cache.get_or_set(
             cache_key,
@@ -179,10 +190,7 @@ class DistributionService:
         )
         
         if subscription_data:
-            subscription = Subscription()
-            for key, value in subscription_data.items():
-                setattr(subscription, key, value)
-            return subscription
+            return from_cache(Subscription, subscription_data)
         return None
 
     async def create_distribution(
@@ -190,8 +198,25 @@ class DistributionService:
         lead_id: int,
         user_id: int
     ) -> Optional[LeadDistribution]:
-        """Create lead distribution entry."""
+        """Create lead distribution entry.
+
+        Idempotent: an existing entry for the same lead and user is returned
+        instead of creating a duplicate, so a retried job is safe. Returns
+        None only when the user has no active subscription; database
+        errors are raised so the distribution job is retried.
+        """
         try:
+            existing = await self.session.scalar(
+                select(LeadDistribution).where(
+                    and_(
+                        LeadDistribution.lead_id == lead_id,
+                        LeadDistribution.user_id == user_id
+                    )
+                )
+            )
+            if existing:
+                return existing
+            
             # Получаем подписку пользователя для определения задержки
             subscription = await self.get_user_subscription(user_id)
             if not subscription:
@@ -214,13 +239,27 @@ class DistributionService:
             # Инвалидируем кэш
             await self.cache.delete(f"distribution:can_receive:{user_id}")
             await self.cache.invalidate_pattern(f"distribution:eligible_users:*")
+            await invalidate_counts([user_id])
             
             return distribution
             
+        except IntegrityError:
+            # Распределение уже создано параллельной обработкой того же задания
+            await self.session.rollback()
+            return await self.session.scalar(
+                select(LeadDistribution).where(
+                    and_(
+                        LeadDistribution.lead_id == lead_id,
+                        LeadDistribution.user_id == user_id
+                    )
+                )
+            )
+            
         except Exception as e:
+            # Ошибка БД - не "нет подписки": задание распределения должно повториться
             logger.error(f"Error creating distribution: {str(e)}")
             await self.session.rollback()
-            return None
+            raise
 
     async def get_distribution_stats(self) -> Dict:
         """Get distribution statistics."""
@@ -239,9 +278,11 @@ class DistributionService:
                     .where(LeadDistribution.sent_at >= month_start)
                 )
                 
+                config = runtime_config.snapshot
+                
                 # Статистика по категориям
                 leads_by_category = {}
-                for category in settings.CATEGORIES:
+                for category in config.categories:
                     count = await self.session.scalar(
                         select(func.count(LeadDistribution.id))
                         .join(Lead)
@@ -256,7 +297,7 @@ class DistributionService:
                 
                 # Статистика по городам
                 leads_by_city = {}
-                for city in settings.CITIES:
+                for city in config.cities:
                     count = await self.session.scalar(
                         select(func.count(LeadDistribution.id))
                         .join(Lead)
@@ -285,46 +326,40 @@ class DistributionService:
         
         return await self.cache.get_or_set(cache_key, fetch_stats, self.cache_ttl)
 
-    async def get_next_group_index(self, category: str) -> int:
-        """Get index of next group to receive leads."""
-        # Get total number of leads for this category today
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        query = select(func.count(Lead.id)).where(
-            and_(
-                Lead.category == category,
-                Lead.created_at >= today_start
-            )
+    async def distribute_lead(self, lead: Lead, include_demo: bool = False) -> List[LeadDistribution]:
+        """Distribute lead to eligible users according to the specified algorithm.
+
+        A retried job keeps the recipients it already has: they are not
+        picked again and count towards MAX_RECIPIENTS. Returns all
+        distributions of the lead.
+        """
+        result = await self.session.execute(
+            select(LeadDistribution).where(LeadDistribution.lead_id == lead.id)
         )
-        total_leads = await self.session.scalar(query)
-        if total_leads is None:
-            total_leads = 0
-        return total_leads % 2
+        distributions = list(result.scalars().all())
+        limit = distribution_scheduler.max_recipients - len(distributions)
+        if limit <= 0:
+            return distributions
 
-    async def distribute_lead(self, lead: Lead, include_demo: bool = False) -> List[LeadDistribution]:
-        """Distribute lead to eligible users according to the specified algorithm."""
         # Get eligible users
-        users = await self.get_eligible_users(lead.category, lead.city)
+        users = await self.get_eligible_users(
+            lead.category,
+            lead.city,
+            exclude_users=sorted(distribution.user_id for distribution in distributions)
+        )
         if not users:
-            return []
+            return distributions
 
         # Split users into groups
         user_groups = await self.get_user_groups(users)
         if not user_groups:
-            return []
-
-        # Determine which group should receive the lead
-        group_index = await self.get_next_group_index(lead.category)
-        
-        # If group_index is 1, we go in reverse order
-        if group_index == 1:
-            user_groups = list(reversed(user_groups))
+            return distributions
 
-        # Get the target group (first group after reordering)
-        target_group = user_groups[0] if user_groups else []
+        # Weighted round-robin across plans, limited by MAX_RECIPIENTS
+        recipients = await distribution_scheduler.select(lead.category, lead.city, user_groups, limit)
         
         # Create distributions with delays
-        distributions = []
-        for i, user in enumerate(target_group):
+        for user in recipients:
             distribution = await self.create_distribution(
                 lead_id=lead.id,
                 user_id=user.id
@@ -339,8 +374,9 @@ class DistributionService:
         if not is_working_hours():
             return None
             
-        category = random.choice(settings.CATEGORIES)
-        city = random.choice(settings.CITIES)
+        config = runtime_config.snapshot
+        category = random.choice(config.categories)
+        city = random.choice(config.cities)
         demo_data = generate_demo_lead(category, city)
         
         lead = Lead(**demo_data)
@@ -359,17 +395,12 @@ class DistributionService:
         result = await self.session.execute(query)
         return result.scalars().all()
 
-    async def mark_distribution_viewed(self, distribution_id: int) -> Optional[LeadDistribution]:
-        """Mark distribution as viewed."""
-        query = select(LeadDistribution).where(LeadDistribution.id == distribution_id)
-        result = await self.session.execute(query)
-        distribution = result.scalar_one_or_none()
-        
-        if distribution:
-            distribution.viewed_at = datetime.utcnow()
-            await self.session.commit()
-            
-        return distribution
+    async def mark_distribution_viewed(self, distribution_id: int) -> None:
+        """Mark distribution as viewed.
+
+        The mark is buffered and written in bulk by ``view_buffer``.
+        """
+        view_buffer.record(distribution_id)
 
     def format_lead_for_user(self, lead: Lead, user: User) -> str:
         """Format lead data for sending to user with phone masking."""
@@ -392,7 +423,7 @@ class DistributionService:
             if lead.category == "Установка окон":
                 message_parts.append(f"🪟 Количество окон: {int(lead.area)} шт.")
             else:
-            message_parts.append(f"📐 Площадь: {lead.area} м²")
+                message_parts.append(f"📐 Площадь: {lead.area} м²")
         
         message_parts.append("\n📝 Описание:")
         message_parts.append(lead.description)
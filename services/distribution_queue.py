@@ -0,0 +1,214 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select, and_, or_, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from bot.core.config import settings
+from bot.models.lead import Lead
+from bot.models.distribution_job import DistributionJob
+from bot.services.distribution import DistributionService
+from bot.services.query_stats import query_scope
+from bot.services.metrics import LEADS, LEAD_FANOUT
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+async def enqueue_lead(session: AsyncSession, lead_data: Dict[str, Any]) -> Lead:
+    """Store lead together with its distribution job in one transaction."""
+    lead = Lead(**lead_data)
+    session.add(lead)
+    await session.flush()
+    session.add(DistributionJob(lead_id=lead.id))
+    await session.commit()
+    distribution_workers.notify()
+    return lead
+
+class DistributionWorkerPool:
+    """Pool of workers distributing leads from the ``distribution_jobs`` outbox.
+
+    A job is claimed with a conditional UPDATE that takes a lease
+    (``locked_until``). If a worker dies the lease expires and the job is
+    picked up again, so delivery is at-least-once; distribution creation is
+    idempotent per (lead, user), so a repeated job does not duplicate leads.
+    """
+
+    def __init__(
+        self,
+        workers: int = None,
+        poll_interval: float = 2.0,
+        lease: timedelta = timedelta(minutes=2),
+        max_attempts: int = 5
+    ):
+        self.workers = workers or settings.DISTRIBUTION_WORKERS
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.session_maker = None
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+        # Метрики
+        self.processed = 0
+        self.failed = 0
+        self.distributed = 0
+        self._started_at = time.monotonic()
+
+    def notify(self) -> None:
+        """Wake workers up after a new job was stored."""
+        self._wakeup.set()
+
+    def start(self, session_maker) -> None:
+        """Start worker tasks."""
+        self.session_maker = session_maker
+        if not self._tasks:
+            # Event должен принадлежать циклу, в котором работают воркеры
+            self._wakeup = asyncio.Event()
+            self._tasks = [
+                asyncio.create_task(self._worker(index))
+                for index in range(self.workers)
+            ]
+            logger.info(f"Started {self.workers} distribution workers")
+
+    async def stop(self) -> None:
+        """Stop worker tasks. Claimed jobs are retried after their lease expires."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            try:
+                if await self.process_next():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Distribution worker {index} error: {str(e)}", exc_info=True)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _claim(self) -> Optional[DistributionJob]:
+        """Take a lease on the oldest available job."""
+        now = datetime.utcnow()
+        async with self.session_maker() as session:
+            candidates = await session.execute(
+                select(DistributionJob.id)
+                .where(
+                    and_(
+                        DistributionJob.status == "pending",
+                        DistributionJob.available_at <= now,
+                        or_(
+                            DistributionJob.locked_until.is_(None),
+                            DistributionJob.locked_until < now
+                        )
+                    )
+                )
+                .order_by(DistributionJob.id)
+                .limit(self.workers)
+            )
+            for job_id in candidates.scalars().all():
+                # Условный UPDATE: задание достается только одному воркеру
+                result = await session.execute(
+                    update(DistributionJob)
+                    .where(
+                        and_(
+                            DistributionJob.id == job_id,
+                            DistributionJob.status == "pending",
+                            or_(
+                                DistributionJob.locked_until.is_(None),
+                                DistributionJob.locked_until < now
+                            )
+                        )
+                    )
+                    .values(
+                        locked_until=now + self.lease,
+                        attempts=DistributionJob.attempts + 1
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+                if result.rowcount == 1:
+                    return await session.get(DistributionJob, job_id)
+        return None
+
+    async def process_next(self) -> bool:
+        """Process one job. Returns False when there was nothing to do."""
+        with query_scope("job:distribute_lead"):
+            job = await self._claim()
+            if not job:
+                return False
+
+            async with self.session_maker() as session:
+                try:
+                    lead = await session.get(Lead, job.lead_id)
+                    distributions = []
+                    if lead:
+                        distribution_service = DistributionService(session)
+                        distributions = await distribution_service.distribute_lead(lead)
+
+                    await session.execute(
+                        update(DistributionJob)
+                        .where(DistributionJob.id == job.id)
+                        .values(status="done", finished_at=datetime.utcnow(), locked_until=None)
+                    )
+                    await session.commit()
+
+                    self.processed += 1
+                    recipients = len([d for d in distributions if d])
+                    self.distributed += recipients
+                    LEAD_FANOUT.observe(recipients)
+                    LEADS.inc(result="distributed" if recipients else "unassigned")
+                    if not distributions:
+                        logger.warning(f"No eligible users found for lead {job.lead_id}")
+                    else:
+                        logger.info(f"Lead {job.lead_id} distributed to {len(distributions)} users")
+
+                except Exception as e:
+                    logger.error(f"Error distributing lead {job.lead_id}: {str(e)}", exc_info=True)
+                    await session.rollback()
+                    await self._retry_later(session, job, str(e))
+
+            return True
+
+    async def _retry_later(self, session: AsyncSession, job: DistributionJob, error: str) -> None:
+        self.failed += 1
+        values = {"locked_until": None, "last_error": error[:500]}
+        if job.attempts >= self.max_attempts:
+            values["status"] = "failed"
+            logger.error(f"Distribution job for lead {job.lead_id} failed after {job.attempts} attempts")
+        else:
+            # Экспоненциальная задержка перед повтором
+            values["available_at"] = datetime.utcnow() + timedelta(seconds=2 ** job.attempts * 5)
+
+        await session.execute(
+            update(DistributionJob).where(DistributionJob.id == job.id).values(**values)
+        )
+        await session.commit()
+
+    async def stats(self) -> Dict[str, Any]:
+        """Queue lag and throughput."""
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(func.count(DistributionJob.id), func.min(DistributionJob.created_at))
+                .where(DistributionJob.status == "pending")
+            )
+            pending, oldest = result.one()
+
+        uptime = time.monotonic() - self._started_at
+        return {
+            "pending": pending,
+            "lag_seconds": (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0,
+            "processed": self.processed,
+            "failed": self.failed,
+            "distributed": self.distributed,
+            "throughput_per_minute": self.processed / uptime * 60 if uptime else 0.0
+        }
+
+# Один пул воркеров на процесс
+distribution_workers = DistributionWorkerPool()
@@ -0,0 +1,207 @@
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Sequence
+from bot.core.config import settings
+from bot.services.runtime_config import runtime_config
+from bot.services.leader import RELEASE_SCRIPT
+import asyncio
+import json
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+class MemoryCursorStore:
+    """Rotation cursors kept in process memory."""
+
+    def __init__(self):
+        self._cursors: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    @asynccontextmanager
+    async def lock(self, key: str):
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            yield
+
+    async def get(self, key: str) -> Dict[str, Any]:
+        return self._cursors.get(key, {})
+
+    async def set(self, key: str, cursor: Dict[str, Any]) -> None:
+        self._cursors[key] = cursor
+
+class RedisCursorStore:
+    """Rotation cursors shared by all workers through Redis."""
+
+    def __init__(
+        self,
+        redis=None,
+        prefix: str = "distribution:cursor",
+        ttl: int = 30 * 86400,
+        lock_ttl: float = 5,
+        lock_retry: float = 0.02
+    ):
+        self._redis = redis
+        self.prefix = prefix
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.lock_retry = lock_retry
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            from bot.services.cache import get_redis
+            self._redis = get_redis()
+        return self._redis
+
+    async def get(self, key: str) -> Dict[str, Any]:
+        value = await self.redis.get(f"{self.prefix}:{key}")
+        return json.loads(value) if value else {}
+
+    async def set(self, key: str, cursor: Dict[str, Any]) -> None:
+        await self.redis.set(
+            f"{self.prefix}:{key}",
+            json.dumps(cursor, separators=(",", ":")),
+            ex=self.ttl
+        )
+
+    @asynccontextmanager
+    async def lock(self, key: str):
+        """Hold the per-cursor lock while the cursor is read and written back.
+
+        The lock expires after ``lock_ttl`` seconds, so a worker that died
+        while holding it delays the others by at most that long.
+        """
+        lock_key = f"{self.prefix}:{key}:lock"
+        token = uuid.uuid4().hex
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.lock_ttl
+        acquired = False
+        try:
+            while True:
+                acquired = bool(await self.redis.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000)))
+                if acquired or loop.time() >= deadline:
+                    break
+                await asyncio.sleep(self.lock_retry)
+        except Exception as e:
+            logger.error(f"Error locking distribution cursor {key}: {str(e)}")
+        if not acquired:
+            # Распределение важнее точной ротации: продолжаем без блокировки
+            logger.warning(f"Distribution cursor {key} is not locked, rotation may repeat recipients")
+
+        try:
+            yield
+        finally:
+            if acquired:
+                try:
+                    await self.redis.eval(RELEASE_SCRIPT, 1, lock_key, token)
+                except Exception as e:
+                    logger.error(f"Error unlocking distribution cursor {key}: {str(e)}")
+
+class DistributionScheduler:
+    """Weighted round-robin choice of lead recipients.
+
+    Recipients are taken from per-tier lists built once per lead. Slots are
+    handed out to tiers with smooth weighted round-robin, so over many leads
+    every tier gets a share of slots proportional to its weight (as long as
+    it has enough users), and inside a tier users are taken in turn from a
+    rotation cursor. The cursor is kept per (category, city) and updated
+    under the store's per-key lock, and picking ``k`` recipients costs
+    O(k * tiers).
+    """
+
+    def __init__(
+        self,
+        weights: Optional[Dict[str, int]] = None,
+        max_recipients: Optional[int] = None,
+        store=None
+    ):
+        self.weights = weights or {
+            plan_name: plan_data.get("distribution_weight", 1)
+            for plan_name, plan_data in settings.SUBSCRIPTION_PLANS.items()
+        }
+        self._max_recipients = max_recipients
+        self.store = store or RedisCursorStore()
+
+    @property
+    def max_recipients(self) -> int:
+        # Без явного значения лимит берется из текущих настроек администратора
+        return self._max_recipients or runtime_config.snapshot.max_recipients
+
+    @staticmethod
+    def cursor_key(category: str, city: str) -> str:
+        return f"{category}:{city}"
+
+    def plan(
+        self,
+        cursor: Dict[str, Any],
+        buckets: Dict[str, Sequence[Any]],
+        limit: Optional[int] = None
+    ) -> List[Any]:
+        """Pick recipients from ``buckets`` and advance ``cursor`` in place.
+
+        ``cursor`` holds the smooth round-robin weights (``cw``) and the
+        rotation position inside each tier (``pos``).
+        """
+        limit = limit or self.max_recipients
+        tiers = [tier for tier in self.weights if buckets.get(tier)]
+        if not tiers:
+            return []
+
+        current = cursor.setdefault("cw", {})
+        positions = cursor.setdefault("pos", {})
+        taken = {tier: 0 for tier in tiers}
+        limit = min(limit, sum(len(buckets[tier]) for tier in tiers))
+
+        recipients = []
+        while len(recipients) < limit:
+            # Тариф участвует, пока в нем остались пользователи для этой заявки
+            candidates = [tier for tier in tiers if taken[tier] < len(buckets[tier])]
+            total = 0
+            best = None
+            for tier in candidates:
+                weight = self.weights[tier]
+                total += weight
+                current[tier] = current.get(tier, 0) + weight
+                if best is None or current[tier] > current[best]:
+                    best = tier
+            current[best] -= total
+
+            users = buckets[best]
+            index = (positions.get(best, 0) + taken[best]) % len(users)
+            recipients.append(users[index])
+            taken[best] += 1
+
+        for tier, count in taken.items():
+            if count:
+                positions[tier] = (positions.get(tier, 0) + count) % len(buckets[tier])
+
+        return recipients
+
+    async def select(
+        self,
+        category: str,
+        city: str,
+        buckets: Dict[str, Sequence[Any]],
+        limit: Optional[int] = None
+    ) -> List[Any]:
+        """Pick up to ``limit`` recipients of a lead in ``category``/``city``."""
+        key = self.cursor_key(category, city)
+        # Чтение, сдвиг и запись курсора под одной блокировкой: иначе
+        # параллельные воркеры выдают одних и тех же получателей
+        async with self.store.lock(key):
+            try:
+                cursor = await self.store.get(key)
+            except Exception as e:
+                logger.error(f"Error loading distribution cursor {key}: {str(e)}")
+                cursor = {}
+
+            recipients = self.plan(cursor, buckets, limit)
+
+            try:
+                await self.store.set(key, cursor)
+            except Exception as e:
+                logger.error(f"Error saving distribution cursor {key}: {str(e)}")
+
+        return recipients
+
+# Общий планировщик для всех воркеров распределения
+distribution_scheduler = DistributionScheduler()
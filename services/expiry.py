@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+from typing import List, Optional, Set, Tuple
+from sqlalchemy import select, and_
+from bot.models.subscription import Subscription
+import asyncio
+import heapq
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SubscriptionExpiryTimer:
+    """In-process heap of upcoming subscription expirations.
+
+    Loaded from the database for a limited horizon and fed by
+    ``SubscriptionService.create_subscription``. Stale entries (renewed or
+    cancelled subscriptions) are harmless: expiring them is a no-op UPDATE.
+    Loading merges rows into the heap, so entries scheduled while the query
+    runs are kept.
+    """
+
+    def __init__(self, horizon: timedelta = timedelta(days=2)):
+        self.horizon = horizon
+        self.session_maker = None
+        self._heap: List[Tuple[datetime, int]] = []
+        self._entries: Set[Tuple[datetime, int]] = set()  # записи кучи, без повторов
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, subscription_id: int, expires_at: datetime) -> None:
+        """Add subscription to the timer."""
+        if expires_at - datetime.utcnow() > self.horizon:
+            # Попадет в таймер при следующей загрузке горизонта
+            return
+        entry = (expires_at, subscription_id)
+        if self._push(entry) and self._heap[0] == entry:
+            # Новая ближайшая дата - пересчитываем время сна
+            self._wakeup.set()
+
+    def _push(self, entry: Tuple[datetime, int]) -> bool:
+        if entry in self._entries:
+            return False
+        self._entries.add(entry)
+        heapq.heappush(self._heap, entry)
+        return True
+
+    def _pop(self) -> Tuple[datetime, int]:
+        entry = heapq.heappop(self._heap)
+        self._entries.discard(entry)
+        return entry
+
+    async def load(self) -> int:
+        """Load subscriptions expiring within the horizon. Returns their number."""
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(Subscription.expires_at, Subscription.id).where(
+                    and_(
+                        Subscription.is_active == True,
+                        Subscription.expires_at <= datetime.utcnow() + self.horizon
+                    )
+                )
+            )
+            rows = result.all()
+        # Не заменяем кучу: schedule() мог добавить записи, пока шел запрос
+        added = sum(self._push(tuple(row)) for row in rows)
+        self._wakeup.set()
+        logger.info(f"Expiry timer loaded {len(rows)} subscriptions, {added} new")
+        return len(rows)
+
+    def start(self, session_maker) -> None:
+        """Start timer loop."""
+        self.session_maker = session_maker
+        if self._task is None:
+            # Событие создаем в работающем цикле (Python 3.9 привязывает его при создании)
+            self._wakeup = asyncio.Event()
+            if self._heap:
+                self._wakeup.set()
+            self._task = asyncio.create_task(self._run())
+            logger.info("Subscription expiry timer started")
+
+    def stop(self) -> None:
+        """Stop timer loop."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            logger.info("Subscription expiry timer stopped")
+
+    async def _run(self) -> None:
+        try:
+            await self.load()
+        except Exception as e:
+            logger.error(f"Error loading expiry timer: {str(e)}", exc_info=True)
+
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            if self._heap:
+                timeout = max((self._heap[0][0] - datetime.utcnow()).total_seconds(), 0)
+
+            if timeout != 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+
+            try:
+                await self._expire_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error expiring subscriptions: {str(e)}", exc_info=True)
+                await asyncio.sleep(5)
+
+    async def _expire_due(self) -> None:
+        from bot.services.subscription import SubscriptionService
+
+        now = datetime.utcnow()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(self._pop()[1])
+        if not due:
+            return
+
+        try:
+            async with self.session_maker() as session:
+                expired = await SubscriptionService(session).check_subscriptions(
+                    subscription_ids=due
+                )
+        except Exception:
+            # Вернем подписки в таймер, чтобы повторить попытку
+            for subscription_id in due:
+                self._push((now, subscription_id))
+            raise
+        logger.info(f"Expiry timer: {expired} of {len(due)} due subscriptions expired")
+
+# Один таймер на процесс
+expiry_timer = SubscriptionExpiryTimer()
@@ -0,0 +1,155 @@
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+from sqlalchemy import select, and_, DateTime, Float, Integer
+from bot.models.lead import Lead
+from bot.models.user import User
+from bot.services.query_stats import query_scope
+from bot.services.retention import distribution_source
+import asyncio
+import csv
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+FORMAT_CSV = "csv"
+FORMAT_PARQUET = "parquet"
+
+LEAD_COLUMNS = (
+    Lead.id, Lead.created_at, Lead.category, Lead.city, Lead.name, Lead.phone,
+    Lead.area, Lead.status, Lead.description, Lead.source_chat_id, Lead.source_message_id
+)
+
+def build_query(kind: str, start: datetime, end: datetime) -> Tuple[Any, Sequence[Any]]:
+    """Export query for the period and its columns."""
+    if kind == "leads":
+        query = select(*LEAD_COLUMNS).where(and_(Lead.created_at >= start, Lead.created_at < end))
+        return query.order_by(Lead.created_at), LEAD_COLUMNS
+
+    if kind == "distributions":
+        # Старые периоды читаются вместе с архивом
+        source = distribution_source(start)
+        columns = (
+            source.c.id, source.c.lead_id, source.c.user_id, User.telegram_id,
+            Lead.category, Lead.city, source.c.sent_at, source.c.viewed_at
+        )
+        query = (
+            select(*columns)
+            .select_from(source)
+            .join(Lead, Lead.id == source.c.lead_id)
+            .join(User, User.id == source.c.user_id)
+            .where(and_(source.c.sent_at >= start, source.c.sent_at < end))
+            .order_by(source.c.sent_at)
+        )
+        return query, columns
+
+    raise ValueError(f"Unknown export: {kind}")
+
+EXPORTS = ("distributions", "leads")
+
+def parquet_available() -> bool:
+    """Whether the optional pyarrow dependency is installed."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+class _CsvWriter:
+    def __init__(self, path: str, columns: Sequence[Any]):
+        # utf-8-sig - чтобы Excel правильно открыл кириллицу
+        self.file = open(path, "w", newline="", encoding="utf-8-sig")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([column.key for column in columns])
+
+    def write(self, rows: List[Tuple]) -> None:
+        self.writer.writerows(rows)
+
+    def close(self) -> None:
+        self.file.close()
+
+class _ParquetWriter:
+    def __init__(self, path: str, columns: Sequence[Any]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        def arrow_type(column):
+            if isinstance(column.type, DateTime):
+                return pa.timestamp("us")
+            if isinstance(column.type, Integer):
+                return pa.int64()
+            if isinstance(column.type, Float):
+                return pa.float64()
+            return pa.string()
+
+        self.pa = pa
+        self.schema = pa.schema([(column.key, arrow_type(column)) for column in columns])
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write(self, rows: List[Tuple]) -> None:
+        # Каждая порция - отдельная группа строк файла
+        columns = list(zip(*rows))
+        self.writer.write_table(self.pa.Table.from_arrays(
+            [self.pa.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema
+        ))
+
+    def close(self) -> None:
+        self.writer.close()
+
+class ExportService:
+    """Streams leads or distributions for a period into a CSV/Parquet file.
+
+    Rows are read from a server-side cursor in chunks of ``chunk_size``,
+    and each chunk is encoded in the default executor, so memory use does
+    not depend on the period and the event loop is not blocked.
+    """
+
+    def __init__(self, session_maker, chunk_size: int = 5000):
+        self.session_maker = session_maker
+        self.chunk_size = chunk_size
+
+    async def export(
+        self,
+        kind: str,
+        start: datetime,
+        end: datetime,
+        file_format: str = FORMAT_CSV,
+        path: Optional[str] = None
+    ) -> Tuple[str, int]:
+        """Write the export and return ``(path, rows)``.
+
+        Without ``path`` a temp file is created; the caller removes it.
+        """
+        if file_format == FORMAT_PARQUET and not parquet_available():
+            raise ValueError("Parquet export requires pyarrow")
+        if file_format not in (FORMAT_CSV, FORMAT_PARQUET):
+            raise ValueError(f"Unknown export format: {file_format}")
+
+        query, columns = build_query(kind, start, end)
+
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix=f"{kind}_", suffix=f".{file_format}")
+            os.close(fd)
+
+        loop = asyncio.get_running_loop()
+        writer_class = _ParquetWriter if file_format == FORMAT_PARQUET else _CsvWriter
+        writer = await loop.run_in_executor(None, writer_class, path, columns)
+        total = 0
+        try:
+            with query_scope(f"job:export_{kind}"):
+                async with self.session_maker() as session:
+                    result = await session.stream(query.execution_options(yield_per=self.chunk_size))
+                    async for partition in result.partitions():
+                        rows = [tuple(row) for row in partition]
+                        await loop.run_in_executor(None, writer.write, rows)
+                        total += len(rows)
+        except BaseException:
+            await loop.run_in_executor(None, writer.close)
+            os.unlink(path)
+            raise
+        await loop.run_in_executor(None, writer.close)
+
+        logger.info(f"Exported {total} {kind} rows ({start:%Y-%m-%d} - {end:%Y-%m-%d}) to {path}")
+        return path, total
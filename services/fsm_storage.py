@@ -0,0 +1,129 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+from bot.core.config import settings
+from bot.services.cache import get_redis
+import json
+import logging
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Данные длиннее этого порога сжимаются
+COMPRESS_THRESHOLD = 512
+
+def encode_record(state: Optional[str], data: Dict[str, Any]) -> bytes:
+    """Encode state and data into a compact Redis value."""
+    raw = json.dumps([state, data], ensure_ascii=False, separators=(",", ":")).encode()
+    if len(raw) > COMPRESS_THRESHOLD:
+        return b"z" + zlib.compress(raw)
+    return b"j" + raw
+
+def decode_record(value: bytes) -> Tuple[Optional[str], Dict[str, Any]]:
+    """Decode value written by ``encode_record``."""
+    if value[:1] == b"z":
+        raw = zlib.decompress(value[1:])
+    else:
+        raw = value[1:]
+    state, data = json.loads(raw)
+    return state, data
+
+class CachedRedisStorage(BaseStorage):
+    """FSM storage in Redis with an in-process write-through cache.
+
+    State and data of one chat live in a single Redis key that expires
+    ``FSM_STATE_TTL`` after the last write. Reads are served from a small LRU
+    of encoded records, so repeated toggles in one menu do not go to Redis
+    for reads; every write still goes to Redis. A local record expires
+    together with its Redis key and is then read from Redis again. Updates of one chat are
+    expected to be handled by one process (see per-chat routing), which
+    keeps the local copy current.
+    """
+
+    def __init__(
+        self,
+        redis=None,
+        state_ttl: Optional[int] = None,
+        cache_size: Optional[int] = None
+    ):
+        self.redis = redis or get_redis()
+        self.state_ttl = state_ttl or settings.FSM_STATE_TTL
+        self.cache_size = cache_size or settings.FSM_LOCAL_CACHE_SIZE
+        # Ключ Redis -> (запись, момент истечения по time.monotonic())
+        self._cache: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        parts = ["fsm", str(key.bot_id), str(key.chat_id), str(key.user_id)]
+        thread_id = getattr(key, "thread_id", None)
+        if thread_id:
+            parts.append(str(thread_id))
+        destiny = getattr(key, "destiny", "default")
+        if destiny != "default":
+            parts.append(destiny)
+        return ":".join(parts)
+
+    def _remember(self, redis_key: str, value: Optional[bytes], ttl: Optional[float] = None) -> None:
+        if value is None:
+            self._cache.pop(redis_key, None)
+            return
+        self._cache[redis_key] = (value, time.monotonic() + (ttl or self.state_ttl))
+        self._cache.move_to_end(redis_key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _read(self, redis_key: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        entry = self._cache.get(redis_key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.monotonic():
+                self._cache.move_to_end(redis_key)
+                return decode_record(value)
+            # Ключ в Redis истек одновременно с локальной копией
+            del self._cache[redis_key]
+
+        # Срок локальной копии берем из оставшегося TTL ключа в Redis
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.get(redis_key)
+        pipe.pttl(redis_key)
+        value, ttl_ms = await pipe.execute()
+        if value is None:
+            return None, {}
+        self._remember(redis_key, value, ttl_ms / 1000 if ttl_ms > 0 else None)
+        return decode_record(value)
+
+    async def _write(self, redis_key: str, state: Optional[str], data: Dict[str, Any]) -> None:
+        if state is None and not data:
+            # Пустое состояние не храним
+            await self.redis.delete(redis_key)
+            self._remember(redis_key, None)
+            return
+
+        value = encode_record(state, data)
+        await self.redis.set(redis_key, value, ex=self.state_ttl)
+        self._remember(redis_key, value)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        redis_key = self._key(key)
+        _, data = await self._read(redis_key)
+        if isinstance(state, State):
+            state = state.state
+        await self._write(redis_key, state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._read(self._key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        redis_key = self._key(key)
+        state, _ = await self._read(redis_key)
+        await self._write(redis_key, state, data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._read(self._key(key))
+        return data
+
+    async def close(self) -> None:
+        self._cache.clear()
@@ -0,0 +1,150 @@
+from typing import Any, Callable, Dict, Optional
+from sqlalchemy import text
+from bot.core.config import settings
+from bot.services.cache import get_redis
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+DEGRADED = "degraded"
+FAIL = "fail"
+
+# Ключ, в который планировщик пишет время последнего запуска
+SCHEDULER_HEARTBEAT_KEY = "scheduler:heartbeat"
+
+async def write_scheduler_heartbeat() -> None:
+    """Record that the scheduler is alive (called by a scheduler job)."""
+    await get_redis().set(SCHEDULER_HEARTBEAT_KEY, str(time.time()), ex=settings.HEALTH_SCHEDULER_LAG * 10)
+
+class HealthService:
+    """Liveness and readiness checks.
+
+    Liveness only says the event loop answers. Readiness checks the
+    database and Redis round trips, the age of the last handled update,
+    the scheduler heartbeat and the lead distribution lag. A failed
+    dependency makes the bot not ready; a slow one or a stale heartbeat
+    is reported as degraded. Readiness results are cached for
+    ``HEALTH_CACHE_SECONDS`` so that frequent probes do not add load.
+    """
+
+    def __init__(
+        self,
+        session_maker,
+        update_stats: Optional[Callable[[], Dict[str, Any]]] = None,
+        queue_stats: Optional[Callable[[], Any]] = None,
+        redis=None,
+        timeout: float = 3.0
+    ):
+        self.session_maker = session_maker
+        self.update_stats = update_stats
+        self.queue_stats = queue_stats
+        self._redis = redis
+        self.timeout = timeout
+        self.started_at = time.time()
+        self.startup: Dict[str, Any] = {}  # время холодного старта и память, заполняет launcher
+        self._cached: Optional[Dict[str, Any]] = None
+        self._cached_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_redis()
+        return self._redis
+
+    def liveness(self) -> Dict[str, Any]:
+        return {"status": OK, "uptime": round(time.time() - self.started_at, 1), **self.startup}
+
+    async def readiness(self) -> Dict[str, Any]:
+        """Cached readiness report."""
+        if self._cached and time.monotonic() - self._cached_at < settings.HEALTH_CACHE_SECONDS:
+            return self._cached
+
+        # Параллельные пробы ждут одну проверку
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._cached and time.monotonic() - self._cached_at < settings.HEALTH_CACHE_SECONDS:
+                return self._cached
+            self._cached = await self._check_all()
+            self._cached_at = time.monotonic()
+            return self._cached
+
+    async def _timed(self, name: str, probe) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(probe(), timeout=self.timeout)
+        except Exception as e:
+            logger.error(f"Health check {name} failed: {str(e)}")
+            return {"status": FAIL, "error": str(e) or type(e).__name__}
+        latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        status = DEGRADED if latency_ms > settings.HEALTH_SLOW_MS else OK
+        return {"status": status, "latency_ms": latency_ms}
+
+    async def _ping_database(self) -> None:
+        async with self.session_maker() as session:
+            await session.execute(text("SELECT 1"))
+
+    async def _ping_redis(self) -> None:
+        await self.redis.ping()
+
+    def _check_updates(self) -> Dict[str, Any]:
+        if self.update_stats is None:
+            return {"status": OK}
+        stats = self.update_stats()
+        last = stats.get("last_processed_at")
+        age = round(time.time() - last, 1) if last else None
+        result = {"status": OK, "pending": stats.get("pending", 0), "last_update_age": age}
+        # Тишина без очереди - это просто отсутствие сообщений
+        if stats.get("pending") and (age is None or age > settings.HEALTH_UPDATE_LAG):
+            result["status"] = DEGRADED
+        return result
+
+    async def _check_scheduler(self) -> Dict[str, Any]:
+        try:
+            value = await asyncio.wait_for(self.redis.get(SCHEDULER_HEARTBEAT_KEY), timeout=self.timeout)
+        except Exception as e:
+            return {"status": DEGRADED, "error": str(e) or type(e).__name__}
+        if not value:
+            return {"status": DEGRADED, "heartbeat_age": None}
+        age = round(time.time() - float(value), 1)
+        status = DEGRADED if age > settings.HEALTH_SCHEDULER_LAG else OK
+        return {"status": status, "heartbeat_age": age}
+
+    async def _check_queue(self) -> Dict[str, Any]:
+        if self.queue_stats is None:
+            return {"status": OK}
+        try:
+            stats = await asyncio.wait_for(self.queue_stats(), timeout=self.timeout)
+        except Exception as e:
+            return {"status": DEGRADED, "error": str(e) or type(e).__name__}
+        status = DEGRADED if stats["lag_seconds"] > settings.HEALTH_QUEUE_LAG else OK
+        return {"status": status, "pending": stats["pending"], "lag_seconds": round(stats["lag_seconds"], 1)}
+
+    async def _check_all(self) -> Dict[str, Any]:
+        database, redis, scheduler, queue = await asyncio.gather(
+            self._timed("database", self._ping_database),
+            self._timed("redis", self._ping_redis),
+            self._check_scheduler(),
+            self._check_queue()
+        )
+        checks = {
+            "database": database,
+            "redis": redis,
+            "updates": self._check_updates(),
+            "scheduler": scheduler,
+            "distribution_queue": queue
+        }
+
+        statuses = {check["status"] for check in checks.values()}
+        if database["status"] == FAIL or redis["status"] == FAIL:
+            status = FAIL
+        elif statuses != {OK}:
+            status = DEGRADED
+        else:
+            status = OK
+
+        return {"status": status, "checked_at": time.time(), "checks": checks}
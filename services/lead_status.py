@@ -0,0 +1,214 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select, update, func, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from bot.core.config import settings
+from bot.models.lead import Lead, LeadDistribution
+from bot.services.cache import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATUSES = tuple(settings.LEAD_STATUSES)
+FILTER_ALL = "all"
+
+NEXT = "next"
+PREV = "prev"
+
+# Поле-метка: хэш построен запросом, а не создан случайным HINCRBY
+READY_FIELD = "_ready"
+COUNTS_TTL = 86400
+
+_EPOCH = datetime(1970, 1, 1)
+
+def counts_key(user_id: int) -> str:
+    return f"lead_status_counts:{user_id}"
+
+def encode_cursor(sent_at: datetime, distribution_id: int) -> str:
+    """Keyset cursor ``<microseconds>_<id>`` for callback data."""
+    return f"{(sent_at - _EPOCH) // timedelta(microseconds=1)}_{distribution_id}"
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, int]]:
+    try:
+        micros, distribution_id = cursor.split("_")
+        return _EPOCH + timedelta(microseconds=int(micros)), int(distribution_id)
+    except ValueError:
+        return None
+
+async def invalidate_counts(user_ids: Iterable[int]) -> None:
+    """Drop cached status counts; they are rebuilt on the next read."""
+    keys = [counts_key(user_id) for user_id in set(user_ids)]
+    if not keys:
+        return
+    try:
+        await get_redis().delete(*keys)
+    except Exception as e:
+        logger.error(f"Error invalidating lead status counts: {str(e)}")
+
+class LeadStatusService:
+    """Per-recipient lead statuses ("Мои заявки").
+
+    Lists are keyset pages over ``ix_lead_distributions_user_status_sent``.
+    Status counts per user live in a Redis hash that is built once by a
+    GROUP BY and then kept in step with HINCRBY on every status change, so
+    the summary screen does not count rows. Only delivered distributions
+    (``sent_at`` in the past) are counted; the hash expires when the next
+    scheduled one becomes visible.
+    """
+
+    def __init__(self, session: AsyncSession, page_size: int = 5):
+        self.session = session
+        self.page_size = page_size
+        self.redis = get_redis()
+
+    async def get_counts(self, user_id: int) -> Dict[str, int]:
+        """Delivered leads of the user by status."""
+        key = counts_key(user_id)
+        try:
+            cached = await self.redis.hgetall(key)
+        except Exception as e:
+            logger.error(f"Error reading lead status counts: {str(e)}")
+            cached = None
+
+        if cached:
+            values = {
+                (field.decode() if isinstance(field, bytes) else field): int(value)
+                for field, value in cached.items()
+            }
+            if values.pop(READY_FIELD, None):
+                return {status: max(values.get(status, 0), 0) for status in STATUSES}
+
+        return await self._build_counts(user_id)
+
+    async def _build_counts(self, user_id: int) -> Dict[str, int]:
+        now = datetime.utcnow()
+        result = await self.session.execute(
+            select(LeadDistribution.status, func.count(LeadDistribution.id))
+            .where(and_(LeadDistribution.user_id == user_id, LeadDistribution.sent_at <= now))
+            .group_by(LeadDistribution.status)
+        )
+        counts = {status: 0 for status in STATUSES}
+        counts.update(dict(result.all()))
+
+        # Хэш живет до момента, когда станет видна следующая отложенная заявка
+        next_visible = await self.session.scalar(
+            select(func.min(LeadDistribution.sent_at))
+            .where(and_(LeadDistribution.user_id == user_id, LeadDistribution.sent_at > now))
+        )
+        ttl = COUNTS_TTL
+        if next_visible is not None:
+            ttl = max(1, min(ttl, int((next_visible - now).total_seconds()) + 1))
+
+        key = counts_key(user_id)
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.delete(key)
+            pipe.hset(key, mapping={**counts, READY_FIELD: 1})
+            pipe.expire(key, ttl)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error caching lead status counts: {str(e)}")
+        return counts
+
+    async def get_page(
+        self,
+        user_id: int,
+        status: str = FILTER_ALL,
+        cursor: Optional[str] = None,
+        direction: str = NEXT
+    ) -> Dict[str, Any]:
+        """Delivered leads, newest first, after (``next``) or before (``prev``) ``cursor``."""
+        query = (
+            select(LeadDistribution, Lead)
+            .join(Lead, Lead.id == LeadDistribution.lead_id)
+            .where(and_(LeadDistribution.user_id == user_id, LeadDistribution.sent_at <= datetime.utcnow()))
+        )
+        if status != FILTER_ALL:
+            query = query.where(LeadDistribution.status == status)
+
+        position = decode_cursor(cursor) if cursor else None
+        if direction == PREV:
+            if position:
+                sent_at, distribution_id = position
+                query = query.where(or_(
+                    LeadDistribution.sent_at > sent_at,
+                    and_(LeadDistribution.sent_at == sent_at, LeadDistribution.id > distribution_id)
+                ))
+            query = query.order_by(LeadDistribution.sent_at, LeadDistribution.id)
+        else:
+            if position:
+                sent_at, distribution_id = position
+                query = query.where(or_(
+                    LeadDistribution.sent_at < sent_at,
+                    and_(LeadDistribution.sent_at == sent_at, LeadDistribution.id < distribution_id)
+                ))
+            query = query.order_by(LeadDistribution.sent_at.desc(), LeadDistribution.id.desc())
+
+        # Лишняя строка показывает, есть ли страница дальше
+        rows: List[Tuple[LeadDistribution, Lead]] = list((await self.session.execute(query.limit(self.page_size + 1))).all())
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if direction == PREV:
+            rows.reverse()
+
+        if direction == PREV:
+            has_prev, has_next = has_more, position is not None
+        else:
+            has_prev, has_next = position is not None, has_more
+
+        return {
+            "items": rows,
+            "first": encode_cursor(rows[0][0].sent_at, rows[0][0].id) if rows else None,
+            "last": encode_cursor(rows[-1][0].sent_at, rows[-1][0].id) if rows else None,
+            "has_prev": has_prev and bool(rows),
+            "has_next": has_next and bool(rows)
+        }
+
+    async def get_distribution(self, user_id: int, distribution_id: int) -> Optional[Tuple[LeadDistribution, Lead]]:
+        """Delivered distribution of the user together with its lead."""
+        row = (await self.session.execute(
+            select(LeadDistribution, Lead)
+            .join(Lead, Lead.id == LeadDistribution.lead_id)
+            .where(and_(
+                LeadDistribution.id == distribution_id,
+                LeadDistribution.user_id == user_id,
+                LeadDistribution.sent_at <= datetime.utcnow()
+            ))
+        )).first()
+        return tuple(row) if row else None
+
+    async def set_status(self, user_id: int, distribution_id: int, old_status: str, new_status: str) -> bool:
+        """Change the status with one UPDATE by primary key.
+
+        ``old_status`` is what the user saw; if the row has changed since,
+        nothing is updated and False is returned.
+        """
+        if new_status not in STATUSES or old_status == new_status:
+            return False
+
+        result = await self.session.execute(
+            update(LeadDistribution)
+            .where(and_(
+                LeadDistribution.id == distribution_id,
+                LeadDistribution.user_id == user_id,
+                LeadDistribution.status == old_status
+            ))
+            .values(status=new_status)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.commit()
+        if result.rowcount != 1:
+            return False
+
+        key = counts_key(user_id)
+        try:
+            # Только если хэш уже построен: иначе он соберется запросом
+            if await self.redis.hexists(key, READY_FIELD):
+                pipe = self.redis.pipeline(transaction=True)
+                pipe.hincrby(key, old_status, -1)
+                pipe.hincrby(key, new_status, 1)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error updating lead status counts: {str(e)}")
+            await invalidate_counts([user_id])
+        return True
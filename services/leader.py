@@ -0,0 +1,110 @@
+from typing import Awaitable, Callable, Optional
+from bot.services.cache import get_redis
+import asyncio
+import logging
+import os
+import socket
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Продлеваем блокировку, только если она все еще наша
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+class LeaderElection:
+    """Redis lock that lets exactly one worker run singleton jobs.
+
+    The lock expires after ``ttl`` seconds unless renewed, so if the leader
+    dies another worker takes over within one ``ttl``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        on_elected: Callable[[], Awaitable[None]],
+        on_lost: Callable[[], Awaitable[None]],
+        ttl: int = 30,
+        redis=None
+    ):
+        self.key = f"leader:{name}"
+        self.on_elected = on_elected
+        self.on_lost = on_lost
+        self.ttl = ttl
+        self.redis = redis or get_redis()
+        self.identity = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start election loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop election loop and release the lock."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self.is_leader:
+            await self._set_leader(False)
+            try:
+                await self.redis.eval(RELEASE_SCRIPT, 1, self.key, self.identity)
+            except Exception as e:
+                logger.error(f"Error releasing leader lock: {str(e)}")
+
+    async def _try_acquire(self) -> bool:
+        if self.is_leader:
+            renewed = await self.redis.eval(
+                RENEW_SCRIPT, 1, self.key, self.identity, self.ttl * 1000
+            )
+            return bool(renewed)
+        acquired = await self.redis.set(self.key, self.identity, nx=True, px=self.ttl * 1000)
+        return bool(acquired)
+
+    async def _set_leader(self, is_leader: bool) -> None:
+        if is_leader == self.is_leader:
+            return
+        self.is_leader = is_leader
+        if is_leader:
+            logger.info(f"Worker {self.identity} became leader for {self.key}")
+            await self.on_elected()
+        else:
+            logger.warning(f"Worker {self.identity} lost leadership for {self.key}")
+            await self.on_lost()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                is_leader = await self._try_acquire()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Без связи с Redis не можем подтвердить лидерство
+                logger.error(f"Leader election error: {str(e)}")
+                is_leader = False
+
+            try:
+                await self._set_leader(is_leader)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error switching leadership: {str(e)}", exc_info=True)
+
+            await asyncio.sleep(self.ttl / 3)
@@ -0,0 +1,89 @@
+from typing import Dict, Optional, Tuple
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from bot.core.config import settings
+from bot.services.metrics import MARKUP_EDITS, TELEGRAM_RETRY_AFTER
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class _PendingEdit:
+    __slots__ = ("message", "markup", "sent", "task")
+
+    def __init__(self, message: types.Message, markup: types.InlineKeyboardMarkup):
+        self.message = message
+        self.markup = markup
+        # Клавиатура, которая сейчас показана пользователю
+        self.sent = message.reply_markup
+        self.task: Optional[asyncio.Task] = None
+
+def _same(left, right) -> bool:
+    # Клавиатуры из кэша - одни и те же объекты, сравнение по значению - запасной путь
+    return left is right or left == right
+
+class MarkupEditCoalescer:
+    """Debounced ``edit_reply_markup`` per message.
+
+    Rapid taps only replace the pending markup; after ``window`` seconds
+    the latest one is sent, and nothing is sent if it matches what the
+    user already sees. At most one edit per message is in flight.
+    """
+
+    def __init__(self, window: Optional[float] = None):
+        self.window = settings.MARKUP_EDIT_WINDOW_MS / 1000 if window is None else window
+        self._pending: Dict[Tuple[int, int], _PendingEdit] = {}
+
+    def submit(self, message: types.Message, markup: types.InlineKeyboardMarkup) -> None:
+        """Schedule ``markup`` to be shown on ``message``."""
+        key = (message.chat.id, message.message_id)
+        pending = self._pending.get(key)
+        if pending is not None:
+            # Промежуточное состояние не отправляется
+            MARKUP_EDITS.inc(result="superseded")
+            pending.markup = markup
+            return
+
+        pending = self._pending[key] = _PendingEdit(message, markup)
+        pending.task = asyncio.create_task(self._flush(key, pending))
+
+    def discard(self, message: types.Message) -> None:
+        """Drop a pending edit (e.g. the message is about to be replaced)."""
+        pending = self._pending.pop((message.chat.id, message.message_id), None)
+        if pending is not None and pending.task is not None:
+            pending.task.cancel()
+
+    async def _flush(self, key: Tuple[int, int], pending: _PendingEdit) -> None:
+        try:
+            while True:
+                await asyncio.sleep(self.window)
+                markup = pending.markup
+                if _same(markup, pending.sent):
+                    MARKUP_EDITS.inc(result="unchanged")
+                    return
+
+                try:
+                    await pending.message.edit_reply_markup(reply_markup=markup)
+                    MARKUP_EDITS.inc(result="sent")
+                except TelegramRetryAfter as e:
+                    TELEGRAM_RETRY_AFTER.inc()
+                    await asyncio.sleep(e.retry_after)
+                    continue
+                except TelegramBadRequest as e:
+                    if "not modified" not in str(e):
+                        logger.error(f"Error editing keyboard in chat {key[0]}: {str(e)}")
+                        return
+                pending.sent = markup
+
+                # Пока шел запрос, пользователь мог нажать еще раз
+                if pending.markup is markup:
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error editing keyboard in chat {key[0]}: {str(e)}")
+        finally:
+            if self._pending.get(key) is pending:
+                del self._pending[key]
+
+markup_editor = MarkupEditCoalescer()
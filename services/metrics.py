@@ -0,0 +1,332 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Сэмпл: (имя ряда, метки, значение)
+Sample = Tuple[str, Dict[str, str], float]
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # Счетчики по корзинам (без накопления), сумма и количество
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        for key, (counts, total, count) in self._values.items():
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                samples.append((f"{self.name}_bucket", dict(labels, le=le), cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text format.
+
+    Metrics are plain dict counters updated from the event loop, so no
+    locking is needed. Values that are cheaper to read on scrape (pool
+    usage, queue depth) are registered as callbacks.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._callbacks: List[Tuple[str, str, str, Callable[[], Any]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], Any],
+        metric_type: str = "gauge"
+    ) -> None:
+        """Register a metric read on scrape.
+
+        ``callback`` returns a number, a list of ``(labels, value)`` or None.
+        """
+        self._callbacks = [item for item in self._callbacks if item[0] != name]
+        self._callbacks.append((name, metric_type, documentation, callback))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """All current values in a JSON-friendly form."""
+        families = {}
+        samples = []
+        for metric in self._metrics.values():
+            families[metric.name] = [metric.type, metric.documentation]
+            samples.extend(metric.samples())
+
+        for name, metric_type, documentation, callback in self._callbacks:
+            try:
+                value = callback()
+            except Exception as e:
+                logger.error(f"Error collecting metric {name}: {str(e)}")
+                continue
+            if value is None:
+                continue
+            families[name] = [metric_type, documentation]
+            if isinstance(value, (int, float)):
+                samples.append((name, {}, value))
+            else:
+                samples.extend((name, labels, sample_value) for labels, sample_value in value)
+
+        return {"families": families, "samples": samples}
+
+def merge_snapshots(snapshots: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine snapshots of several workers.
+
+    Counters and histograms are summed; gauges get a ``worker`` label,
+    because summing e.g. pool usage of different processes is misleading.
+    """
+    families: Dict[str, List[str]] = {}
+    totals: Dict[Tuple[str, Tuple], float] = {}
+    labels_by_key: Dict[Tuple[str, Tuple], Dict[str, str]] = {}
+
+    for worker, snapshot in sorted(snapshots.items()):
+        families.update(snapshot["families"])
+        for sample_name, labels, value in snapshot["samples"]:
+            family = _family_of(sample_name, snapshot["families"])
+            if snapshot["families"].get(family, ["untyped"])[0] == "gauge":
+                labels = dict(labels, worker=worker)
+            key = (sample_name, tuple(sorted(labels.items())))
+            totals[key] = totals.get(key, 0) + value
+            labels_by_key[key] = labels
+
+    samples = [(name, labels_by_key[(name, labels)], value) for (name, labels), value in totals.items()]
+    return {"families": families, "samples": samples}
+
+def _family_of(sample_name: str, families: Dict[str, Any]) -> str:
+    if sample_name in families:
+        return sample_name
+    for suffix in ("_bucket", "_sum", "_count"):
+        if sample_name.endswith(suffix) and sample_name[:-len(suffix)] in families:
+            return sample_name[:-len(suffix)]
+    return sample_name
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def render(snapshot: Dict[str, Any]) -> str:
+    """Render a snapshot in the Prometheus text exposition format."""
+    by_family: Dict[str, List[Sample]] = {}
+    for sample in snapshot["samples"]:
+        by_family.setdefault(_family_of(sample[0], snapshot["families"]), []).append(sample)
+
+    lines = []
+    for family, (metric_type, documentation) in sorted(snapshot["families"].items()):
+        lines.append(f"# HELP {family} {documentation}")
+        lines.append(f"# TYPE {family} {metric_type}")
+        for sample_name, labels, value in by_family.get(family, []):
+            if labels:
+                label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f"{sample_name}{{{label_text}}} {float(value)!r}")
+            else:
+                lines.append(f"{sample_name} {float(value)!r}")
+    return "\n".join(lines) + "\n"
+
+class MetricsPublisher:
+    """Publishes this worker's snapshot to Redis so any worker can serve /metrics."""
+
+    def __init__(self, worker: str, interval: int = 10, redis=None, prefix: str = "metrics:worker"):
+        self.worker = worker
+        self.interval = interval
+        self._redis = redis
+        self.prefix = prefix
+        self._task = None
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            from bot.services.cache import get_redis
+            self._redis = get_redis()
+        return self._redis
+
+    async def publish(self) -> None:
+        await self.redis.set(
+            f"{self.prefix}:{self.worker}",
+            json.dumps(registry.snapshot(), separators=(",", ":")),
+            ex=self.interval * 3
+        )
+
+    async def collect(self) -> Dict[str, Any]:
+        """Merged snapshot of all live workers (this one read directly)."""
+        snapshots = {self.worker: registry.snapshot()}
+        async for key in self.redis.scan_iter(match=f"{self.prefix}:*", count=100):
+            key = key.decode() if isinstance(key, bytes) else key
+            worker = key.rsplit(":", 1)[-1]
+            if worker == self.worker:
+                continue
+            value = await self.redis.get(key)
+            if value:
+                snapshots[worker] = json.loads(value)
+        return merge_snapshots(snapshots)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.publish()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error publishing metrics: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+registry = MetricsRegistry()
+
+def register_engine(engine) -> None:
+    """Expose connection pool usage of an (async) engine."""
+    pool = getattr(engine, "sync_engine", engine).pool
+
+    def pool_usage():
+        if not hasattr(pool, "checkedout"):
+            return None
+        return [
+            ({"state": "checked_out"}, pool.checkedout()),
+            ({"state": "size"}, pool.size()),
+            ({"state": "overflow"}, pool.overflow())
+        ]
+
+    registry.callback("bot_db_pool_connections", "Database connection pool usage", pool_usage)
+
+# Метрики бота
+HANDLER_DURATION = registry.histogram(
+    "bot_handler_duration_seconds", "Update handling time by handler", ["handler"]
+)
+HANDLER_ERRORS = registry.counter(
+    "bot_handler_errors_total", "Handler calls that raised", ["handler"]
+)
+LEADS = registry.counter(
+    "bot_leads_total", "Group messages by parsing and distribution result", ["result"]
+)
+LEAD_FANOUT = registry.histogram(
+    "bot_lead_fanout", "Recipients per distributed lead", buckets=(0, 1, 2, 3, 4, 5, 10, 20, 50)
+)
+CACHE_REQUESTS = registry.counter(
+    "bot_cache_requests_total", "CacheService reads by result", ["result"]
+)
+USER_CACHE_REQUESTS = registry.counter(
+    "bot_user_cache_requests_total", "Current user lookups by identity cache result", ["result"]
+)
+SEND_QUEUE_DEPTH = registry.gauge(
+    "bot_send_queue_depth", "Outgoing messages waiting for a send slot"
+)
+MESSAGES_SENT = registry.counter(
+    "bot_messages_sent_total", "Outgoing messages by result", ["status"]
+)
+TELEGRAM_RETRY_AFTER = registry.counter(
+    "bot_telegram_retry_after_total", "Flood control (429) responses from Telegram"
+)
+MARKUP_EDITS = registry.counter(
+    "bot_markup_edits_total", "Keyboard edits by result (sent, unchanged, superseded)", ["result"]
+)
+VIEW_FLUSHES = registry.counter(
+    "bot_view_flushes_total", "Batched viewed_at writes by result", ["result"]
+)
+JOB_DURATION = registry.histogram(
+    "bot_job_duration_seconds", "Scheduler job run time", ["job"]
+)
@@ -1,11 +1,16 @@
 from datetime import datetime, timedelta
-from typing import List, Optional
-from sqlalchemy import select, and_, func
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, and_, func, exists, insert, cast, String
 from sqlalchemy.ext.asyncio import AsyncSession
 from bot.models.user import User
 from bot.models.subscription import Subscription
-from bot.models.lead_distribution import LeadDistribution
+from bot.models.lead import LeadDistribution
+from bot.models.notification_log import NotificationLog
+from bot.models.base import get_session_maker
 from bot.core.config import settings
+from bot.services.sender import RateLimitedSender, SENT
+from bot.services.broadcast import BroadcastService
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,118 +19,177 @@ class NotificationService:
     def __init__(self, session: AsyncSession, bot):
         self.session = session
         self.bot = bot
+        self.sender = RateLimitedSender(bot)
+        self.marker_batch_size = 50
 
-    async def notify_subscription_expiring(self, days_before: int = 3) -> None:
-        """Notify users about expiring subscriptions."""
-        expiration_date = datetime.utcnow() + timedelta(days=days_before)
-        
-        # Находим подписки, которые истекают через days_before дней
-        query = select(Subscription).where(
+    @staticmethod
+    def _not_notified(kind: str, period_key):
+        """Condition excluding subscriptions whose user already got this notification."""
+        return ~exists().where(
             and_(
-                Subscription.is_active == True,
-                Subscription.expires_at <= expiration_date,
-                Subscription.expires_at > datetime.utcnow()
+                NotificationLog.user_id == Subscription.user_id,
+                NotificationLog.kind == kind,
+                NotificationLog.period_key == period_key
             )
-        ).join(User)
+        )
+
+    async def _save_markers(self, markers: List[Dict]) -> None:
+        await self.session.execute(insert(NotificationLog), markers)
+        await self.session.commit()
+
+    async def _send_batch(self, kind: str, messages: List[Tuple[int, str, Tuple[int, str]]]) -> Dict[str, int]:
+        """Send rendered messages and persist "already notified" markers.
+
+        Markers are written in small batches while sending, so a crash
+        mid-run resends at most one batch.
+        """
+        markers = []
+        lock = asyncio.Lock()
+
+        async def on_result(tag, status):
+            if status != SENT:
+                return
+            user_id, period_key = tag
+            markers.append({
+                "user_id": user_id,
+                "kind": kind,
+                "period_key": period_key,
+                "sent_at": datetime.utcnow()
+            })
+            if len(markers) >= self.marker_batch_size:
+                batch = markers[:]
+                markers.clear()
+                async with lock:
+                    await self._save_markers(batch)
+
+        stats = await self.sender.send_many(messages, on_result)
+        if markers:
+            async with lock:
+                await self._save_markers(markers)
+
+        logger.info(f"Notifications {kind}: {stats}")
+        return stats
+
+    async def notify_subscription_expiring(self, days_before: int = 3) -> Dict[str, int]:
+        """Notify users about expiring subscriptions."""
+        now = datetime.utcnow()
+        expiration_date = now + timedelta(days=days_before)
+        kind = "subscription_expiring"
         
+        # Находим подписки, которые истекают через days_before дней, вместе с telegram_id
+        query = (
+            select(
+                Subscription.id,
+                Subscription.user_id,
+                Subscription.plan_name,
+                Subscription.expires_at,
+                User.telegram_id
+            )
+            .join(User, User.id == Subscription.user_id)
+            .where(
+                and_(
+                    Subscription.is_active == True,
+                    Subscription.expires_at <= expiration_date,
+                    Subscription.expires_at > now,
+                    self._not_notified(kind, cast(Subscription.id, String))
+                )
+            )
+        )
         result = await self.session.execute(query)
-        subscriptions = result.scalars().all()
         
-        for subscription in subscriptions:
-            try:
-                # Формируем текст уведомления
-                message = (
-                    f"⚠️ Внимание! Ваша подписка {subscription.plan_name} "
-                    f"истекает {subscription.expires_at.strftime('%d.%m.%Y')}.\n\n"
-                    "Для продления подписки используйте команду 💳 Подписка"
-                )
-                
-                # Отправляем уведомление
-                await self.bot.send_message(
-                    subscription.user.telegram_id,
-                    message
-                )
-                logger.info(f"Sent expiration notification to user {subscription.user.telegram_id}")
-                
-            except Exception as e:
-                logger.error(f"Error sending notification to user {subscription.user.telegram_id}: {str(e)}")
+        # Формируем тексты уведомлений
+        messages = [
+            (
+                telegram_id,
+                f"⚠️ Внимание! Ваша подписка {plan_name} "
+                f"истекает {expires_at.strftime('%d.%m.%Y')}.\n\n"
+                "Для продления подписки используйте команду 💳 Подписка",
+                (user_id, str(subscription_id))
+            )
+            for subscription_id, user_id, plan_name, expires_at, telegram_id in result.all()
+        ]
+        
+        return await self._send_batch(kind, messages)
 
-    async def notify_leads_limit(self, threshold: float = 0.8) -> None:
+    async def notify_leads_limit(self, threshold: float = 0.8) -> Dict[str, int]:
         """Notify users when they are close to their leads limit."""
         # Получаем начало текущего месяца
-        month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        now = datetime.utcnow()
+        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        kind = "leads_limit"
+        period_key = month_start.strftime("%Y-%m")
         
-        # Находим активные подписки
-        query = select(Subscription).where(
-            and_(
-                Subscription.is_active == True,
-                Subscription.expires_at > datetime.utcnow()
+        # Тарифы с ограниченным количеством заявок
+        limits = {
+            plan_name: plan["leads_limit"]
+            for plan_name, plan in settings.SUBSCRIPTION_PLANS.items()
+            if plan["leads_limit"] != float('inf')
+        }
+        if not limits:
+            return {}
+        
+        # Количество заявок за месяц одним сгруппированным запросом
+        leads_counts = (
+            select(
+                LeadDistribution.user_id,
+                func.count(LeadDistribution.id).label("leads_count")
             )
-        ).join(User)
+            .where(LeadDistribution.sent_at >= month_start)
+            .group_by(LeadDistribution.user_id)
+            .subquery()
+        )
         
+        query = (
+            select(
+                Subscription.user_id,
+                Subscription.plan_name,
+                User.telegram_id,
+                leads_counts.c.leads_count
+            )
+            .join(User, User.id == Subscription.user_id)
+            .join(leads_counts, leads_counts.c.user_id == Subscription.user_id)
+            .where(
+                and_(
+                    Subscription.is_active == True,
+                    Subscription.expires_at > now,
+                    Subscription.plan_name.in_(limits.keys()),
+                    self._not_notified(kind, period_key)
+                )
+            )
+        )
         result = await self.session.execute(query)
-        subscriptions = result.scalars().all()
         
-        for subscription in subscriptions:
-            try:
-                # Получаем лимит для текущего тарифа
-                plan = settings.SUBSCRIPTION_PLANS[subscription.plan_name]
-                leads_limit = plan["leads_limit"]
-                
-                if leads_limit == float('inf'):
-                    continue
-                
-                # Получаем количество полученных заявок
-                leads_count = await self.session.scalar(
-                    select(func.count(LeadDistribution.id)).where(
-                        and_(
-                            LeadDistribution.user_id == subscription.user_id,
-                            LeadDistribution.sent_at >= month_start
-                        )
-                    )
-                )
-                
-                # Проверяем, достигнут ли порог
-                if leads_count >= (leads_limit * threshold):
-                    remaining = leads_limit - leads_count
-                    message = (
-                        f"⚠️ Внимание! Вы приближаетесь к лимиту заявок.\n\n"
-                        f"Использовано: {leads_count} из {leads_limit}\n"
-                        f"Осталось: {remaining} заявок\n\n"
-                        "Для увеличения лимита рассмотрите возможность перехода "
-                        "на более высокий тариф."
-                    )
-                    
-                    await self.bot.send_message(
-                        subscription.user.telegram_id,
-                        message
-                    )
-                    logger.info(f"Sent leads limit notification to user {subscription.user.telegram_id}")
-                    
-            except Exception as e:
-                logger.error(f"Error checking leads limit for user {subscription.user.telegram_id}: {str(e)}")
+        messages = []
+        for user_id, plan_name, telegram_id, leads_count in result.all():
+            leads_limit = limits[plan_name]
+            
+            # Проверяем, достигнут ли порог
+            if leads_count < leads_limit * threshold:
+                continue
+            
+            remaining = max(leads_limit - leads_count, 0)
+            messages.append((
+                telegram_id,
+                f"⚠️ Внимание! Вы приближаетесь к лимиту заявок.\n\n"
+                f"Использовано: {leads_count} из {leads_limit}\n"
+                f"Осталось: {remaining} заявок\n\n"
+                "Для увеличения лимита рассмотрите возможность перехода "
+                "на более высокий тариф.",
+                (user_id, period_key)
+            ))
+        
+        return await self._send_batch(kind, messages)
 
-    async def notify_new_features(self, message: str, admin_only: bool = False) -> None:
+    async def notify_new_features(
+        self,
+        message: str,
+        admin_only: bool = False,
+        started_by: Optional[int] = None
+    ) -> None:
         """Send notification about new features to users."""
         try:
-            # Получаем пользователей для рассылки
-            query = select(User).where(User.is_active == True)
-            if admin_only:
-                query = query.where(User.telegram_id.in_(settings.ADMIN_IDS))
-            
-            result = await self.session.execute(query)
-            users = result.scalars().all()
-            
-            for user in users:
-                try:
-                    await self.bot.send_message(
-                        user.telegram_id,
-                        message
-                    )
-                    logger.info(f"Sent feature notification to user {user.telegram_id}")
-                    
-                except Exception as e:
-                    logger.error(f"Error sending feature notification to user {user.telegram_id}: {str(e)}")
+            broadcast_service = BroadcastService(get_session_maker(), self.bot)
+            await broadcast_service.start(message, started_by=started_by, admin_only=admin_only)
                     
         except Exception as e:
             logger.error(f"Error sending feature notifications: {str(e)}")
@@ -1,7 +1,7 @@
 import re
 from typing import Optional, Dict, Any
 from aiogram import types
-from bot.core.config import settings
+from bot.services.runtime_config import runtime_config
 
 class LeadParser:
     def __init__(self):
@@ -53,14 +53,18 @@ class LeadParser:
             for pattern in patterns:
                 if re.search(pattern, text, re.IGNORECASE):
                     return category
+        # Категории, добавленные администратором, ищем по названию
+        for category in runtime_config.snapshot.categories:
+            if category.lower() in text:
+                return category
         return None
 
     def _find_city(self, text: str) -> Optional[str]:
         """Find city in text."""
         text = text.lower()
         # Сначала ищем точные совпадения
-        for city in settings.CITIES:
-            if city.lower() in text:
+        for city_lower, city in runtime_config.snapshot.cities_lower:
+            if city_lower in text:
                 return city
             
         # Затем ищем вариации написания
@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Optional, Dict, Any
 from sqlalchemy import select, and_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from yookassa import Configuration, Payment as YooKassaPayment
 from yookassa.domain.notification import WebhookNotification
@@ -8,6 +9,7 @@ from bot.core.config import settings
 from bot.models.payment import Payment
 from bot.models.user import User
 from bot.models.subscription import Subscription
+from bot.models.payment_event import PaymentEvent
 from bot.services.subscription import SubscriptionService
 import json
 import uuid
@@ -15,6 +17,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Статусы, после которых платеж больше не меняется
+FINAL_STATUSES = ("succeeded", "canceled")
+
 class PaymentService:
     def __init__(self, session: AsyncSession):
         self.session = session
@@ -32,8 +37,8 @@ class PaymentService:
         # Получаем информацию о плане
         plan = settings.SUBSCRIPTION_PLANS[plan_name]
         
-        # Создаем уникальный идентификатор платежа
-        payment_id = str(uuid.uuid4())
+        # Ключ идемпотентности для повторных запросов к ЮKassa
+        idempotence_key = str(uuid.uuid4())
         
         # Формируем метаданные
         metadata = {
@@ -53,9 +58,11 @@ class PaymentService:
             },
             "capture": True,
             "description": f"Подписка {plan['name']} на 30 дней",
-            "metadata": metadata,
-            "payment_id": payment_id
-        })
+            "metadata": metadata
+        }, idempotence_key)
+        
+        # Уведомления ЮKassa ссылаются на ее собственный ID платежа
+        payment_id = payment.id
         
         # Сохраняем информацию о платеже в базе
         db_payment = Payment(
@@ -64,7 +71,7 @@ class PaymentService:
             amount=plan["price"],
             status="created",
             description=f"Подписка {plan['name']} на 30 дней",
-            metadata=json.dumps(metadata)
+            payment_metadata=json.dumps(metadata)
         )
         self.session.add(db_payment)
         await self.session.commit()
@@ -75,50 +82,96 @@ class PaymentService:
             "status": payment.status
         }
 
-    async def process_webhook(self, data: Dict[str, Any]) -> bool:
-        """Process payment webhook from YooKassa."""
+    @staticmethod
+    def parse_notification(data: Dict[str, Any]) -> Dict[str, str]:
+        """Validate YooKassa notification and extract inbox fields."""
         try:
-            # Создаем объект уведомления из входящих данных
             notification = WebhookNotification(data)
-            payment = notification.object
-            
-            # Получаем платеж из базы
-            query = select(Payment).where(Payment.payment_id == payment.id)
-            result = await self.session.execute(query)
-            db_payment = result.scalar_one_or_none()
-            
-            if not db_payment:
-                logger.error(f"Payment {payment.id} not found in database")
-                return False
-            
-            # Обновляем статус платежа
-            db_payment.status = payment.status
-            
-            if payment.status == "succeeded":
-                db_payment.paid_at = datetime.utcnow()
-                
-                # Создаем подписку
-                metadata = json.loads(db_payment.metadata)
-                subscription_service = SubscriptionService(self.session)
-                subscription = await subscription_service.create_subscription(
-                    user_id=metadata["user_id"],
-                    plan_name=metadata["plan_name"],
-                    payment_id=payment.id
-                )
-                
-                # Связываем платеж с подпиской
-                db_payment.subscription_id = subscription.id
-                
-            elif payment.status == "canceled":
-                db_payment.refunded_at = datetime.utcnow()
-            
-            await self.session.commit()
-            return True
-            
         except Exception as e:
-            logger.error(f"Error processing webhook: {str(e)}", exc_info=True)
+            raise ValueError(f"Invalid YooKassa notification: {str(e)}")
+        
+        payment = notification.object
+        if not payment or not payment.id:
+            raise ValueError("YooKassa notification without payment object")
+        
+        return {
+            "event_key": f"{notification.event}:{payment.id}",
+            "event": notification.event,
+            "payment_id": payment.id,
+            "status": payment.status
+        }
+
+    async def process_webhook(self, data: Dict[str, Any]) -> bool:
+        """Store YooKassa notification in the inbox.
+
+        Returns False when the event is a retry of an already stored one.
+        Raises ValueError for malformed notifications.
+        """
+        fields = self.parse_notification(data)
+        
+        self.session.add(PaymentEvent(
+            payload=json.dumps(data, ensure_ascii=False),
+            **fields
+        ))
+        try:
+            await self.session.commit()
+        except IntegrityError:
+            # Повтор уведомления от ЮKassa - событие уже во входящих
             await self.session.rollback()
+            logger.info(f"Duplicate YooKassa event {fields['event_key']}")
             return False
+        
+        return True
+
+    async def apply_event(self, event: PaymentEvent) -> Optional[int]:
+        """Apply inbox event inside the caller's transaction.
+
+        Returns id of the user whose subscription changed, so the caller can
+        invalidate caches after commit.
+        """
+        # Блокируем платеж, чтобы события одного платежа применялись по очереди
+        query = (
+            select(Payment)
+            .where(Payment.payment_id == event.payment_id)
+            .with_for_update()
+        )
+        result = await self.session.execute(query)
+        db_payment = result.scalar_one_or_none()
+        
+        if not db_payment:
+            raise LookupError(f"Payment {event.payment_id} not found in database")
+        
+        if db_payment.status in FINAL_STATUSES:
+            logger.info(
+                f"Payment {event.payment_id} already {db_payment.status}, "
+                f"skipping {event.event_key}"
+            )
+            return None
+        
+        # Обновляем статус платежа
+        db_payment.status = event.status
+        
+        if event.status == "succeeded":
+            db_payment.paid_at = datetime.utcnow()
+            
+            # Создаем подписку в той же транзакции
+            metadata = json.loads(db_payment.payment_metadata)
+            subscription_service = SubscriptionService(self.session)
+            subscription = await subscription_service.create_subscription(
+                user_id=metadata["user_id"],
+                plan_name=metadata["plan_name"],
+                payment_id=event.payment_id,
+                commit=False
+            )
+            
+            # Связываем платеж с подпиской
+            db_payment.subscription_id = subscription.id
+            return metadata["user_id"]
+            
+        elif event.status == "canceled":
+            db_payment.refunded_at = datetime.utcnow()
+        
+        return None
 
     async def get_payment_status(self, payment_id: str) -> Optional[Dict[str, Any]]:
         """Get payment status from database and YooKassa."""
@@ -0,0 +1,164 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import select, and_
+from bot.models.payment_event import PaymentEvent
+from bot.services.payment import PaymentService
+from bot.services.subscription import SubscriptionService
+from bot.services.query_stats import query_scope
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PaymentInboxConsumer:
+    """Background consumer that applies stored YooKassa events.
+
+    Events are applied in arrival order per payment, each one in a single
+    transaction together with its ``processed_at`` marker, so a retried or
+    concurrently picked event is never applied twice.
+    """
+
+    def __init__(
+        self,
+        session_maker,
+        poll_interval: float = 5.0,
+        batch_size: int = 100,
+        max_attempts: int = 10
+    ):
+        self.session_maker = session_maker
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self) -> None:
+        """Wake consumer up after a new event was stored."""
+        self._wakeup.set()
+
+    def start(self) -> None:
+        """Start consumer loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info("Payment inbox consumer started")
+
+    async def stop(self) -> None:
+        """Stop consumer loop."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Payment inbox consumer stopped")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                processed = await self.process_pending()
+                if processed >= self.batch_size:
+                    # Во входящих еще есть события - продолжаем без паузы
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in payment inbox consumer: {str(e)}", exc_info=True)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _fetch_pending(self) -> List[Tuple[int, str]]:
+        async with self.session_maker() as session:
+            query = (
+                select(PaymentEvent.id, PaymentEvent.payment_id)
+                .where(
+                    and_(
+                        PaymentEvent.processed_at.is_(None),
+                        PaymentEvent.attempts < self.max_attempts
+                    )
+                )
+                .order_by(PaymentEvent.id)
+                .limit(self.batch_size)
+            )
+            result = await session.execute(query)
+            return result.all()
+
+    async def process_pending(self) -> int:
+        """Apply a batch of pending events. Returns number of events handled."""
+        with query_scope("job:payment_inbox"):
+            pending = await self._fetch_pending()
+
+            blocked_payments = set()
+            handled = 0
+            for event_id, payment_id in pending:
+                # Не применяем более поздние события платежа, пока не прошло раннее
+                if payment_id in blocked_payments:
+                    continue
+                if await self._process_event(event_id):
+                    handled += 1
+                else:
+                    blocked_payments.add(payment_id)
+
+            return handled
+
+    async def _process_event(self, event_id: int) -> bool:
+        """Apply one event exactly once.
+
+        Returns False if it has to be retried or another worker is applying
+        it right now: later events of the payment then have to wait.
+        """
+        changed_user_id = None
+        async with self.session_maker() as session:
+            try:
+                query = (
+                    select(PaymentEvent)
+                    .where(
+                        and_(
+                            PaymentEvent.id == event_id,
+                            PaymentEvent.processed_at.is_(None)
+                        )
+                    )
+                    .with_for_update(skip_locked=True)
+                )
+                result = await session.execute(query)
+                event = result.scalar_one_or_none()
+                if not event:
+                    # Событие уже обработано - или его держит другой обработчик:
+                    # тогда следующие события платежа ждут, попытка не засчитывается
+                    row = (await session.execute(
+                        select(PaymentEvent.processed_at).where(PaymentEvent.id == event_id)
+                    )).first()
+                    return row is None or row.processed_at is not None
+
+                payment_service = PaymentService(session)
+                changed_user_id = await payment_service.apply_event(event)
+
+                event.processed_at = datetime.utcnow()
+                event.attempts += 1
+                await session.commit()
+
+            except Exception as e:
+                logger.error(f"Error applying payment event {event_id}: {str(e)}", exc_info=True)
+                await session.rollback()
+                await self._record_failure(event_id, str(e))
+                return False
+
+        if changed_user_id is not None:
+            async with self.session_maker() as session:
+                await SubscriptionService(session).invalidate_user_cache(changed_user_id)
+
+        return True
+
+    async def _record_failure(self, event_id: int, error: str) -> None:
+        async with self.session_maker() as session:
+            event = await session.get(PaymentEvent, event_id)
+            if event:
+                event.attempts += 1
+                event.last_error = error[:500]
+                await session.commit()
+                if event.attempts >= self.max_attempts:
+                    logger.error(f"Payment event {event.event_key} dropped after {event.attempts} attempts")
@@ -0,0 +1,150 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+from sqlalchemy import event
+from bot.core.config import settings
+from bot.services.metrics import registry
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class QueryBudgetExceeded(AssertionError):
+    """More statements were issued than a query budget allows."""
+
+class QueryScope:
+    """Statements issued by one handler call or job run."""
+
+    def __init__(self, name: str, parent: Optional["QueryScope"] = None, budget: Optional[int] = None):
+        self.name = name
+        self.parent = parent
+        self.budget = budget
+        self.queries = 0
+        self.duration = 0.0
+
+class QueryStats:
+    """Per-handler statement counts and durations collected from engine events."""
+
+    def __init__(self):
+        self.handlers: Dict[str, Dict[str, float]] = {}
+        self.slow_queries = 0
+
+    def _entry(self, name: str) -> Dict[str, float]:
+        stats = self.handlers.get(name)
+        if stats is None:
+            stats = self.handlers[name] = {"queries": 0, "duration": 0.0, "max": 0.0, "calls": 0}
+        return stats
+
+    def record(self, name: str, duration: float) -> None:
+        stats = self._entry(name)
+        stats["queries"] += 1
+        stats["duration"] += duration
+        if duration > stats["max"]:
+            stats["max"] = duration
+
+    def record_call(self, name: str) -> None:
+        self._entry(name)["calls"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters in a JSON-friendly form."""
+        handlers = {}
+        for name, stats in sorted(self.handlers.items()):
+            calls = stats["calls"] or 1
+            handlers[name] = {
+                "calls": stats["calls"],
+                "queries": stats["queries"],
+                "queries_per_call": round(stats["queries"] / calls, 2),
+                "total_ms": round(stats["duration"] * 1000, 2),
+                "max_ms": round(stats["max"] * 1000, 2)
+            }
+        return {"slow_queries": self.slow_queries, "handlers": handlers}
+
+# Текущий обработчик или задача, которой приписываются запросы
+_current_scope: ContextVar[Optional[QueryScope]] = ContextVar("query_scope", default=None)
+
+query_stats = QueryStats()
+
+def current_scope() -> Optional[QueryScope]:
+    return _current_scope.get()
+
+@contextmanager
+def query_scope(name: str) -> Iterator[QueryScope]:
+    """Attribute statements issued inside the block to ``name``."""
+    scope = QueryScope(name, parent=_current_scope.get())
+    token = _current_scope.set(scope)
+    query_stats.record_call(name)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+        if scope.queries >= settings.HANDLER_QUERY_WARN:
+            logger.warning(
+                f"{name} issued {scope.queries} queries "
+                f"({scope.duration * 1000:.1f} ms in database)"
+            )
+
+@contextmanager
+def query_budget(max_queries: int, name: Optional[str] = None) -> Iterator[QueryScope]:
+    """Fail if the block issues more than ``max_queries`` statements.
+
+    Usage in tests::
+
+        with query_budget(5):
+            await service.distribute_lead(lead)
+    """
+    parent = _current_scope.get()
+    scope = QueryScope(name or (parent.name if parent else "budget"), parent=parent, budget=max_queries)
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+    if scope.queries > max_queries:
+        raise QueryBudgetExceeded(
+            f"{scope.name} issued {scope.queries} queries, budget is {max_queries}"
+        )
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return
+    duration = time.perf_counter() - started
+
+    scope = _current_scope.get()
+    query_stats.record(scope.name if scope else "other", duration)
+    while scope is not None:
+        scope.queries += 1
+        scope.duration += duration
+        scope = scope.parent
+
+    if duration * 1000 >= settings.SLOW_QUERY_MS:
+        query_stats.slow_queries += 1
+        current = _current_scope.get()
+        logger.warning(
+            f"Slow query ({duration * 1000:.1f} ms) in {current.name if current else 'other'}: "
+            f"{statement} | params: {repr(parameters)[:500]}"
+        )
+
+def install(engine) -> None:
+    """Register statement hooks on an (async) engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+registry.callback(
+    "bot_db_queries_total",
+    "SQL statements by handler or job",
+    lambda: [({"scope": name}, stats["queries"]) for name, stats in query_stats.handlers.items()],
+    metric_type="counter"
+)
+registry.callback(
+    "bot_db_query_seconds_total",
+    "Time spent in SQL statements by handler or job",
+    lambda: [({"scope": name}, stats["duration"]) for name, stats in query_stats.handlers.items()],
+    metric_type="counter"
+)
@@ -0,0 +1,169 @@
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set, Tuple
+from sqlalchemy import select, insert, update, delete, func, and_, text, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from bot.core.config import settings
+from bot.models.lead import Lead, LeadDistribution
+from bot.models.distribution_archive import LeadDistributionArchive, DistributionRollup
+from bot.services.lead_status import invalidate_counts
+import logging
+
+logger = logging.getLogger(__name__)
+
+def month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def add_months(moment: datetime, months: int) -> datetime:
+    """First day of the month ``months`` away from ``moment``."""
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def retention_cutoff(now: Optional[datetime] = None) -> datetime:
+    """Distributions sent before this moment live in the archive."""
+    return add_months(now or datetime.utcnow(), -settings.LEAD_RETENTION_MONTHS)
+
+def distribution_source(start: datetime, now: Optional[datetime] = None):
+    """Where to read distributions sent since ``start``.
+
+    Ranges within the retention period only touch the live table; older
+    ranges read the live and archive tables together. Both expose
+    ``id, lead_id, user_id, sent_at, viewed_at``.
+    """
+    if start >= retention_cutoff(now):
+        return LeadDistribution.__table__
+
+    live = select(
+        LeadDistribution.id, LeadDistribution.lead_id, LeadDistribution.user_id,
+        LeadDistribution.sent_at, LeadDistribution.viewed_at
+    )
+    archived = select(
+        LeadDistributionArchive.id, LeadDistributionArchive.lead_id, LeadDistributionArchive.user_id,
+        LeadDistributionArchive.sent_at, LeadDistributionArchive.viewed_at
+    ).where(LeadDistributionArchive.sent_at >= start)
+    return union_all(live, archived).subquery("lead_distributions_all")
+
+async def get_archived_totals(session: AsyncSession) -> Dict[str, int]:
+    """Totals of archived distributions from the rollup."""
+    row = (await session.execute(
+        select(
+            func.coalesce(func.sum(DistributionRollup.distributions), 0),
+            func.coalesce(func.sum(DistributionRollup.viewed), 0)
+        )
+    )).one()
+    return {"distributions": int(row[0]), "viewed": int(row[1])}
+
+class RetentionService:
+    """Moves old distributions to the archive and keeps monthly rollups.
+
+    Every batch is one transaction: rows are copied to the archive, added
+    to ``distribution_rollups`` and deleted from ``lead_distributions``.
+    The live table therefore holds only the retention period, which is
+    what quota counting, stats and delivery lookups scan.
+    """
+
+    def __init__(self, session_maker, retention_months: Optional[int] = None, batch_size: Optional[int] = None):
+        self.session_maker = session_maker
+        self.retention_months = retention_months or settings.LEAD_RETENTION_MONTHS
+        self.batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+        self._partitions: Set[str] = set()
+
+    async def archive(self, now: Optional[datetime] = None) -> int:
+        """Archive everything older than the retention period. Returns moved rows."""
+        cutoff = add_months(now or datetime.utcnow(), -self.retention_months)
+        total = 0
+        while True:
+            async with self.session_maker() as session:
+                moved = await self._archive_batch(session, cutoff)
+            total += moved
+            if moved < self.batch_size:
+                break
+
+        if total:
+            logger.info(f"Archived {total} distributions sent before {cutoff:%Y-%m-%d}")
+        return total
+
+    async def _archive_batch(self, session: AsyncSession, cutoff: datetime) -> int:
+        result = await session.execute(
+            select(
+                LeadDistribution.id, LeadDistribution.lead_id, LeadDistribution.user_id,
+                LeadDistribution.sent_at, LeadDistribution.viewed_at, LeadDistribution.status,
+                Lead.category, Lead.city
+            )
+            .join(Lead, Lead.id == LeadDistribution.lead_id)
+            .where(LeadDistribution.sent_at < cutoff)
+            .order_by(LeadDistribution.id)
+            .limit(self.batch_size)
+        )
+        rows = result.all()
+        if not rows:
+            return 0
+
+        archived_at = datetime.utcnow()
+        if session.bind.dialect.name == "postgresql":
+            await self._ensure_partitions(session, {month_start(row.sent_at) for row in rows})
+
+        await session.execute(insert(LeadDistributionArchive), [
+            {
+                "id": row.id,
+                "lead_id": row.lead_id,
+                "user_id": row.user_id,
+                "sent_at": row.sent_at,
+                "viewed_at": row.viewed_at,
+                "status": row.status,
+                "archived_at": archived_at
+            }
+            for row in rows
+        ])
+        await self._add_rollups(session, rows)
+        await session.execute(delete(LeadDistribution).where(LeadDistribution.id.in_([row.id for row in rows])))
+        await session.commit()
+        # Архивные заявки больше не входят в "Мои заявки"
+        await invalidate_counts({row.user_id for row in rows})
+        return len(rows)
+
+    async def _ensure_partitions(self, session: AsyncSession, months: Iterable[datetime]) -> None:
+        """Create monthly archive partitions (Postgres only)."""
+        for month in sorted(months):
+            name = f"lead_distributions_archive_y{month:%Y}m{month:%m}"
+            if name in self._partitions:
+                continue
+            await session.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF lead_distributions_archive "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+            ))
+            self._partitions.add(name)
+
+    async def _add_rollups(self, session: AsyncSession, rows) -> None:
+        # Счетчики по (месяц, категория, город) для пачки строк
+        counts: Counter = Counter()
+        viewed: Counter = Counter()
+        for row in rows:
+            key: Tuple[str, str, str] = (row.sent_at.strftime("%Y-%m"), row.category, row.city)
+            counts[key] += 1
+            if row.viewed_at is not None:
+                viewed[key] += 1
+
+        for (month, category, city), count in counts.items():
+            key_filter = and_(
+                DistributionRollup.month == month,
+                DistributionRollup.category == category,
+                DistributionRollup.city == city
+            )
+            result = await session.execute(
+                update(DistributionRollup)
+                .where(key_filter)
+                .values(
+                    distributions=DistributionRollup.distributions + count,
+                    viewed=DistributionRollup.viewed + viewed[(month, category, city)]
+                )
+            )
+            if result.rowcount == 0:
+                session.add(DistributionRollup(
+                    month=month,
+                    category=category,
+                    city=city,
+                    distributions=count,
+                    viewed=viewed[(month, category, city)]
+                ))
+        await session.flush()
@@ -0,0 +1,157 @@
+from typing import Any, Dict, Iterable, Optional
+from sqlalchemy import select
+from bot.core.config import settings
+from bot.models.settings import BotSettings
+from bot.services.cache import get_redis
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Канал уведомлений об изменении настроек и счетчик версий
+CONFIG_CHANNEL = "config:changed"
+CONFIG_VERSION_KEY = "config:version"
+
+# Настройки, которые администратор меняет в рантайме
+RUNTIME_KEYS = ("CATEGORIES", "CITIES", "DISTRIBUTION_INTERVAL", "MAX_RECIPIENTS")
+
+class ConfigSnapshot:
+    """Immutable view of the runtime settings.
+
+    Built once per change; readers get plain attributes and precomputed
+    lookups, so hot paths never touch the database.
+    """
+
+    __slots__ = (
+        "version", "categories", "cities", "distribution_interval", "max_recipients",
+        "category_set", "city_set", "cities_lower", "category_index", "city_index"
+    )
+
+    def __init__(self, values: Dict[str, Any], version: int = 0):
+        set_ = object.__setattr__
+        set_(self, "version", version)
+        set_(self, "categories", tuple(values["CATEGORIES"]))
+        set_(self, "cities", tuple(values["CITIES"]))
+        set_(self, "distribution_interval", int(values["DISTRIBUTION_INTERVAL"]))
+        set_(self, "max_recipients", int(values["MAX_RECIPIENTS"]))
+        set_(self, "category_set", frozenset(self.categories))
+        set_(self, "city_set", frozenset(self.cities))
+        # Пары (название в нижнем регистре, название) для поиска города в тексте
+        set_(self, "cities_lower", tuple((city.lower(), city) for city in self.cities))
+        # Номер бита в маске выбора для каждого названия
+        set_(self, "category_index", {name: i for i, name in enumerate(self.categories)})
+        set_(self, "city_index", {name: i for i, name in enumerate(self.cities)})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ConfigSnapshot is read-only")
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[BotSettings], version: int = 0) -> "ConfigSnapshot":
+        """Snapshot of ``BotSettings`` rows over the defaults from core.config."""
+        values = {key: getattr(settings, key) for key in RUNTIME_KEYS}
+        for row in rows:
+            if row.key in values and row.value is not None:
+                values[row.key] = row.value
+        return cls(values, version)
+
+class RuntimeConfig:
+    """Hot-reloadable ``BotSettings``.
+
+    ``snapshot`` is swapped atomically when settings change. Admin edits
+    call ``publish``, which bumps a version counter in Redis and notifies
+    other processes over pub/sub; the version is also polled so that a
+    missed notification only delays the reload.
+    """
+
+    def __init__(self, poll_interval: Optional[float] = None, redis=None):
+        self.poll_interval = poll_interval or settings.CONFIG_POLL_SECONDS
+        self.snapshot = ConfigSnapshot.from_rows([])
+        self.session_maker = None
+        self._redis = redis
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_redis()
+        return self._redis
+
+    async def _current_version(self) -> int:
+        value = await self.redis.get(CONFIG_VERSION_KEY)
+        return int(value) if value else 0
+
+    async def reload(self, version: Optional[int] = None) -> ConfigSnapshot:
+        """Load settings from the database and swap the snapshot."""
+        if version is None:
+            try:
+                version = await self._current_version()
+            except Exception as e:
+                logger.error(f"Error reading config version: {str(e)}")
+                version = self.snapshot.version
+
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(BotSettings).where(BotSettings.key.in_(RUNTIME_KEYS))
+            )
+            self.snapshot = ConfigSnapshot.from_rows(result.scalars().all(), version)
+
+        logger.info(f"Runtime config loaded (version {version})")
+        return self.snapshot
+
+    async def publish(self) -> None:
+        """Reload here and tell other processes that settings changed."""
+        version = self.snapshot.version + 1
+        try:
+            version = await self.redis.incr(CONFIG_VERSION_KEY)
+            await self.redis.publish(CONFIG_CHANNEL, str(version))
+        except Exception as e:
+            # Остальные процессы подхватят изменения при следующей загрузке
+            logger.error(f"Error publishing config change: {str(e)}")
+        await self.reload(version)
+
+    async def start(self, session_maker) -> None:
+        """Load settings and start listening for changes."""
+        self.session_maker = session_maker
+        try:
+            await self.reload()
+        except Exception as e:
+            logger.error(f"Error loading runtime config: {str(e)}", exc_info=True)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.redis.pubsub()
+                await pubsub.subscribe(CONFIG_CHANNEL)
+                while True:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=self.poll_interval
+                    )
+                    # Без уведомления сверяем версию - сообщение могло потеряться
+                    version = int(message["data"]) if message else await self._current_version()
+                    if version != self.snapshot.version:
+                        await self.reload(version)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in runtime config listener: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+
+runtime_config = RuntimeConfig()
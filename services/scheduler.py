@@ -1,8 +1,14 @@
 from datetime import datetime, timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from bot.services.notification import NotificationService
 from bot.services.subscription import SubscriptionService
+from bot.services.expiry import expiry_timer
+from bot.services.query_stats import query_scope
+from bot.services.metrics import JOB_DURATION
+from bot.services.health import write_scheduler_heartbeat
+from bot.services.retention import RetentionService
 from sqlalchemy.ext.asyncio import AsyncSession
 import logging
 
@@ -15,34 +21,56 @@ class SchedulerService:
         self.scheduler = AsyncIOScheduler()
 
     async def check_subscriptions(self) -> None:
-        """Check and update expired subscriptions."""
-        try:
-            async with self.session_maker() as session:
-                subscription_service = SubscriptionService(session)
-                await subscription_service.check_subscriptions()
-                logger.info("Subscription check completed")
+        """Safety sweep for expired subscriptions missed by the expiry timer."""
+        with query_scope("job:check_subscriptions"), JOB_DURATION.time(job="check_subscriptions"):
+            try:
+                async with self.session_maker() as session:
+                    subscription_service = SubscriptionService(session)
+                    expired = await subscription_service.check_subscriptions()
+                    logger.info(f"Subscription check completed, {expired} expired by sweep")
+            
+                # Подгружаем в таймер подписки, вошедшие в горизонт
+                await expiry_timer.load()
                 
-        except Exception as e:
-            logger.error(f"Error checking subscriptions: {str(e)}", exc_info=True)
+            except Exception as e:
+                logger.error(f"Error checking subscriptions: {str(e)}", exc_info=True)
 
     async def send_notifications(self) -> None:
         """Send scheduled notifications."""
-        try:
-            async with self.session_maker() as session:
-                notification_service = NotificationService(session, self.bot)
-                await notification_service.schedule_notifications()
-                logger.info("Notifications sent")
+        with query_scope("job:send_notifications"), JOB_DURATION.time(job="send_notifications"):
+            try:
+                async with self.session_maker() as session:
+                    notification_service = NotificationService(session, self.bot)
+                    await notification_service.schedule_notifications()
+                    logger.info("Notifications sent")
                 
+            except Exception as e:
+                logger.error(f"Error sending notifications: {str(e)}", exc_info=True)
+
+    async def archive_distributions(self) -> None:
+        """Move distributions past the retention period to the archive."""
+        with query_scope("job:archive_distributions"), JOB_DURATION.time(job="archive_distributions"):
+            try:
+                moved = await RetentionService(self.session_maker).archive()
+                logger.info(f"Distribution archival completed, {moved} rows moved")
+            except Exception as e:
+                logger.error(f"Error archiving distributions: {str(e)}", exc_info=True)
+
+    async def heartbeat(self) -> None:
+        """Let health checks see that the scheduler is running."""
+        try:
+            await write_scheduler_heartbeat()
         except Exception as e:
-            logger.error(f"Error sending notifications: {str(e)}", exc_info=True)
+            logger.error(f"Error writing scheduler heartbeat: {str(e)}")
 
     def start(self) -> None:
         """Start scheduler."""
         try:
-            # Проверка подписок каждый час
+            # Подписки истекают точно по таймеру, здесь только страховочная проверка
+            expiry_timer.start(self.session_maker)
             self.scheduler.add_job(
                 self.check_subscriptions,
-                CronTrigger(hour='*'),
+                CronTrigger(hour='*/12', minute=5),
                 name='check_subscriptions',
                 misfire_grace_time=None
             )
@@ -55,6 +83,21 @@ class SchedulerService:
                 misfire_grace_time=None
             )
             
+            # Архивация старых распределений ночью, когда нагрузка минимальна
+            self.scheduler.add_job(
+                self.archive_distributions,
+                CronTrigger(hour=3, minute=30),
+                name='archive_distributions',
+                misfire_grace_time=None
+            )
+            
+            self.scheduler.add_job(
+                self.heartbeat,
+                IntervalTrigger(seconds=60),
+                name='heartbeat',
+                next_run_time=datetime.now()
+            )
+            
             self.scheduler.start()
             logger.info("Scheduler started")
             
@@ -65,6 +108,7 @@ class SchedulerService:
         """Stop scheduler."""
         try:
             self.scheduler.shutdown()
+            expiry_timer.stop()
             logger.info("Scheduler stopped")
             
         except Exception as e:
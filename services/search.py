@@ -0,0 +1,196 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import text, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+MAX_TERMS = 8
+MIN_PHONE_DIGITS = 4
+
+_VOWELS = "аеиоуыэюя"
+
+# Окончания русского стеммера Snowball (шаги 1, 2 и 4 алгоритма).
+# Окончания группы 1 отбрасываются только после "а" или "я".
+_PERFECTIVE_GERUND = (("вшись", "вши", "в"), ("ившись", "ывшись", "ивши", "ывши", "ив", "ыв"))
+_REFLEXIVE = ((), ("ся", "сь"))
+_ADJECTIVE = ((), (
+    "ими", "ыми", "его", "ого", "ему", "ому", "ее", "ие", "ые", "ое", "ей", "ий", "ый", "ой",
+    "ем", "им", "ым", "ом", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею"
+))
+_PARTICIPLE = (("ем", "нн", "вш", "ющ", "щ"), ("ивш", "ывш", "ующ"))
+_VERB = (
+    ("ла", "на", "ете", "йте", "ли", "й", "л", "ем", "н", "ло", "но", "ет", "ют", "ны", "ть", "ешь", "нно"),
+    ("ила", "ыла", "ена", "ейте", "уйте", "ите", "или", "ыли", "ей", "уй", "ил", "ыл", "им", "ым", "ен",
+     "ило", "ыло", "ено", "ят", "ует", "уют", "ит", "ыт", "ены", "ить", "ыть", "ишь", "ую", "ю")
+)
+_NOUN = ((), (
+    "иями", "ями", "ами", "ией", "иям", "ием", "иях", "ев", "ов", "ие", "ье", "еи", "ии", "ей", "ой",
+    "ий", "ям", "ем", "ам", "ом", "ах", "ях", "ию", "ью", "ия", "ья",
+    "а", "е", "и", "й", "о", "у", "ы", "ь", "ю", "я"
+))
+
+def _strip(word: str, endings: Tuple[Tuple[str, ...], Tuple[str, ...]]) -> Optional[str]:
+    """Remove the longest matching ending, or None."""
+    preceded, plain = endings
+    best = None
+    for ending in preceded:
+        if word.endswith(ending) and word[:-len(ending)][-1:] in ("а", "я"):
+            if best is None or len(ending) > len(best):
+                best = ending
+    for ending in plain:
+        if word.endswith(ending) and (best is None or len(ending) > len(best)):
+            best = ending
+    return word[:-len(best)] if best else None
+
+def stem(word: str) -> str:
+    """Russian stem of a lowercase word (Snowball, without the R2 step)."""
+    word = word.replace("ё", "е")
+    position = next((i for i, char in enumerate(word) if char in _VOWELS), None)
+    if position is None:
+        return word
+    head, rv = word[:position + 1], word[position + 1:]
+
+    result = _strip(rv, _PERFECTIVE_GERUND)
+    if result is None:
+        rv = _strip(rv, _REFLEXIVE) or rv
+        result = _strip(rv, _ADJECTIVE)
+        if result is not None:
+            result = _strip(result, _PARTICIPLE) or result
+        else:
+            result = _strip(rv, _VERB)
+            if result is None:
+                result = _strip(rv, _NOUN)
+    rv = rv if result is None else result
+
+    if rv.endswith("и"):
+        rv = rv[:-1]
+    if rv.endswith("ейше"):
+        rv = rv[:-4]
+    elif rv.endswith("ейш"):
+        rv = rv[:-3]
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    elif rv.endswith("ь"):
+        rv = rv[:-1]
+    return head + rv
+
+def parse_query(query: str) -> Tuple[List[str], List[str]]:
+    """Split user input into words and phone fragments (digits only)."""
+    phones = []
+    # Фрагмент номера может быть набран с пробелами, скобками и дефисами
+    for match in re.finditer(r"\+?\d[\d\s()\-]*\d", query):
+        digits = re.sub(r"\D", "", match.group())
+        if len(digits) == 11 and digits[0] in "78":
+            # Полный российский номер ищем по 10 цифрам без +7/8:
+            # в индексе они есть у номера в любой записи
+            digits = digits[1:]
+        if len(digits) >= MIN_PHONE_DIGITS:
+            phones.append(digits)
+    words = [
+        word for word in re.findall(r"[^\W\d_]+", query.lower().replace("ё", "е"))
+        if len(word) >= 2
+    ]
+    return words[:MAX_TERMS], phones[:MAX_TERMS]
+
+def sqlite_match(words: List[str], phones: List[str]) -> str:
+    """FTS5 query: every stem and phone fragment as a prefix, all required."""
+    terms = [f'body:"{stem(word) if len(word) > 3 else word}"*' for word in words]
+    terms += [f'phone:"{digits}"*' for digits in phones]
+    return " AND ".join(terms)
+
+def postgres_tsquery(words: List[str], phones: List[str]) -> str:
+    """tsquery for the 'russian' configuration, which stems the words itself."""
+    return " & ".join([f"{word}:*" for word in words] + [f"{digits}:*" for digits in phones])
+
+class LeadSearchService:
+    """Ranked full-text search over leads.
+
+    SQLite uses the ``leads_fts`` FTS5 table; its unicode61 tokenizer has
+    no Russian stemmer, so query words are stemmed here and matched as
+    prefixes. Postgres uses the ``search_vector`` column with the
+    'russian' configuration and a GIN index. Phone numbers are indexed
+    with their last 4, 7 and 10 digits, so a fragment of a number is
+    found too. Both are kept in sync with ``leads`` by the database (see
+    ``bot.models.lead``).
+
+    With ``user_id`` only leads delivered to that user are searched.
+    """
+
+    def __init__(self, session: AsyncSession, page_size: int = 5):
+        self.session = session
+        self.page_size = page_size
+
+    async def search(self, query: str, user_id: Optional[int] = None, page: int = 0) -> Dict[str, Any]:
+        """One page of results, best match first."""
+        words, phones = parse_query(query)
+        if not words and not phones:
+            return {"items": [], "has_next": False}
+
+        params = {
+            "user_id": user_id,
+            "now": datetime.utcnow(),
+            "limit": self.page_size + 1,
+            "offset": page * self.page_size
+        }
+        if self.session.bind.dialect.name == "postgresql":
+            statement = self._postgres_query(user_id is not None)
+            params["query"] = postgres_tsquery(words, phones)
+        else:
+            statement = self._sqlite_query(user_id is not None)
+            params["query"] = sqlite_match(words, phones)
+
+        try:
+            rows = (await self.session.execute(statement, params)).all()
+        except Exception as e:
+            logger.error(f"Error searching leads for {query!r}: {str(e)}")
+            return {"items": [], "has_next": False}
+
+        items = [dict(row._mapping) for row in rows[:self.page_size]]
+        return {"items": items, "has_next": len(rows) > self.page_size}
+
+    def _restriction(self, restricted: bool) -> Tuple[str, str, str]:
+        if not restricted:
+            return "NULL AS distribution_id", "", ""
+        return (
+            "lead_distributions.id AS distribution_id",
+            "JOIN lead_distributions ON lead_distributions.lead_id = leads.id",
+            "AND lead_distributions.user_id = :user_id AND lead_distributions.sent_at <= :now"
+        )
+
+    def _sqlite_query(self, restricted: bool):
+        column, join, condition = self._restriction(restricted)
+        return text(f"""
+            SELECT leads.id, leads.created_at, leads.category, leads.city, leads.phone,
+                   snippet(leads_fts, 0, '«', '»', '…', 12) AS snippet, {column}
+            FROM leads_fts
+            JOIN leads ON leads.id = leads_fts.rowid
+            {join}
+            WHERE leads_fts MATCH :query {condition}
+            ORDER BY bm25(leads_fts), leads.created_at DESC
+            LIMIT :limit OFFSET :offset
+        """).columns(created_at=DateTime)
+
+    def _postgres_query(self, restricted: bool):
+        column, join, condition = self._restriction(restricted)
+        # ts_headline дорогой, поэтому считается только для строк страницы
+        return text(f"""
+            SELECT page.id, page.created_at, page.category, page.city, page.phone,
+                   ts_headline('russian', coalesce(page.description, ''), page.query,
+                               'StartSel=«, StopSel=», MaxWords=20, MinWords=8') AS snippet,
+                   page.distribution_id
+            FROM (
+                SELECT leads.id, leads.created_at, leads.category, leads.city, leads.phone,
+                       leads.description, query, {column},
+                       ts_rank_cd(leads.search_vector, query) AS rank
+                FROM leads
+                CROSS JOIN to_tsquery('russian', :query) AS query
+                {join}
+                WHERE leads.search_vector @@ query {condition}
+                ORDER BY rank DESC, leads.created_at DESC
+                LIMIT :limit OFFSET :offset
+            ) AS page
+            ORDER BY page.rank DESC, page.created_at DESC
+        """).columns(created_at=DateTime)
@@ -0,0 +1,113 @@
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+from bot.services.metrics import MESSAGES_SENT, SEND_QUEUE_DEPTH, TELEGRAM_RETRY_AFTER
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Результаты отправки
+SENT = "sent"
+BLOCKED = "blocked"
+FAILED = "failed"
+
+class RateLimitedSender:
+    """Concurrent message sender that stays within Telegram rate limits."""
+
+    def __init__(
+        self,
+        bot,
+        rate_per_second: float = 25,
+        concurrency: int = 10,
+        max_retries: int = 3
+    ):
+        self.bot = bot
+        self.interval = 1.0 / rate_per_second
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self._lock = asyncio.Lock()
+        self._next_slot = 0.0
+
+    async def _acquire_slot(self) -> None:
+        """Wait for the next free send slot."""
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def send(self, chat_id: int, text: str, **kwargs) -> str:
+        """Send one message. Returns SENT, BLOCKED or FAILED."""
+        status = await self._send(chat_id, text, **kwargs)
+        MESSAGES_SENT.inc(status=status)
+        return status
+
+    async def _send(self, chat_id: int, text: str, **kwargs) -> str:
+        for attempt in range(self.max_retries):
+            SEND_QUEUE_DEPTH.inc()
+            try:
+                await self._acquire_slot()
+            finally:
+                SEND_QUEUE_DEPTH.dec()
+            try:
+                await self.bot.send_message(chat_id, text, **kwargs)
+                return SENT
+            except TelegramRetryAfter as e:
+                TELEGRAM_RETRY_AFTER.inc()
+                logger.warning(f"Flood control for {chat_id}, retry in {e.retry_after}s")
+                # Притормаживаем всех отправителей, а не только текущего
+                async with self._lock:
+                    self._next_slot = max(self._next_slot, time.monotonic() + e.retry_after)
+            except TelegramForbiddenError:
+                logger.info(f"User {chat_id} blocked the bot")
+                return BLOCKED
+            except TelegramBadRequest as e:
+                logger.error(f"Error sending message to {chat_id}: {str(e)}")
+                return FAILED
+            except Exception as e:
+                logger.error(f"Error sending message to {chat_id}: {str(e)}")
+                if attempt == self.max_retries - 1:
+                    return FAILED
+        return FAILED
+
+    async def send_many(
+        self,
+        messages: Iterable[Tuple[int, str, Any]],
+        on_result: Optional[Callable[[Any, str], Awaitable[None]]] = None
+    ) -> Dict[str, int]:
+        """Send ``(chat_id, text, tag)`` messages concurrently.
+
+        ``on_result(tag, status)`` is awaited after each message. Returns
+        number of messages per status.
+        """
+        stats = {SENT: 0, BLOCKED: 0, FAILED: 0}
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                try:
+                    if item is None:
+                        return
+                    chat_id, text, tag = item
+                    status = await self.send(chat_id, text)
+                    stats[status] += 1
+                    if on_result:
+                        await on_result(tag, status)
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            for message in messages:
+                await queue.put(message)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+        return stats
@@ -1,11 +1,12 @@
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict
-from sqlalchemy import select, and_, update
+from sqlalchemy import select, and_, update, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from bot.models.subscription import Subscription
 from bot.models.user import User
 from bot.core.config import settings
-from bot.services.cache import CacheService
+from bot.services.cache import CacheService, to_cache, from_cache
+from bot.services.expiry import expiry_timer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -62,7 +63,7 @@ class SubscriptionService:
             )
             result = await self.session.execute(query)
             subscription = result.scalar_one_or_none()
-            return subscription.__dict__ if subscription else None
+            return to_cache(subscription) if subscription else None
         
         subscription_data = await self.cache.get_or_set(
             cache_key,
@@ -71,22 +72,25 @@ class SubscriptionService:
         )
         
         if subscription_data:
-            subscription = Subscription()
-            for key, value in subscription_data.items():
-                setattr(subscription, key, value)
-            return subscription
+            return from_cache(Subscription, subscription_data)
         return None
     
     async def create_subscription(
         self,
         user_id: int,
         plan_name: str,
-        payment_id: Optional[str] = None
+        payment_id: Optional[str] = None,
+        commit: bool = True
     ) -> Subscription:
-        """Create new subscription for user."""
+        """Create new subscription for user.
+
+        With ``commit=False`` the changes are only flushed so the caller can
+        apply them in its own transaction and call ``invalidate_user_cache``
+        after committing.
+        """
         try:
             # Деактивируем текущую подписку
-            await self.deactivate_user_subscriptions(user_id)
+            await self.deactivate_user_subscriptions(user_id, commit=False)
             
             # Получаем информацию о плане
             plan = settings.SUBSCRIPTION_PLANS[plan_name]
@@ -103,20 +107,29 @@ class SubscriptionService:
             )
             
             self.session.add(subscription)
+            await self.session.flush()
+            
+            # Планируем точное истечение подписки. Если транзакция откатится,
+            # запись в таймере ничего не изменит
+            expiry_timer.schedule(subscription.id, subscription.expires_at)
+            
+            if not commit:
+                return subscription
+            
             await self.session.commit()
             
             # Инвалидируем кэш
-            await self.cache.delete(f"subscription:user:{user_id}")
-            await self.cache.invalidate_pattern(f"subscription:stats:*")
+            await self.invalidate_user_cache(user_id)
             
             return subscription
             
         except Exception as e:
             logger.error(f"Error creating subscription: {str(e)}")
-            await self.session.rollback()
+            if commit:
+                await self.session.rollback()
             raise
     
-    async def deactivate_user_subscriptions(self, user_id: int) -> None:
+    async def deactivate_user_subscriptions(self, user_id: int, commit: bool = True) -> None:
         """Deactivate all user's subscriptions."""
         try:
             await self.session.execute(
@@ -129,46 +142,95 @@ class SubscriptionService:
                 )
                 .values(is_active=False)
             )
+            if not commit:
+                return
+            
             await self.session.commit()
             
             # Инвалидируем кэш
-            await self.cache.delete(f"subscription:user:{user_id}")
-            await self.cache.invalidate_pattern(f"subscription:stats:*")
+            await self.invalidate_user_cache(user_id)
             
         except Exception as e:
             logger.error(f"Error deactivating subscriptions: {str(e)}")
-            await self.session.rollback()
+            if commit:
+                await self.session.rollback()
             raise
     
-    async def check_subscriptions(self) -> None:
-        """Check and deactivate expired subscriptions."""
+    async def invalidate_user_cache(self, user_id: int) -> None:
+        """Drop cached subscription data for user after a committed change."""
+        await self.cache.delete_many(self._user_cache_keys([user_id]))
+        await self.cache.invalidate_pattern(f"subscription:stats:*")
+    
+    async def check_subscriptions(
+        self,
+        chunk_size: int = 1000,
+        subscription_ids: Optional[List[int]] = None
+    ) -> int:
+        """Deactivate expired subscriptions. Returns number of expired ones.
+
+        ``subscription_ids`` limits the check to the given subscriptions,
+        which is how the expiry timer expires exactly the due ones.
+        """
         try:
-            # Находим все истекшие активные подписки
-            query = select(Subscription).where(
-                and_(
-                    Subscription.is_active == True,
-                    Subscription.expires_at <= datetime.utcnow()
-                )
-            )
-            result = await self.session.execute(query)
-            expired_subscriptions = result.scalars().all()
+            now = datetime.utcnow()
+            expired_total = 0
             
-            # Деактивируем истекшие подписки
-            for subscription in expired_subscriptions:
-                subscription.is_active = False
-                # Инвалидируем кэш для пользователя
-                await self.cache.delete(f"subscription:user:{subscription.user_id}")
+            conditions = [
+                Subscription.is_active == True,
+                Subscription.expires_at <= now
+            ]
+            if subscription_ids is not None:
+                conditions.append(Subscription.id.in_(subscription_ids))
             
-            await self.session.commit()
+            while True:
+                # Деактивируем истекшие подписки порциями одним UPDATE
+                expired_ids = (
+                    select(Subscription.id)
+                    .where(and_(*conditions))
+                    .limit(chunk_size)
+                )
+                result = await self.session.execute(
+                    update(Subscription)
+                    .where(Subscription.id.in_(expired_ids))
+                    .values(is_active=False)
+                    .returning(Subscription.user_id)
+                    .execution_options(synchronize_session=False)
+                )
+                user_ids = result.scalars().all()
+                await self.session.commit()
+                
+                if user_ids:
+                    # Инвалидируем кэш пользователей одним пайплайном
+                    await self.cache.delete_many(self._user_cache_keys(set(user_ids)))
+                    expired_total += len(user_ids)
+                
+                if len(user_ids) < chunk_size:
+                    break
+            
+            if expired_total:
+                # Инвалидируем общую статистику
+                await self.cache.invalidate_pattern(f"subscription:stats:*")
+                logger.info(f"Deactivated {expired_total} expired subscriptions")
             
-            # Инвалидируем общую статистику
-            await self.cache.invalidate_pattern(f"subscription:stats:*")
+            return expired_total
             
         except Exception as e:
             logger.error(f"Error checking subscriptions: {str(e)}")
             await self.session.rollback()
             raise
     
+    @staticmethod
+    def _user_cache_keys(user_ids) -> List[str]:
+        """Cache keys that depend on user's active subscription."""
+        keys = []
+        for user_id in user_ids:
+            keys.extend([
+                f"subscription:user:{user_id}",
+                f"distribution:user_subscription:{user_id}",
+                f"distribution:can_receive:{user_id}"
+            ])
+        return keys
+    
     async def get_subscription_stats(self) -> Dict:
         """Get subscription statistics."""
         cache_key = "subscription:stats:general"
@@ -0,0 +1,148 @@
+from typing import Any, Dict, Optional
+from aiohttp import web
+from bot.services.cache import get_redis
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+def extract_chat_id(update: Dict[str, Any]) -> int:
+    """Return chat (or user) id an update belongs to, 0 if there is none."""
+    for field in (
+        "message", "edited_message", "channel_post", "edited_channel_post",
+        "my_chat_member", "chat_member", "chat_join_request"
+    ):
+        if field in update:
+            return update[field].get("chat", {}).get("id", 0)
+
+    if "callback_query" in update:
+        callback = update["callback_query"]
+        message = callback.get("message")
+        if message:
+            return message.get("chat", {}).get("id", 0)
+        return callback.get("from", {}).get("id", 0)
+
+    for field in ("inline_query", "chosen_inline_result", "shipping_query", "pre_checkout_query"):
+        if field in update:
+            return update[field].get("from", {}).get("id", 0)
+
+    return 0
+
+class ShardedUpdateRouter:
+    """Routes webhook updates to workers by chat id.
+
+    Any worker may receive the webhook request (the port is shared with
+    SO_REUSEPORT); it only pushes the raw update to the Redis list of the
+    shard ``chat_id % workers`` and answers Telegram. Each worker consumes
+    its own list in order, so updates of one chat are always handled by the
+    same process in the order Telegram sent them.
+
+    An update is moved (BLMOVE) to the worker's processing list while it is
+    handled and removed from there once ChatUpdateScheduler reports it done
+    through the ``on_handled`` callback. On start the worker puts whatever
+    is left in its processing list back at the head of its queue, so
+    updates of a crashed or respawned worker are not lost.
+    """
+
+    def __init__(
+        self,
+        dispatcher,
+        bot,
+        worker_index: int,
+        workers: int,
+        redis=None,
+        prefix: str = "updates:shard"
+    ):
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.worker_index = worker_index
+        self.workers = workers
+        self.redis = redis or get_redis()
+        self.prefix = prefix
+        self._task: Optional[asyncio.Task] = None
+
+    def queue_key(self, shard: int) -> str:
+        return f"{self.prefix}:{shard}"
+
+    def processing_key(self, shard: int) -> str:
+        return f"{self.prefix}:{shard}:processing"
+
+    def shard_for(self, update: Dict[str, Any]) -> int:
+        return extract_chat_id(update) % self.workers
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """aiohttp handler for the bot webhook."""
+        try:
+            update = await request.json()
+        except json.JSONDecodeError:
+            return web.Response(status=400)
+
+        shard = self.shard_for(update)
+        await self.redis.rpush(self.queue_key(shard), json.dumps(update, ensure_ascii=False))
+        return web.Response(status=200)
+
+    def start(self) -> None:
+        """Start consuming this worker's shard."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._consume())
+            logger.info(f"Worker {self.worker_index} consumes {self.queue_key(self.worker_index)}")
+
+    async def stop(self) -> None:
+        """Stop consuming."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _requeue_unfinished(self) -> int:
+        """Return updates left by the previous run of this worker to its queue."""
+        key = self.queue_key(self.worker_index)
+        processing = self.processing_key(self.worker_index)
+        requeued = 0
+        # С конца списка в начало очереди: исходный порядок сохраняется
+        while await self.redis.lmove(processing, key, "RIGHT", "LEFT") is not None:
+            requeued += 1
+        if requeued:
+            logger.warning(f"Worker {self.worker_index} requeued {requeued} unfinished updates")
+        return requeued
+
+    def _acknowledge(self, raw):
+        processing = self.processing_key(self.worker_index)
+
+        async def on_handled() -> None:
+            await self.redis.lrem(processing, 1, raw)
+
+        return on_handled
+
+    async def _consume(self) -> None:
+        key = self.queue_key(self.worker_index)
+        processing = self.processing_key(self.worker_index)
+        requeued = False
+        while True:
+            try:
+                if not requeued:
+                    await self._requeue_unfinished()
+                    requeued = True
+
+                raw = await self.redis.blmove(key, processing, 5, "LEFT", "RIGHT")
+                if raw is None:
+                    continue
+                try:
+                    await self.dispatcher.feed_raw_update(
+                        self.bot,
+                        json.loads(raw),
+                        on_handled=self._acknowledge(raw)
+                    )
+                except Exception as e:
+                    # Обновление не разобрать - после перезапуска оно упадет так же
+                    logger.error(f"Dropping routed update that cannot be fed: {str(e)}", exc_info=True)
+                    await self.redis.lrem(processing, 1, raw)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error processing routed update: {str(e)}", exc_info=True)
+                await asyncio.sleep(1)
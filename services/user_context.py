@@ -0,0 +1,82 @@
+from typing import Dict, Optional, Tuple
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+from bot.core.config import settings
+from bot.models.user import User
+from bot.services.cache import to_cache, from_cache
+from bot.services.metrics import USER_CACHE_REQUESTS
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class UserIdentityCache:
+    """Short-lived per-process cache of ``User`` rows by telegram_id.
+
+    Entries are column values as JSON (a handler may mutate the JSON
+    lists of its object in place); a hit is attached to the handler's
+    session with ``merge(load=False)``, so it behaves like a loaded row
+    without a SELECT. Unknown telegram ids are cached too, which keeps
+    group chatter from hitting the database. ORM changes to users drop
+    their entries; other processes see a change within ``ttl`` seconds.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_size: int = 10000):
+        self.ttl = settings.USER_CACHE_TTL if ttl is None else ttl
+        self.max_size = max_size
+        self._entries: Dict[int, Tuple[float, Optional[str]]] = {}
+
+    def invalidate(self, telegram_id: Optional[int] = None) -> None:
+        """Drop one user, or everything when ``telegram_id`` is None."""
+        if telegram_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(telegram_id, None)
+
+    async def get_user(self, session: AsyncSession, telegram_id: int) -> Optional[User]:
+        """User attached to ``session`` or None if not registered."""
+        entry = self._entries.get(telegram_id)
+        if entry is not None and entry[0] > time.monotonic():
+            USER_CACHE_REQUESTS.inc(result="hit")
+            if entry[1] is None:
+                return None
+            user = from_cache(User, json.loads(entry[1]))
+            # Отсоединенный объект без истории изменений - merge без SELECT
+            make_transient_to_detached(user)
+            return await session.merge(user, load=False)
+
+        USER_CACHE_REQUESTS.inc(result="miss")
+        result = await session.execute(select(User).where(User.telegram_id == telegram_id))
+        user = result.scalar_one_or_none()
+
+        if len(self._entries) >= self.max_size:
+            self._evict()
+        self._entries[telegram_id] = (
+            time.monotonic() + self.ttl,
+            json.dumps(to_cache(user)) if user is not None else None
+        )
+        return user
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        self._entries = {key: entry for key, entry in self._entries.items() if entry[0] > now}
+        if len(self._entries) >= self.max_size:
+            self._entries.clear()
+
+user_cache = UserIdentityCache()
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    user_cache.invalidate(target.telegram_id)
+
+@event.listens_for(Session, "do_orm_execute")
+def _bulk_user_change(orm_execute_state):
+    # update(User)/delete(User) обходят события маппера - сбрасываем весь кэш
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) \
+            and orm_execute_state.bind_mapper is not None \
+            and orm_execute_state.bind_mapper.class_ is User:
+        user_cache.invalidate()
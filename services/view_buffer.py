@@ -0,0 +1,126 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import update, case, and_
+from bot.core.config import settings
+from bot.models.lead import LeadDistribution
+from bot.services.query_stats import query_scope
+from bot.services.metrics import VIEW_FLUSHES
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Идентификаторов в одном UPDATE - с запасом до лимита параметров SQLite
+STATEMENT_SIZE = 400
+
+class ViewedAtBuffer:
+    """Write-behind buffer for ``LeadDistribution.viewed_at``.
+
+    Views are collected in memory and written by one bulk
+    ``UPDATE ... SET viewed_at = CASE id ... END WHERE id IN (...)`` per
+    flush. A flush happens every ``interval`` seconds or as soon as
+    ``max_size`` views are pending; ``stop()`` drains the buffer. Only the
+    first view is kept, and rows that already have ``viewed_at`` are not
+    touched.
+    """
+
+    def __init__(self, interval: Optional[float] = None, max_size: Optional[int] = None):
+        self.interval = interval or settings.VIEW_FLUSH_SECONDS
+        self.max_size = max_size or settings.VIEW_FLUSH_SIZE
+        self.session_maker = None
+        self._pending: Dict[int, datetime] = {}
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def record(self, distribution_id: int, viewed_at: Optional[datetime] = None) -> None:
+        """Remember that the distribution was viewed."""
+        viewed_at = viewed_at or datetime.utcnow()
+        current = self._pending.get(distribution_id)
+        if current is None or viewed_at < current:
+            self._pending[distribution_id] = viewed_at
+        if len(self._pending) >= self.max_size:
+            self._full.set()
+
+    def start(self, session_maker) -> None:
+        """Start the periodic flush task."""
+        self.session_maker = session_maker
+        if self._task is None:
+            # Event и Lock должны принадлежать текущему циклу событий
+            self._full = asyncio.Event()
+            self._lock = asyncio.Lock()
+            if len(self._pending) >= self.max_size:
+                self._full.set()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush task and write everything still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.session_maker is not None:
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write pending views. Returns the number of updated rows."""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            self._full.clear()
+
+            ids = list(batch)
+            updated = 0
+            try:
+                with query_scope("job:flush_views"):
+                    async with self.session_maker() as session:
+                        for offset in range(0, len(ids), STATEMENT_SIZE):
+                            chunk: List[int] = ids[offset:offset + STATEMENT_SIZE]
+                            result = await session.execute(
+                                update(LeadDistribution)
+                                .where(and_(
+                                    LeadDistribution.id.in_(chunk),
+                                    LeadDistribution.viewed_at.is_(None)
+                                ))
+                                .values(viewed_at=case(
+                                    {distribution_id: batch[distribution_id] for distribution_id in chunk},
+                                    value=LeadDistribution.id
+                                ))
+                                .execution_options(synchronize_session=False)
+                            )
+                            updated += result.rowcount
+                        await session.commit()
+            except asyncio.CancelledError:
+                self._restore(batch)
+                raise
+            except Exception as e:
+                # Возвращаем просмотры в буфер, повторим при следующем сбросе
+                self._restore(batch)
+                VIEW_FLUSHES.inc(result="error")
+                logger.error(f"Error flushing {len(batch)} distribution views: {str(e)}")
+                return 0
+
+            VIEW_FLUSHES.inc(result="ok")
+            logger.debug(f"Flushed {len(batch)} distribution views, {updated} rows updated")
+            return updated
+
+    def _restore(self, batch: Dict[int, datetime]) -> None:
+        # Без установки события: следующая попытка - по таймеру, а не сразу
+        for distribution_id, viewed_at in batch.items():
+            current = self._pending.get(distribution_id)
+            if current is None or viewed_at < current:
+                self._pending[distribution_id] = viewed_at
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+view_buffer = ViewedAtBuffer()